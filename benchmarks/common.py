@@ -0,0 +1,197 @@
+"""
+   benchmarks.common
+   ~~~~~~~~~~~~~~~~~
+
+   Helpers shared by the benchmarks: paths to the captured responses in
+   test/files and functions that build synthetic, scaled up versions of them
+   so that parser throughput can be compared across input sizes.
+"""
+import copy
+import datetime
+import gzip
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+
+from lxml import etree
+
+
+# multiples of each fixture's record count that benchmarks are run against
+SCALES = [1, 10, 100]
+
+# generous timeout in seconds; the 100x inputs take a while to parse
+TIMEOUT = 600
+
+TEST_FILES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test', 'files')
+
+WATERML_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+def test_file_path(file_path):
+    """returns the absolute path of a file in test/files"""
+    return os.path.join(TEST_FILES_DIR, file_path)
+
+
+def read_test_file(file_path):
+    with open(test_file_path(file_path), 'rb') as f:
+        return f.read()
+
+
+class TempDir(object):
+    """temporary directory created in setup and removed in teardown"""
+    def setup(self, *args):
+        self.temp_dir = tempfile.mkdtemp(prefix='ulmo_benchmark_')
+
+    def teardown(self, *args):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+
+def records_per_second(parse):
+    """calls parse, which returns the number of records it parsed, and
+    returns its throughput
+    """
+    start = _clock()
+    records = parse()
+    return records / (_clock() - start)
+
+
+def scale_dly(content, scale):
+    """Returns GHCN daily (.dly) file content with `scale` times as many
+    records. Copies of each element's records are given new element codes, so
+    the copies parse as additional elements over the same dates.
+    """
+    lines = content.splitlines(True)
+    elements = sorted(set([line[17:21] for line in lines]))
+    copies = []
+    for i in range(1, scale):
+        codes = dict([
+            (element, b'%04d' % (i * len(elements) + index))
+            for index, element in enumerate(elements)
+        ])
+        copies.extend([
+            line[:17] + codes[line[17:21]] + line[21:] for line in lines])
+    return b''.join(lines + copies)
+
+
+def scale_goes_messages(messages, scale):
+    """Returns a list of GOES DCS message dicts with `scale` times as many
+    messages; copies are moved back in time by the span of the originals.
+    """
+    timestamps = [
+        int(message['TblDcpDataDtMsgCar'].strip('/Date()'))
+        for message in messages]
+    span = max(timestamps) - min(timestamps) + 60 * 60 * 1000
+    scaled = []
+    for i in range(scale):
+        for message, timestamp in zip(messages, timestamps):
+            message = dict(message)
+            message['TblDcpDataDtMsgCar'] = '/Date(%d)/' % (timestamp - i * span)
+            scaled.append(message)
+    return scaled
+
+
+def scale_waterml(content, scale):
+    """Returns WaterML 1.x content with `scale` times as many values in each
+    values element. Copies are moved back in time by the span of the original
+    values, so datetimes stay unique.
+    """
+    tree = etree.parse(io.BytesIO(content))
+    for values_element in tree.iter('{*}values'):
+        value_elements = list(values_element.iterfind('{*}value'))
+        if not value_elements:
+            continue
+        datetimes = [
+            _parse_waterml_datetime(value.get('dateTime'))
+            for value in value_elements]
+        span = max(datetimes) - min(datetimes) + datetime.timedelta(days=1)
+        copies = []
+        for i in range(scale - 1, 0, -1):
+            for value, value_datetime in zip(value_elements, datetimes):
+                value_copy = copy.deepcopy(value)
+                value_copy.set('dateTime', _format_waterml_datetime(
+                    value_datetime - i * span, value.get('dateTime')))
+                copies.append(value_copy)
+        insert_at = values_element.index(value_elements[0])
+        values_element[insert_at:insert_at] = copies
+    return etree.tostring(tree, xml_declaration=True, encoding='UTF-8')
+
+
+def synthetic_gsod_tar(path, station, year, scale):
+    """Writes a GSOD yearly tar file holding a single station file with
+    365 * `scale` daily records, starting on January 1 of `year`.
+    """
+    lines = [
+        'STN--- WBAN   YEARMODA    TEMP       DEWP      SLP        STP'
+        '       VISIB      WDSP     MXSPD   GUST    MAX     MIN   PRCP'
+        '   SNDP   FRSHTT']
+    usaf, wban = station.split('-')
+    start = datetime.date(year, 1, 1)
+    for day in range(365 * scale):
+        date = start + datetime.timedelta(days=day)
+        temp = 40 + (day % 50)
+        # (width, number of separating spaces, value) as laid out in the
+        # GSOD format documentation
+        fields = [
+            (6, 0, usaf), (5, 1, wban), (8, 2, date.strftime('%Y%m%d')),
+            (6, 2, '%.1f' % temp), (2, 1, '24'),
+            (6, 2, '%.1f' % (temp - 7.7)), (2, 1, '24'),
+            (6, 2, '1016.3'), (2, 1, '24'),
+            (6, 2, '1015.2'), (2, 1, '24'),
+            (5, 2, '9.0'), (2, 1, '24'),
+            (5, 2, '6.4'), (2, 1, '24'),
+            (5, 2, '12.0'), (5, 2, '18.1'),
+            (6, 2, '%.1f' % (temp + 10.3)), (1, 0, '*'),
+            (6, 1, '%.1f' % (temp - 8.8)), (1, 0, ' '),
+            (5, 1, '%.2f' % ((day % 7) / 10.0)), (1, 0, 'G'),
+            (5, 1, '999.9'), (6, 2, '%06d' % (day % 2)),
+        ]
+        lines.append(''.join([
+            ' ' * spaces + value.rjust(width)
+            for width, spaces, value in fields]))
+
+    member_name = './%s-%s.op.gz' % (station, year)
+    compressed = io.BytesIO()
+    with gzip.GzipFile(fileobj=compressed, mode='wb') as f:
+        f.write(('\n'.join(lines) + '\n').encode('ascii'))
+    member = tarfile.TarInfo(member_name)
+    member.size = len(compressed.getvalue())
+    compressed.seek(0)
+    with tarfile.open(path, 'w:') as tar:
+        tar.addfile(member, compressed)
+    return path
+
+
+def synthetic_palmer_file(path, year, scale):
+    """Writes a CPC palmer drought file in 'format5' with a record for each
+    of 52 weeks for 10 * `scale` climate divisions.
+    """
+    widths = (2, 2, 4, 2, 5, 5) + 10 * (6,) + 4 * (6,) + (6,) + 10 * (6,) \
+        + (4,) + 12 * (6,)
+    with open(path, 'wb') as f:
+        for division in range(10 * scale):
+            state_code, climate_division = divmod(division, 10)
+            for week in range(1, 53):
+                fields = ['%2d' % (state_code % 99 + 1), '%2d' % (climate_division + 1),
+                          '%4d' % year, '%2d' % week]
+                fields.extend([
+                    '%*.2f' % (width, ((division + week + n) % 500) / 100.0)
+                    for n, width in enumerate(widths[4:])
+                ])
+                f.write((''.join(fields) + '\n').encode('ascii'))
+    return path
+
+
+def _format_waterml_datetime(value_datetime, original):
+    # isoformat pads years before 1000, unlike strftime; the fractional
+    # seconds and utc offset of the original are kept
+    return value_datetime.isoformat()[:19] + original[19:]
+
+
+def _parse_waterml_datetime(datetime_str):
+    return datetime.datetime.strptime(datetime_str[:19], WATERML_DATETIME_FORMAT)
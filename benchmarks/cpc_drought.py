@@ -0,0 +1,41 @@
+"""
+   CPC weekly palmer drought file parsing
+"""
+import io
+import os
+
+from ulmo.cpc.drought import core as cpc_drought
+
+from . import common
+
+
+YEAR = 2012
+
+
+class ParseDataFile(object):
+    params = [common.SCALES]
+    param_names = ['scale']
+    number = 1
+    repeat = (1, 5, 60.0)
+    warmup_time = 0
+    timeout = common.TIMEOUT
+
+    def setup_cache(self):
+        # there are no palmer files in test/files, so synthetic ones are used
+        return dict([
+            (scale, common.synthetic_palmer_file(
+                os.path.abspath('palmer_%s_%sx.txt' % (YEAR, scale)), YEAR, scale))
+            for scale in common.SCALES
+        ])
+
+    def setup(self, paths, scale):
+        with open(paths[scale], 'rb') as f:
+            self.content = f.read()
+
+    def time_parse_data_file(self, paths, scale):
+        cpc_drought._parse_data_file(
+            io.BytesIO(self.content), 'format5', YEAR, False)
+
+    def peakmem_parse_data_file(self, paths, scale):
+        cpc_drought._parse_data_file(
+            io.BytesIO(self.content), 'format5', YEAR, False)
@@ -0,0 +1,113 @@
+"""
+   NCDC GHCN daily, GSOD and CIRS parsing
+"""
+import os
+import tarfile
+
+from ulmo.ncdc.cirs import core as cirs
+from ulmo.ncdc.ghcn_daily import core as ghcn_daily
+from ulmo.ncdc.gsod import core as gsod
+
+from . import common
+
+
+# the smaller of the two station files, so that 100x stays manageable
+GHCN_STATION_ID = 'USC00411885'
+
+GSOD_STATION = '722430-12960'
+GSOD_YEAR = 2012
+
+CIRS_FILE = 'ncdc/cirs/climdiv-pdsidv-v1.0.0-20140304'
+
+# the cirs file already holds ~40,000 records of 12 monthly values, so 100x
+# would need several GB of memory
+CIRS_SCALES = [scale for scale in common.SCALES if scale <= 10]
+
+
+class GhcnDailyGetData(object):
+    params = [common.SCALES]
+    param_names = ['scale']
+    number = 1
+    repeat = (1, 5, 60.0)
+    warmup_time = 0
+    timeout = common.TIMEOUT
+
+    def setup_cache(self):
+        content = common.read_test_file('ncdc/ghcnd/%s.dly' % GHCN_STATION_ID)
+        dirs = {}
+        for scale in common.SCALES:
+            dir_path = os.path.abspath('ghcn_daily_%sx' % scale)
+            os.makedirs(dir_path)
+            with open(os.path.join(dir_path, GHCN_STATION_ID + '.dly'), 'wb') as f:
+                f.write(common.scale_dly(content, scale))
+            dirs[scale] = dir_path
+        return dirs
+
+    def setup(self, dirs, scale):
+        # get_data reads the station file from GHCN_DAILY_DIR; with
+        # update=False an existing file is used without any requests
+        self.original_dir = ghcn_daily.GHCN_DAILY_DIR
+        ghcn_daily.GHCN_DAILY_DIR = dirs[scale]
+
+    def teardown(self, dirs, scale):
+        ghcn_daily.GHCN_DAILY_DIR = self.original_dir
+
+    def time_get_data(self, dirs, scale):
+        ghcn_daily.get_data(GHCN_STATION_ID, update=False, as_dataframe=True)
+
+    def peakmem_get_data(self, dirs, scale):
+        ghcn_daily.get_data(GHCN_STATION_ID, update=False, as_dataframe=True)
+
+
+class GsodReadFile(object):
+    params = [common.SCALES]
+    param_names = ['scale']
+    number = 1
+    repeat = (1, 5, 60.0)
+    warmup_time = 0
+    timeout = common.TIMEOUT
+
+    def setup_cache(self):
+        return dict([
+            (scale, common.synthetic_gsod_tar(
+                os.path.abspath('gsod_%s_%sx.tar' % (GSOD_YEAR, scale)),
+                GSOD_STATION, GSOD_YEAR, scale))
+            for scale in common.SCALES
+        ])
+
+    def setup(self, paths, scale):
+        self.tar = tarfile.open(paths[scale], 'r:')
+
+    def teardown(self, paths, scale):
+        self.tar.close()
+
+    def time_read_gsod_file(self, paths, scale):
+        gsod._read_gsod_file(self.tar, GSOD_STATION, GSOD_YEAR)
+
+    def peakmem_read_gsod_file(self, paths, scale):
+        gsod._read_gsod_file(self.tar, GSOD_STATION, GSOD_YEAR)
+
+
+class CirsGetData(object):
+    params = [CIRS_SCALES]
+    param_names = ['scale']
+    number = 1
+    repeat = (1, 5, 60.0)
+    warmup_time = 0
+    timeout = common.TIMEOUT
+
+    def setup_cache(self):
+        content = common.read_test_file(CIRS_FILE)
+        paths = {}
+        for scale in CIRS_SCALES:
+            path = os.path.abspath('cirs_pdsidv_%sx' % scale)
+            with open(path, 'wb') as f:
+                f.write(content * scale)
+            paths[scale] = path
+        return paths
+
+    def time_get_data(self, paths, scale):
+        cirs.get_data('pdsi', use_file=paths[scale], as_dataframe=True)
+
+    def peakmem_get_data(self, paths, scale):
+        cirs.get_data('pdsi', use_file=paths[scale], as_dataframe=True)
@@ -0,0 +1,46 @@
+"""
+   NOAA GOES DCS message decoding
+"""
+import json
+
+import pandas
+
+from ulmo.noaa import goes
+from ulmo.noaa.goes import core as goes_core
+
+from . import common
+
+
+# dcp address of each captured message file and the parser for its messages
+MESSAGE_FILES = {
+    'C5149430': 'twdb_stevens',
+    'C514D73A': 'twdb_sutron',
+    'C516C1B8': 'twdb_stevens',
+}
+
+
+class Decode(object):
+    params = [sorted(MESSAGE_FILES.keys()), common.SCALES]
+    param_names = ['dcp_address', 'scale']
+    number = 1
+    repeat = (1, 5, 60.0)
+    warmup_time = 0
+    timeout = common.TIMEOUT
+
+    def setup(self, dcp_address, scale):
+        messages = json.loads(common.read_test_file(
+            'noaa/goes/%s.txt' % dcp_address).decode('utf-8'))
+        # the same steps get_data uses to build its dataframe
+        data = pandas.DataFrame([
+            goes_core._parse(message)
+            for message in common.scale_goes_messages(messages, scale)
+        ])
+        data.index = data.message_timestamp_utc
+        self.data = data.sort_index()
+        self.parser = MESSAGE_FILES[dcp_address]
+
+    def time_decode(self, dcp_address, scale):
+        goes.decode(self.data, self.parser)
+
+    def peakmem_decode(self, dcp_address, scale):
+        goes.decode(self.data, self.parser)
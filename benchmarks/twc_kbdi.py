@@ -0,0 +1,45 @@
+"""
+   TWC KBDI daily summary parsing
+"""
+import io
+
+from ulmo.twc.kbdi import core as kbdi
+
+from . import common
+
+
+SUMMARY_FILES = {
+    'text': 'twc/kbdi/summ20130409.txt',
+    'csv': 'twc/kbdi/summ20161010.csv',
+}
+
+
+def _scale_summary(content, file_format, scale):
+    """repeats the county rows of a summary file `scale` times, keeping its
+    header and, for text files, the leading rule and trailing line
+    """
+    lines = content.splitlines(True)
+    if file_format == 'text':
+        header, rows, footer = lines[:2], lines[2:-1], lines[-1:]
+    else:
+        header, rows, footer = lines[:1], lines[1:], []
+    return b''.join(header + rows * scale + footer)
+
+
+class ParseSummaryFile(object):
+    params = [sorted(SUMMARY_FILES.keys()), common.SCALES]
+    param_names = ['format', 'scale']
+
+    def setup(self, file_format, scale):
+        self.content = _scale_summary(
+            common.read_test_file(SUMMARY_FILES[file_format]), file_format, scale)
+        if file_format == 'text':
+            self.parse = kbdi._parse_text_file
+        else:
+            self.parse = kbdi._parse_csv_file
+
+    def time_parse_summary_file(self, file_format, scale):
+        self.parse(io.BytesIO(self.content))
+
+    def peakmem_parse_summary_file(self, file_format, scale):
+        self.parse(io.BytesIO(self.content))
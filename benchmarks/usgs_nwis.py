@@ -0,0 +1,80 @@
+"""
+   USGS NWIS site data parsing and hdf5 storage
+"""
+import os
+
+import ulmo.usgs.nwis
+
+from . import common
+
+
+SITE_CODE = '08068500'
+VALUES_FILE = 'usgs/nwis/site_08068500_instantaneous_2011-11-05_2011-11-18.xml'
+
+
+def _write_scaled_values_files():
+    content = common.read_test_file(VALUES_FILE)
+    paths = {}
+    for scale in common.SCALES:
+        path = os.path.abspath('nwis_%s_instantaneous_%sx.xml' % (SITE_CODE, scale))
+        with open(path, 'wb') as f:
+            f.write(common.scale_waterml(content, scale))
+        paths[scale] = path
+    return paths
+
+
+class GetSiteData(object):
+    params = [common.SCALES]
+    param_names = ['scale']
+    number = 1
+    repeat = (1, 5, 60.0)
+    warmup_time = 0
+    timeout = common.TIMEOUT
+
+    def setup_cache(self):
+        return _write_scaled_values_files()
+
+    def time_get_site_data(self, paths, scale):
+        ulmo.usgs.nwis.get_site_data(SITE_CODE, service='instantaneous',
+                input_file=paths[scale], methods='all')
+
+    def peakmem_get_site_data(self, paths, scale):
+        ulmo.usgs.nwis.get_site_data(SITE_CODE, service='instantaneous',
+                input_file=paths[scale], methods='all')
+
+
+class UpdateSiteData(common.TempDir):
+    """writing parsed values to a new hdf5 store; skipped if pytables is not
+    installed or the installed pandas lacks the get_store the hdf5 backend
+    uses
+    """
+    params = [common.SCALES]
+    param_names = ['scale']
+    number = 1
+    repeat = (1, 5, 60.0)
+    warmup_time = 0
+    timeout = common.TIMEOUT
+
+    def setup_cache(self):
+        return _write_scaled_values_files()
+
+    def setup(self, paths, scale):
+        try:
+            import ulmo.usgs.nwis.hdf5
+        except ImportError:
+            raise NotImplementedError("pytables is not installed")
+        import pandas.io.pytables
+        if not hasattr(pandas.io.pytables, 'get_store'):
+            raise NotImplementedError(
+                "pandas.io.pytables.get_store is not available")
+        super(UpdateSiteData, self).setup()
+        # a path ending in a separator keeps a file per site in that directory
+        self.path = os.path.join(self.temp_dir, '')
+
+    def time_update_site_data(self, paths, scale):
+        ulmo.usgs.nwis.hdf5.update_site_data(SITE_CODE, path=self.path,
+                input_file=paths[scale], methods='all', autorepack=False)
+
+    def peakmem_update_site_data(self, paths, scale):
+        ulmo.usgs.nwis.hdf5.update_site_data(SITE_CODE, path=self.path,
+                input_file=paths[scale], methods='all', autorepack=False)
@@ -0,0 +1,85 @@
+"""
+   Parsing of WaterML 1.0 and 1.1 responses
+"""
+import io
+import os
+
+import ulmo.waterml.v1_0
+import ulmo.waterml.v1_1
+
+from . import common
+
+
+VALUES_FILES = {
+    '1.0': 'cuahsi/wof/get_values_1_0_MuddyRiver_MuddyRiver_14_MR_MuddyRiver_ACID.xml',
+    '1.1': 'usgs/nwis/site_08068500_instantaneous_2011-11-05_2011-11-18.xml',
+}
+
+WATERML_MODULES = {
+    '1.0': ulmo.waterml.v1_0,
+    '1.1': ulmo.waterml.v1_1,
+}
+
+# the 1.1 file has two methods for one of its parameters
+PARSE_KWARGS = {
+    '1.0': {},
+    '1.1': {'methods': 'all'},
+}
+
+
+class ParseSiteValues(object):
+    params = [sorted(VALUES_FILES.keys()), common.SCALES]
+    param_names = ['version', 'scale']
+    number = 1
+    repeat = (1, 5, 60.0)
+    warmup_time = 0
+    timeout = common.TIMEOUT
+
+    def setup_cache(self):
+        paths = {}
+        for version, file_path in VALUES_FILES.items():
+            content = common.read_test_file(file_path)
+            for scale in common.SCALES:
+                path = os.path.abspath('waterml_%s_values_%sx.xml' % (version, scale))
+                with open(path, 'wb') as f:
+                    f.write(common.scale_waterml(content, scale))
+                paths[(version, scale)] = path
+        return paths
+
+    def setup(self, paths, version, scale):
+        with open(paths[(version, scale)], 'rb') as f:
+            self.content = f.read()
+
+    def parse(self, version):
+        return WATERML_MODULES[version].parse_site_values(
+            io.BytesIO(self.content), **PARSE_KWARGS[version])
+
+    def time_parse_site_values(self, paths, version, scale):
+        self.parse(version)
+
+    def peakmem_parse_site_values(self, paths, version, scale):
+        self.parse(version)
+
+    def track_values_per_second(self, paths, version, scale):
+        return common.records_per_second(lambda: sum([
+            len(variable['values'])
+            for variable in self.parse(version).values()
+        ]))
+    track_values_per_second.unit = 'values/s'
+
+
+class ParseSiteInfos(object):
+    params = [
+        'usgs/nwis/sites_-83.0,36.5,-81.0,38.5_daily.xml',
+        'cuahsi/wof/get_sites_ipswich_1_1.xml',
+    ]
+    param_names = ['file']
+
+    def setup(self, file_path):
+        self.content = common.read_test_file(file_path)
+
+    def time_parse_site_infos(self, file_path):
+        ulmo.waterml.v1_1.parse_site_infos(io.BytesIO(self.content))
+
+    def peakmem_parse_site_infos(self, file_path):
+        ulmo.waterml.v1_1.parse_site_infos(io.BytesIO(self.content))
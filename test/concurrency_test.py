@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+import glob
+import os
+import threading
+
+import mock
+import pandas
+
+import ulmo
+from ulmo import util
+
+import test_util
+
+
+GHCN_STATION_ID = 'USC00411885'
+NWIS_SITE_CODE = '08068500'
+WOF_WSDL_URL = 'https://hydroportal.cuahsi.org/ipswich/cuahsi_1_1.asmx?WSDL'
+
+KBDI_DIR = test_util.get_test_file_path('twc/kbdi')
+
+MOCKED_URLS = dict([
+    ('http://twc.tamu.edu/weather_images/summ/' + os.path.basename(path), path)
+    for path in glob.glob(os.path.join(KBDI_DIR, '*'))
+])
+MOCKED_URLS.update({
+    r'.*/ghcn/daily/all/%s\.dly' % GHCN_STATION_ID:
+        'ncdc/ghcnd/%s.dly' % GHCN_STATION_ID,
+    r'http://waterservices.usgs.gov/nwis/.*':
+        'usgs/nwis/site_%s_daily.xml' % NWIS_SITE_CODE,
+})
+
+THREADS = 8
+CALLS_PER_FETCHER = 8
+
+
+def _mocked_suds_client_class():
+    """a mocked suds Client class; unlike test_util.mocked_suds_client, each
+    call returns the whole response so the client can be used many times
+    """
+    with open(test_util.get_test_file_path(
+            'cuahsi/wof/get_sites_ipswich_1_1.xml'), 'rb') as f:
+        content = f.read()
+
+    def new_client(*args, **kwargs):
+        client = mock.MagicMock()
+        client.wsdl.url = WOF_WSDL_URL
+        client.wsdl.tns = ('tns', 'http://www.cuahsi.org/his/1.1/ws/')
+        client.service.GetSites.side_effect = lambda *args, **kwargs: content
+        return client
+    return mock.MagicMock(side_effect=new_client)
+
+
+def _fetchers(data_dir, dataframe):
+    return {
+        'ghcn_daily': lambda: ulmo.ncdc.ghcn_daily.get_data(GHCN_STATION_ID,
+            elements=['PRCP', 'TMAX']),
+        'kbdi': lambda: ulmo.twc.kbdi.get_data(start='2013-04-09',
+            end='2013-04-09', data_dir=data_dir),
+        'nwis': lambda: ulmo.usgs.nwis.get_sites(sites=NWIS_SITE_CODE,
+            service='daily'),
+        'wof': lambda: ulmo.cuahsi.wof.get_sites(WOF_WSDL_URL),
+        'dict_from_dataframe': lambda: util.dict_from_dataframe(dataframe),
+    }
+
+
+def test_fetchers_can_be_used_from_many_threads():
+    dataframe = pandas.DataFrame({'value': [1.0, 2.0, 3.0]},
+            index=pandas.date_range('2013-01-01', periods=3))
+    original_index = dataframe.index
+
+    with test_util.temp_dir() as data_dir, \
+            test_util.mocked_urls(MOCKED_URLS), \
+            mock.patch('suds.client.Client', _mocked_suds_client_class()):
+        fetchers = _fetchers(data_dir, dataframe)
+        expected = dict([
+            (name, fetch()) for name, fetch in fetchers.items()])
+
+        with ThreadPoolExecutor(max_workers=THREADS) as executor:
+            futures = [
+                (name, executor.submit(fetch))
+                for i in range(CALLS_PER_FETCHER)
+                for name, fetch in sorted(fetchers.items())
+            ]
+            results = [(name, future.result()) for name, future in futures]
+
+    for name, result in results:
+        assert result == expected[name], name
+    assert dataframe.index is original_index
+
+
+def test_wof_clients_are_not_shared_between_threads():
+    client_class = _mocked_suds_client_class()
+    thread_clients = {}
+
+    def get_client():
+        client = ulmo.cuahsi.wof.core._get_client(WOF_WSDL_URL)
+        assert ulmo.cuahsi.wof.core._get_client(WOF_WSDL_URL) is client
+        thread_clients[threading.current_thread().name] = client
+
+    with mock.patch('suds.client.Client', client_class):
+        threads = [threading.Thread(target=get_client) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert len(thread_clients) == 4
+    assert len(set(id(client) for client in thread_clients.values())) == 4
+    assert client_class.call_count == 4
@@ -0,0 +1,24 @@
+import threading
+
+import pytest
+
+from ulmo import util
+from ulmo.cuahsi.wof import core as wof_core
+
+
+@pytest.fixture(autouse=True)
+def reset_sessions():
+    """gives each test fresh sessions, so that rate limits and circuit breakers
+    tripped by one test don't carry over to the next
+    """
+    yield
+    util.close_sessions()
+
+
+@pytest.fixture(autouse=True)
+def reset_suds_clients():
+    """gives each test fresh suds clients, so that mocked clients cached by
+    one test aren't used by the next
+    """
+    yield
+    wof_core._suds_clients = threading.local()
@@ -1,5 +1,45 @@
+import subprocess
+import sys
+
+import pytest
+
 import ulmo
 
 
+def _modules_imported_by(statement):
+    """returns the names of the modules that are loaded by running an import
+    statement in a fresh interpreter
+    """
+    output = subprocess.check_output([
+        sys.executable, '-c',
+        '%s; import sys; print(" ".join(sorted(sys.modules)))' % statement])
+    return set(output.decode('utf-8').split())
+
+
 def test_version_is_set():
     assert hasattr(ulmo, '__version__')
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7),
+        reason="submodules are imported eagerly before python 3.7")
+def test_import_ulmo_does_not_import_providers():
+    modules = _modules_imported_by('import ulmo')
+    for name in ('ulmo.usgs', 'ulmo.util', 'pandas', 'lxml', 'requests',
+            'suds', 'bs4', 'tables'):
+        assert name not in modules
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7),
+        reason="submodules are imported eagerly before python 3.7")
+def test_import_provider_only_imports_its_dependencies():
+    modules = _modules_imported_by('import ulmo.usgs.nwis')
+    assert 'ulmo.usgs.nwis' in modules
+    for name in ('ulmo.usgs.ned', 'ulmo.cuahsi', 'ulmo.lcra', 'suds', 'bs4'):
+        assert name not in modules
+
+
+def test_submodules_load_on_attribute_access():
+    assert ulmo.cdec.historical.get_data is not None
+    assert 'nwis' in dir(ulmo.usgs)
+    with pytest.raises(AttributeError):
+        ulmo.not_a_provider
@@ -4,6 +4,7 @@ import os
 import pandas
 
 import ulmo
+from ulmo import util
 
 import test_util
 
@@ -120,3 +121,19 @@ def test_data_dir_used():
             )
         files_glob = glob.glob(os.path.join(data_dir, '*'))
         assert len(files_glob) == 3
+
+
+def test_get_data_with_parse_pool():
+    with test_util.temp_dir() as data_dir:
+        with test_util.mocked_urls(MOCKED_URLS):
+            expected = ulmo.twc.kbdi.get_data(start='2013-04-09',
+                end='2013-04-11', data_dir=data_dir, as_dataframe=True)
+            util.configure_parse_pool(processes=2)
+            try:
+                data = ulmo.twc.kbdi.get_data(start='2013-04-09',
+                    end='2013-04-11', data_dir=data_dir, as_dataframe=True)
+            finally:
+                util.configure_parse_pool(processes=0)
+
+    assert len(data['date'].unique()) == 3
+    pandas.testing.assert_frame_equal(data, expected)
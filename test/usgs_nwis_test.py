@@ -1,3 +1,8 @@
+import asyncio
+import os
+
+import mock
+import numpy as np
 import pytest
 
 import ulmo
@@ -52,6 +57,26 @@ def test_get_sites_single_site():
     assert len(sites) == 1
 
 
+def test_get_sites_async():
+    site_code = '08068500'
+    site_data_file = 'usgs/nwis/site_%s_daily.xml' % site_code
+    with test_util.mocked_urls(site_data_file):
+        sites = asyncio.run(ulmo.usgs.nwis.get_sites_async(sites=site_code,
+            service='daily'))
+        assert sites == ulmo.usgs.nwis.get_sites(sites=site_code,
+            service='daily')
+    assert len(sites) == 1
+
+
+def test_get_site_data_raises_connection_errors():
+    session = mock.Mock()
+    session.get.side_effect = ulmo.util.CircuitOpenError(
+        'too many failed requests to waterservices.usgs.gov')
+    with mock.patch('ulmo.util.get_session', return_value=session):
+        with pytest.raises(ulmo.util.CircuitOpenError):
+            ulmo.usgs.nwis.get_site_data('08068500', service='daily')
+
+
 def test_get_site_data_single_site():
     site_code = '08068500'
     site_data_file = 'usgs/nwis/site_%s_daily.xml' % site_code
@@ -80,6 +105,25 @@ def test_get_site_data_single_site_with_start_and_end():
     assert len(site_data['63680:00000']['values']) == 1250
 
 
+def test_get_site_data_output_file_can_be_replayed():
+    site_code = '08068500'
+    site_data_file = 'usgs/nwis/site_08068500_instantaneous_2011-11-05_2011-11-18.xml'
+    with test_util.temp_dir() as temp_dir:
+        output_file = os.path.join(temp_dir, 'response.xml')
+        with test_util.mocked_urls(site_data_file):
+            site_data = ulmo.usgs.nwis.get_site_data(site_code,
+                    start='2011-11-05', end='2011-11-18', service='instantaneous',
+                    methods={'00065': '2'}, output_file=output_file)
+        replayed = ulmo.usgs.nwis.get_site_data(site_code,
+                service='instantaneous', methods={'00065': '2'},
+                input_file=output_file)
+
+    assert len(site_data) > 0
+    assert sorted(replayed.keys()) == sorted(site_data.keys())
+    for code, values in site_data.items():
+        assert replayed[code]['values'] == values['values']
+
+
 def test_get_site_data_single_site_with_period():
     site_data_file = 'usgs/nwis/site_01117800_instantaneous_P45D.xml'
     site_code = '01117800'
@@ -90,6 +134,27 @@ def test_get_site_data_single_site_with_period():
     assert len(site_data['00060:00003']['values']) == 45
 
 
+def test_get_site_data_as_timeseries():
+    site_data_file = 'usgs/nwis/site_01117800_instantaneous_P45D.xml'
+    site_code = '01117800'
+    with test_util.mocked_urls(site_data_file):
+        site_data = ulmo.usgs.nwis.get_site_data(site_code, period='P45D',
+                service='daily')
+        series = ulmo.usgs.nwis.get_site_data(site_code, period='P45D',
+                service='daily', as_timeseries=True)
+
+    assert sorted(series.keys()) == sorted(site_data.keys())
+    timeseries = series['00060:00003']
+    values = site_data['00060:00003']['values']
+    assert len(timeseries) == 45
+    assert timeseries.values['value'].dtype == np.float64
+    assert timeseries.values['value'][0] == float(values[0]['value'])
+    assert list(timeseries.flags['qualifiers']) == [
+        value['qualifiers'] for value in values]
+    assert timeseries.metadata['site'] == site_data['00060:00003']['site']
+    assert 'values' not in timeseries.metadata
+
+
 def test_get_sites_multiple_sites():
     site_codes = ['08068500', '08041500']
     sites_data_file = 'usgs/nwis/sites_%s_daily.xml' % '_'.join(site_codes)
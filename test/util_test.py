@@ -1,7 +1,25 @@
+import asyncio
+import contextlib
+import copy
 import datetime
+import ftplib
+import gzip
+import io
+import os
+import threading
+import time
+
+import httpretty
+import mock
+import numpy as np
+import pandas
+import pytest
+import requests
 
 from ulmo import util
 
+import test_util
+
 
 def test_convert_date_from_string():
     compare_dates = [
@@ -91,3 +109,1119 @@ def test_convert_datetime_from_date():
     for test_date, test_datetime in compare_datetimes:
         converted = util.convert_datetime(test_date)
         assert converted == test_datetime
+
+
+_fwf_columns = [
+    ('id', 0, 4, None),
+    ('value', 4, 10, float),
+    ('flag', 10, 11, str),
+    ('count', 11, 15, None),
+    ('name', 16, 24, None),
+]
+
+
+def test_parse_fwf():
+    contents = (
+        'A001  12.5X   3 first   \n'
+        'A002 -9999   12 second\n'
+        '\n'
+        'A003  0.25\n'
+    )
+    expected = pandas.DataFrame({
+        'id': ['A001', 'A002', 'A003'],
+        'value': [12.5, np.nan, 0.25],
+        'flag': ['X', np.nan, np.nan],
+        'count': [3, 12, np.nan],
+        'name': ['first', 'second', np.nan],
+    }, columns=['id', 'value', 'flag', 'count', 'name'])
+
+    with test_util.temp_dir() as temp_dir:
+        path = os.path.join(temp_dir, 'data.txt')
+        with open(path, 'w') as f:
+            f.write(contents)
+
+        for memory_map in (False, True):
+            parsed = util.parse_fwf(path, _fwf_columns, na_values=[-9999],
+                    memory_map=memory_map)
+            pandas.testing.assert_frame_equal(parsed, expected)
+
+        with open(path) as f:
+            parsed = util.parse_fwf(f, _fwf_columns, na_values=[-9999])
+        pandas.testing.assert_frame_equal(parsed, expected)
+
+
+def test_parse_fwf_infers_integer_columns():
+    contents = '001   5\n002  17\n'
+    with test_util.temp_dir() as temp_dir:
+        path = os.path.join(temp_dir, 'data.txt')
+        with open(path, 'w') as f:
+            f.write(contents)
+        parsed = util.parse_fwf(path, [
+            ('code', 0, 3, None), ('value', 3, 7, None), ('label', 0, 3, str)])
+
+    assert parsed['code'].dtype == np.int64
+    assert list(parsed['code']) == [1, 2]
+    assert list(parsed['value']) == [5, 17]
+    assert list(parsed['label']) == ['001', '002']
+
+
+def test_get_session_reuses_session_per_provider():
+    session = util.get_session('test.provider')
+    assert util.get_session('test.provider') is session
+    assert util.get_session('test.other_provider') is not session
+
+
+def test_configure_session_sets_options():
+    session = util.get_session('test.configured')
+    util.configure_session('test.configured', pool_maxsize=32, timeout=5,
+            headers={'User-Agent': 'ulmo-test'})
+    new_session = util.get_session('test.configured')
+
+    assert new_session is not session
+    assert new_session.timeout == 5
+    assert new_session.headers['User-Agent'] == 'ulmo-test'
+    assert new_session.get_adapter('http://example.com')._pool_maxsize == 32
+    assert util.get_session('test.provider').timeout == util.sessions.DEFAULT_TIMEOUT
+
+
+def test_suds_transport_uses_client_timeout():
+    from suds.options import Options
+    from suds.transport import Request
+
+    transport = util.suds_transport('test.suds')
+    # this is how suds.client.Client links set_options(timeout=...) to the
+    # transport's options
+    options = Options()
+    options.transport = transport
+    options.timeout = 7
+
+    session = mock.Mock()
+    session.post.return_value = mock.Mock(status_code=200, headers={},
+            content=b'<reply/>')
+    session.get.return_value = mock.Mock(status_code=200, content=b'<wsdl/>')
+    with mock.patch('ulmo.util.sessions.get_session', return_value=session):
+        transport.send(Request('http://example.com/soap', b'<message/>'))
+        transport.open(Request('http://example.com/wsdl'))
+
+    assert session.post.call_args[1]['timeout'] == 7
+    assert session.get.call_args[1]['timeout'] == 7
+
+
+@httpretty.activate
+def test_session_does_not_keep_response_cookies():
+    httpretty.register_uri(httpretty.GET, 'http://example.com/page',
+            body='ok', adding_headers={'Set-Cookie': 'id=1; Path=/'})
+    session = util.get_session('test.cookies')
+    response = session.get('http://example.com/page')
+
+    assert response.cookies.get('id') == '1'
+    assert len(session.cookies) == 0
+
+
+@httpretty.activate
+def test_session_retries_server_errors():
+    url = 'http://example.com/retried'
+    httpretty.register_uri(httpretty.GET, url, responses=[
+        httpretty.Response(body='busy', status=503,
+            adding_headers={'Retry-After': '2'}),
+        httpretty.Response(body='error', status=500),
+        httpretty.Response(body='ok', status=200),
+    ])
+    util.configure_session('test.retries', max_retries=2, backoff_factor=1)
+    with mock.patch('ulmo.util.throttling.time.sleep') as sleep:
+        response = util.get_session('test.retries').get(url)
+
+    assert response.text == 'ok'
+    assert sleep.call_count == 2
+    assert sleep.call_args_list[0] == mock.call(2.0)
+    assert 0 <= sleep.call_args_list[1][0][0] <= 2
+
+
+def test_circuit_breaker_fails_fast():
+    policy = util.RequestPolicy(max_retries=1, failure_threshold=2,
+            recovery_timeout=30)
+    send = mock.Mock(side_effect=requests.exceptions.ConnectionError('down'))
+    with mock.patch('ulmo.util.throttling.time.sleep'):
+        for i in range(2):
+            with pytest.raises(requests.exceptions.ConnectionError):
+                policy.call('example.com', send)
+    assert send.call_count == 4
+
+    with pytest.raises(util.CircuitOpenError):
+        policy.call('example.com', send)
+    assert send.call_count == 4
+
+    # other hosts are unaffected, and a trial request is let through once the
+    # recovery timeout has passed
+    ok = mock.Mock(return_value=mock.Mock(status_code=200))
+    assert policy.call('example.org', ok).status_code == 200
+    with mock.patch('ulmo.util.throttling._clock',
+            return_value=util.throttling._clock() + 31):
+        assert policy.call('example.com', ok).status_code == 200
+    assert policy.call('example.com', ok).status_code == 200
+
+
+def test_circuit_breaker_trial_request_that_raises():
+    policy = util.RequestPolicy(failure_threshold=1, recovery_timeout=30)
+    down = mock.Mock(side_effect=requests.exceptions.ConnectionError('down'))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        policy.call('example.com', down)
+
+    redirects = mock.Mock(
+        side_effect=requests.exceptions.TooManyRedirects('loop'))
+    ok = mock.Mock(return_value=mock.Mock(status_code=200))
+    later = util.throttling._clock() + 31
+    with mock.patch('ulmo.util.throttling._clock', return_value=later):
+        with pytest.raises(requests.exceptions.TooManyRedirects):
+            policy.call('example.com', redirects)
+        assert redirects.call_count == 1
+        # the failed trial reopened the circuit rather than leaving it stuck
+        with pytest.raises(util.CircuitOpenError):
+            policy.call('example.com', ok)
+    with mock.patch('ulmo.util.throttling._clock', return_value=later + 31):
+        assert policy.call('example.com', ok).status_code == 200
+
+
+def test_token_bucket_limits_rate():
+    now = [100.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    with mock.patch('ulmo.util.throttling._clock', lambda: now[0]), \
+            mock.patch('ulmo.util.throttling.time.sleep', side_effect=sleep):
+        bucket = util.throttling.TokenBucket(rate=2, capacity=2)
+        for i in range(6):
+            bucket.acquire()
+    assert now[0] == pytest.approx(102.0)
+
+
+@contextlib.contextmanager
+def _response_cache(**kwargs):
+    with test_util.temp_dir() as temp_dir:
+        path = os.path.join(temp_dir, 'responses.sqlite')
+        try:
+            yield util.enable_response_cache(path=path, **kwargs)
+        finally:
+            util.disable_response_cache()
+
+
+@httpretty.activate
+def test_response_cache_serves_repeated_requests():
+    url = 'http://example.com/sites.html'
+    httpretty.register_uri(httpretty.GET, url, body='<html>sites</html>',
+            content_type='text/html')
+
+    with _response_cache():
+        session = util.get_session()
+        assert session.get(url, params={'a': 1}).text == '<html>sites</html>'
+        response = session.get(url, params={'a': 1})
+        assert response.text == '<html>sites</html>'
+        assert response.from_cache
+        assert len(httpretty.latest_requests()) == 1
+
+        session.get(url, params={'a': 2})
+        session.get(url, stream=True).close()
+        assert len(httpretty.latest_requests()) == 3
+
+        stats = util.response_cache_stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 2
+        assert stats['entries'] == 2
+
+
+@httpretty.activate
+def test_response_cache_keys_on_post_body():
+    url = 'http://example.com/service.asmx'
+    bodies = []
+
+    def echo(request, uri, headers):
+        bodies.append(request.body)
+        return [200, headers, request.body]
+    httpretty.register_uri(httpretty.POST, url, body=echo)
+
+    with _response_cache():
+        session = util.get_session()
+        assert session.post(url, data=b'one').content == b'one'
+        assert session.post(url, data=b'two').content == b'two'
+        assert session.post(url, data=b'one').content == b'one'
+        assert bodies == [b'one', b'two']
+
+
+@httpretty.activate
+def test_response_cache_endpoint_ttls_and_eviction():
+    for name in ('live', 'a', 'b'):
+        httpretty.register_uri(httpretty.GET, 'http://example.com/%s' % name,
+                body=os.urandom(1000))
+
+    with _response_cache(max_size=1500,
+            endpoint_ttls={'http://example.com/live': 0}) as cache:
+        session = util.get_session()
+        session.get('http://example.com/live')
+        session.get('http://example.com/live')
+        assert len(httpretty.latest_requests()) == 2
+
+        session.get('http://example.com/a')
+        session.get('http://example.com/b')
+        stats = cache.stats()
+        assert stats['entries'] == 1
+        assert stats['evictions'] == 1
+        assert cache.get('GET', 'http://example.com/b') is not None
+
+
+@httpretty.activate
+def test_response_cache_skips_real_time_endpoints():
+    url = 'http://waterservices.usgs.gov/nwis/iv/'
+    httpretty.register_uri(httpretty.GET, url, body='<values/>')
+
+    with _response_cache():
+        session = util.get_session('usgs.nwis')
+        session.get(url, params={'sites': '08068500'})
+        session.get(url, params={'sites': '08068500'})
+        assert len(httpretty.latest_requests()) == 2
+    with _response_cache(endpoint_ttls={url: 60}):
+        session.get(url, params={'sites': '08068500'})
+        assert session.get(url, params={'sites': '08068500'}).from_cache
+        assert len(httpretty.latest_requests()) == 3
+
+
+@httpretty.activate
+def test_response_cache_skips_cookies():
+    url = 'http://example.com/form.aspx'
+    methods = []
+
+    def respond(request, uri, headers):
+        methods.append(request.method)
+        if request.method == 'GET':
+            headers['Set-Cookie'] = 'session=1; Path=/'
+            return [200, headers, '<form/>']
+        assert request.headers['Cookie'] == 'session=1'
+        return [200, headers, '<table/>']
+    httpretty.register_uri(httpretty.GET, url, body=respond)
+    httpretty.register_uri(httpretty.POST, url, body=respond)
+
+    with _response_cache() as cache:
+        session = util.get_session()
+        for i in range(2):
+            form = session.get(url)
+            assert form.cookies['session'] == '1'
+            session.post(url, cookies=form.cookies, data={'a': 1})
+        assert methods == ['GET', 'POST', 'GET', 'POST']
+        assert cache.stats()['entries'] == 0
+
+
+def test_parse_many_in_worker_processes():
+    items = [(i, 7) for i in range(50)]
+    assert list(util.parse_many(divmod, items)) == [divmod(i, 7) for i in range(50)]
+
+    util.configure_parse_pool(processes=2)
+    try:
+        assert list(util.parse_many(divmod, iter(items))) == \
+            [divmod(i, 7) for i in range(50)]
+        with pytest.raises(ZeroDivisionError):
+            list(util.parse_many(divmod, [(1, 0)]))
+    finally:
+        util.configure_parse_pool(processes=0)
+
+
+def test_encoded_text_stream():
+    text = u'<a>caf\xe9 \u2603</a>' * 100
+    stream = util.EncodedTextStream(text)
+    chunks = []
+    chunk = stream.read(7)
+    while chunk:
+        chunks.append(chunk)
+        chunk = stream.read(7)
+    assert b''.join(chunks) == text.encode('utf-8')
+
+
+@httpretty.activate
+def test_response_stream_decodes_and_tees():
+    body = b'<values>' + b'<value>1</value>' * 1000 + b'</values>'
+    compressed = io.BytesIO()
+    with gzip.GzipFile(fileobj=compressed, mode='wb') as f:
+        f.write(body)
+    httpretty.register_uri(httpretty.GET, 'http://example.com/values.xml',
+            body=compressed.getvalue(), adding_headers={'Content-Encoding': 'gzip'})
+
+    response = util.get_session().get('http://example.com/values.xml', stream=True)
+    output_file = io.BytesIO()
+    with util.ResponseStream(response, output_file=output_file) as stream:
+        assert stream.read() == body
+    assert output_file.getvalue() == body
+
+
+def test_timeseries_from_value_dicts():
+    value_dicts = [
+        {'datetime': '2011-11-05T00:00:00-05:00', 'value': '4.2', 'qualifiers': 'P'},
+        {'datetime': '2011-11-05T00:15:00-05:00', 'value': '4.3', 'qualifiers': 'P'},
+        {'datetime': '2011-11-05T00:30:00-05:00', 'value': '4.1', 'qualifiers': 'A'},
+    ]
+    series = util.TimeSeries.from_value_dicts(value_dicts,
+            metadata={'site': '08068500'})
+
+    assert len(series) == 3
+    assert series.index[0] == np.datetime64('2011-11-05T05:00:00')
+    assert list(series.values['value']) == [4.2, 4.3, 4.1]
+    assert list(series.flags['qualifiers'].categories) == ['A', 'P']
+    assert series.metadata == {'site': '08068500'}
+    assert series.nbytes < 100
+    with pytest.raises(AttributeError):
+        series.extra = True
+
+    dataframe = series.to_dataframe()
+    assert list(dataframe.columns) == ['value', 'qualifiers']
+    assert dataframe['value'].iloc[2] == 4.1
+
+    with pytest.raises(ValueError):
+        util.TimeSeries(series.index, values={'value': np.zeros(2)})
+
+
+def _export_test_data():
+    return {
+        '00060:00003': {
+            'site': {'code': '08068500', 'name': 'Spring Ck'},
+            'values': [
+                {'datetime': '2011-12-31T00:00:00', 'value': '1.5', 'qualifiers': 'A'},
+                {'datetime': '2012-01-01T00:00:00', 'value': '2.5', 'qualifiers': 'P'},
+            ],
+        },
+        '00065:00003': {
+            'site': {'code': '08068500', 'name': 'Spring Ck'},
+            'values': [
+                {'datetime': '2012-01-01T00:00:00', 'value': '7', 'qualifiers': 'P'},
+            ],
+        },
+    }
+
+
+def test_export_dataframe_types():
+    dataframe = util.export_dataframe(_export_test_data(), 'usgs.nwis')
+
+    assert list(dataframe.columns[:2]) == ['site', 'datetime']
+    assert len(dataframe) == 3
+    assert dataframe['datetime'].dtype == np.dtype('datetime64[ns]')
+    assert dataframe['value'].dtype == np.float64
+    assert list(dataframe['value']) == [1.5, 2.5, 7.0]
+    assert dataframe['qualifiers'].dtype.name == 'category'
+    assert dataframe['variable'].dtype.name == 'category'
+    assert list(dataframe['site'].unique()) == ['08068500']
+
+    with pytest.raises(ValueError):
+        util.export_dataframe({}, 'not.a.provider')
+
+
+@pytest.mark.parametrize('format', ['parquet', 'arrow'])
+def test_export_data_writes_row_group_per_site_and_year(format):
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    with test_util.temp_dir() as temp_dir:
+        path = os.path.join(temp_dir, 'export.' + format)
+        rows = util.export_data(_export_test_data(), path, 'usgs.nwis',
+                format=format)
+        if format == 'parquet':
+            parquet_file = pyarrow.parquet.ParquetFile(path)
+            groups = parquet_file.num_row_groups
+            table = parquet_file.read()
+        else:
+            reader = pyarrow.ipc.open_file(path)
+            groups = reader.num_record_batches
+            table = reader.read_all()
+
+    assert rows == 3
+    assert groups == 2
+    assert pyarrow.types.is_dictionary(table.schema.field('qualifiers').type)
+    assert pyarrow.types.is_float64(table.schema.field('value').type)
+
+
+def test_export_cdec_historical():
+    index = pandas.DatetimeIndex(['2012-01-01', '2012-01-02'], name='DATE TIME')
+    data = {'PRA': {'RES STORAGE': pandas.DataFrame({
+        'station_id': 'PRA', 'value': [1.5, 2.5], 'units': 'AF'},
+        index=index)}}
+    dataframe = util.export_dataframe(data, 'cdec.historical')
+
+    assert list(dataframe['site']) == ['PRA', 'PRA']
+    assert list(dataframe['variable']) == ['RES STORAGE', 'RES STORAGE']
+    assert list(dataframe['datetime']) == list(index)
+    assert 'station_id' not in dataframe
+
+
+def test_export_cpc_drought():
+    from ulmo.cpc.drought import core
+    raw = pandas.DataFrame({
+        'state_code': [41, 41, 41], 'climate_division': [1, 1, 2],
+        'year': [2012, 2012, 2012], 'week': [10, 11, 10],
+        'pdsi': [-1.2, -1.4, 0.3]})
+    dataframe = core._reindex_data(raw)
+    dataframe.index = np.arange(len(dataframe))
+    periods = dataframe.sort_values(['climate_division', 'period'])['period']
+
+    for data in (core._as_data_dict(dataframe), dataframe):
+        exported = util.export_dataframe(data, 'cpc.drought')
+        assert list(exported['site']) == ['TX-1', 'TX-1', 'TX-2']
+        assert list(exported['pdsi']) == [-1.2, -1.4, 0.3]
+        # weeks are written as the sunday they start on
+        assert list(exported['datetime']) == list(
+            pandas.PeriodIndex(periods).start_time)
+        assert all(exported['datetime'].dt.dayofweek == 6)
+
+
+def test_export_ncdc_cirs():
+    data = [
+        {'state_code': 'TX', 'division': 1, 'year': 2012, 'month': 2,
+            'pdsi': 1.0},
+        {'state_code': 'TX', 'division': 1, 'year': 2012, 'month': 1,
+            'pdsi': 2.0},
+    ]
+    dataframe = util.export_dataframe(data, 'ncdc.cirs')
+
+    assert list(dataframe['site']) == ['TX-1', 'TX-1']
+    assert list(dataframe['pdsi']) == [2.0, 1.0]
+    assert list(dataframe['datetime']) == list(pandas.DatetimeIndex(
+        ['2012-01-01', '2012-02-01']))
+
+
+@pytest.mark.parametrize('shape', ['dict', 'dataframe', 'timeseries'])
+def test_export_ncdc_ghcn_daily(shape):
+    element_dataframe = pandas.DataFrame({
+        'value': ['12', '-3'], 'mflag': [' ', ' '], 'qflag': [' ', 'I'],
+        'sflag': ['0', '0']},
+        index=pandas.period_range('2012-01-01', periods=2, freq='D'))
+    if shape == 'dict':
+        data = {'TMAX': util.dict_from_dataframe(element_dataframe)}
+    elif shape == 'dataframe':
+        data = {'TMAX': element_dataframe}
+    else:
+        element_dataframe['value'] = pandas.to_numeric(
+            element_dataframe['value'])
+        data = {'TMAX': util.TimeSeries.from_dataframe(element_dataframe,
+            value_columns=['value'],
+            metadata={'station_id': 'USW00013958', 'element': 'TMAX'})}
+    dataframe = util.export_dataframe(data, 'ncdc.ghcn_daily',
+            site='USW00013958')
+
+    assert list(dataframe['site']) == ['USW00013958', 'USW00013958']
+    assert list(dataframe['element']) == ['TMAX', 'TMAX']
+    assert list(dataframe['value']) == [12, -3]
+    assert list(dataframe['datetime']) == list(pandas.DatetimeIndex(
+        ['2012-01-01', '2012-01-02']))
+
+
+@pytest.mark.parametrize('shape', ['value_dicts', 'timeseries', 'spill_dict'])
+def test_export_ncdc_gsod(shape):
+    from ulmo.ncdc.gsod import core
+    record_array = np.array([
+        ('722590', '13960', datetime.date(2012, 1, 2), 55.0),
+        ('722590', '13960', datetime.date(2012, 1, 1), 50.5),
+    ], dtype=[('USAF', object), ('WBAN', object), ('date', object),
+        ('mean_temp', float)])
+    station = '722590-13960'
+    if shape == 'value_dicts':
+        data = {station: core._record_array_to_value_dicts(record_array)}
+    elif shape == 'timeseries':
+        data = {station: core._record_array_to_timeseries(record_array,
+            station)}
+    else:
+        data = util.SpillDict(1, combine=np.concatenate,
+                convert=core._convert_record_array)
+        data.add(station, record_array)
+    if shape == 'spill_dict':
+        with data:
+            dataframe = util.export_dataframe(data, 'ncdc.gsod')
+    else:
+        dataframe = util.export_dataframe(data, 'ncdc.gsod')
+
+    assert list(dataframe['site']) == [station, station]
+    assert list(dataframe['mean_temp']) == [50.5, 55.0]
+    assert list(dataframe['datetime']) == list(pandas.DatetimeIndex(
+        ['2012-01-01', '2012-01-02']))
+    assert 'USAF' not in dataframe and 'WBAN' not in dataframe
+
+
+def test_export_noaa_goes():
+    messages = pandas.DataFrame({
+        'dcp_address': ['DD0012AC', 'DD0012AC'],
+        'message_timestamp_utc': pandas.to_datetime(
+            ['2012-01-01 01:00', '2012-01-01 00:00']),
+        'dcp_message': ['b', 'a'],
+    })
+    for data in (messages.T.to_dict(), messages):
+        dataframe = util.export_dataframe(data, 'noaa.goes')
+        assert list(dataframe['site']) == ['DD0012AC', 'DD0012AC']
+        assert list(dataframe['dcp_message']) == ['a', 'b']
+
+
+def test_export_twc_kbdi():
+    from ulmo.twc.kbdi import core
+    dataframe = pandas.DataFrame({
+        'county': ['ZAVALA', 'ZAVALA'],
+        'date': pandas.PeriodIndex(['2013-04-10', '2013-04-09'], freq='D'),
+        'avg': [580, 572], 'max': [710, 708], 'min': [430, 423],
+        'fips': ['48507', '48507'],
+    })
+
+    for data in (core._as_data_dict(dataframe), dataframe):
+        exported = util.export_dataframe(data, 'twc.kbdi')
+        assert list(exported['site']) == ['48507', '48507']
+        assert list(exported['avg']) == [572, 580]
+        assert list(exported['datetime']) == list(pandas.DatetimeIndex(
+            ['2013-04-09', '2013-04-10']))
+
+
+def test_spill_dict_spills_past_memory_limit():
+    with test_util.temp_dir() as temp_dir:
+        spill_dict = util.SpillDict(100, combine=np.concatenate,
+                convert=lambda key, value: (key, value.tolist()),
+                directory=temp_dir)
+        spill_dict.add('empty')
+        spill_dict.add('a', np.arange(5))
+        assert spill_dict.spilled_keys == []
+        spill_dict.add('b', np.arange(20))
+        assert spill_dict.spilled_keys == ['a', 'b']
+        assert spill_dict.memory_bytes == 0
+        spill_dict.add('a', np.arange(5, 7))
+
+        assert list(spill_dict) == ['empty', 'a', 'b']
+        assert spill_dict['empty'] is None
+        assert spill_dict['a'] == ('a', list(range(7)))
+        assert dict(spill_dict.items())['b'] == ('b', list(range(20)))
+        assert len(os.listdir(temp_dir)) == 1
+
+        spill_dict.close()
+        assert os.listdir(temp_dir) == []
+
+
+@pytest.mark.parametrize('memory_limit', [0, -1])
+def test_spill_dict_rejects_non_positive_memory_limit(memory_limit):
+    with pytest.raises(ValueError):
+        util.SpillDict(memory_limit)
+
+
+@contextlib.contextmanager
+def _timing_sink(sink):
+    util.add_timing_sink(sink)
+    try:
+        yield sink
+    finally:
+        util.remove_timing_sink(sink)
+
+
+@httpretty.activate
+def test_timing_sinks_receive_fetch_timings():
+    httpretty.register_uri(httpretty.GET, 'http://example.com/timed',
+            body='0123456789')
+    timings = []
+    with _timing_sink(util.StatsSink()) as stats, _timing_sink(timings.append):
+        util.get_session('test.timing').get('http://example.com/timed')
+        util.get_session('test.timing').get('http://example.com/timed')
+
+    assert [timing.stage for timing in timings] == ['fetch', 'fetch']
+    assert timings[0].provider == 'test.timing'
+    assert timings[0].bytes == 10
+    assert timings[0].fields['url'] == 'http://example.com/timed'
+    assert timings[0].fields['status_code'] == 200
+
+    fetch_stats = stats.stats[('test.timing', 'fetch')]
+    assert fetch_stats['count'] == 2
+    assert fetch_stats['bytes'] == 20
+    assert fetch_stats['errors'] == 0
+    assert len(stats.summary()) == 1
+
+
+def test_timed_stages_inherit_provider_and_record_errors():
+    timings = []
+    with _timing_sink(timings.append):
+        with util.timed('parse', provider='test.provider') as outer:
+            with util.timed('write') as inner:
+                inner.records = 3
+            outer.records = 3
+        with pytest.raises(ValueError):
+            with util.timed('dataframe', provider='test.provider'):
+                raise ValueError('bad data')
+
+    assert [(t.provider, t.stage, t.records) for t in timings] == [
+        ('test.provider', 'write', 3),
+        ('test.provider', 'parse', 3),
+        ('test.provider', 'dataframe', None),
+    ]
+    assert isinstance(timings[-1].error, ValueError)
+    assert all([timing.seconds >= 0 for timing in timings])
+
+
+def test_failing_timing_sink_does_not_break_caller():
+    def broken_sink(timing):
+        raise RuntimeError('sink failed')
+
+    with _timing_sink(broken_sink):
+        with util.timed('parse') as timing:
+            timing.records = 1
+    assert timing.seconds is not None
+
+
+def _conditional_callback(etag):
+    def callback(request, uri, response_headers):
+        response_headers['ETag'] = etag
+        if request.headers.get('If-None-Match') == etag:
+            return [304, response_headers, '']
+        return [200, response_headers, 'data for ' + etag]
+    return callback
+
+
+@httpretty.activate
+def test_download_if_new_sends_conditional_request():
+    url = 'http://example.com/data.txt'
+    httpretty.register_uri(httpretty.GET, url, body=_conditional_callback('"v1"'))
+
+    with test_util.temp_dir() as temp_dir:
+        path = os.path.join(temp_dir, 'data.txt')
+        util.download_if_new(url, path)
+        with open(path) as f:
+            assert f.read() == 'data for "v1"'
+        assert httpretty.last_request().headers.get('If-None-Match') is None
+
+        util.download_if_new(url, path)
+        assert httpretty.last_request().headers.get('If-None-Match') == '"v1"'
+        with open(path) as f:
+            assert f.read() == 'data for "v1"'
+
+        httpretty.register_uri(httpretty.GET, url, body=_conditional_callback('"v2"'))
+        util.download_if_new(url, path)
+        with open(path) as f:
+            assert f.read() == 'data for "v2"'
+        assert len(httpretty.latest_requests()) == 3
+
+
+@httpretty.activate
+def test_download_if_new_skips_request_within_ttl():
+    url = 'http://example.com/data.txt'
+    httpretty.register_uri(httpretty.GET, url, body=_conditional_callback('"v1"'))
+
+    with test_util.temp_dir() as temp_dir:
+        path = os.path.join(temp_dir, 'data.txt')
+        util.download_if_new(url, path, ttl=3600)
+        util.download_if_new(url, path, ttl=3600)
+        assert len(httpretty.latest_requests()) == 1
+
+        util.download_if_new(url, path, ttl=0)
+        assert len(httpretty.latest_requests()) == 2
+
+
+@httpretty.activate
+def test_download_if_new_uses_file_time_without_validators():
+    url = 'http://example.com/data.txt'
+    httpretty.register_uri(httpretty.GET, url, body='new data')
+
+    with test_util.temp_dir() as temp_dir:
+        path = os.path.join(temp_dir, 'data.txt')
+        with open(path, 'w') as f:
+            f.write('old data')
+        util.download_if_new(url, path)
+
+        assert httpretty.last_request().headers.get('If-Modified-Since')
+        with open(path) as f:
+            assert f.read() == 'new data'
+
+
+def test_ftp_file_facts_from_mlst():
+    ftp = mock.Mock()
+    ftp.sendcmd.return_value = (
+        '250-Listing /pub/file.txt\n'
+        ' Size=1830;Type=file;Modify=20130301051034.123; /pub/file.txt\n'
+        '250 End')
+    size, modified = util.misc._ftp_file_facts(ftp, '/pub/file.txt')
+
+    assert size == 1830
+    assert modified == datetime.datetime(2013, 3, 1, 5, 10, 34)
+    assert ftp.sendcmd.call_count == 1
+
+
+def _mock_ftp(mlsd_lines=None):
+    ftp = mock.Mock()
+    ftp.nlst.return_value = ['file1.txt', 'file2.txt']
+
+    def retrlines(command, callback):
+        if mlsd_lines is None:
+            raise ftplib.error_perm('500 unknown command')
+        for line in mlsd_lines:
+            callback(line)
+    ftp.retrlines.side_effect = retrlines
+    ftp.retrbinary.side_effect = lambda command, callback, rest=None: callback(b'data')
+    return ftp
+
+
+def test_dir_list_reuses_connection_and_listing():
+    util.close_ftp_connections()
+    ftp = _mock_ftp()
+    with mock.patch('ftplib.FTP', return_value=ftp) as ftp_class:
+        assert util.dir_list('ftp://example.com/pub/') == ['file1.txt', 'file2.txt']
+        assert util.dir_list('ftp://example.com/pub/') == ['file1.txt', 'file2.txt']
+        assert ftp_class.call_count == 1
+        assert ftp.nlst.call_count == 1
+
+        util.dir_list('ftp://example.com/pub/', ttl=0)
+        assert ftp_class.call_count == 1
+        assert ftp.nlst.call_count == 2
+    util.close_ftp_connections()
+
+
+def test_ftp_download_uses_one_directory_listing():
+    util.close_ftp_connections()
+    ftp = _mock_ftp([
+        'type=cdir;modify=20130301051034; .',
+        'size=4;type=file;modify=20130301051034; file1.txt',
+        'size=4;type=file;modify=20130301051034; file2.txt',
+    ])
+    with mock.patch('ftplib.FTP', return_value=ftp) as ftp_class:
+        with test_util.temp_dir() as temp_dir:
+            for filename in ('file1.txt', 'file2.txt'):
+                path = os.path.join(temp_dir, filename)
+                util.download_if_new('ftp://example.com/pub/' + filename, path)
+                with open(path, 'rb') as f:
+                    assert f.read() == b'data'
+
+        assert ftp_class.call_count == 1
+        ftp.retrlines.assert_called_once_with('MLSD /pub', mock.ANY)
+        assert not ftp.sendcmd.called
+        assert ftp.retrbinary.call_count == 2
+    util.close_ftp_connections()
+
+
+def test_ftp_download_with_current_listing_skips_connection():
+    util.close_ftp_connections()
+    ftp = _mock_ftp([
+        'size=4;type=file;modify=20130301051034; file1.txt',
+    ])
+    with mock.patch('ftplib.FTP', return_value=ftp) as ftp_class:
+        with test_util.temp_dir() as temp_dir:
+            path = os.path.join(temp_dir, 'file1.txt')
+            util.download_if_new('ftp://example.com/pub/file1.txt', path)
+            util.download_if_new('ftp://example.com/pub/file1.txt', path,
+                    ttl=0)
+
+        assert ftp_class.call_count == 1
+        assert ftp.retrbinary.call_count == 1
+        # the idle connection wasn't even checked out and tested with NOOP
+        assert not ftp.voidcmd.called
+    util.close_ftp_connections()
+
+
+@httpretty.activate
+def test_cassette_records_and_replays_http():
+    url = 'http://example.com/values.xml'
+    compressed = io.BytesIO()
+    with gzip.GzipFile(fileobj=compressed, mode='wb') as f:
+        f.write(b'<values>recorded</values>')
+    httpretty.register_uri(httpretty.GET, url, body=compressed.getvalue(),
+            adding_headers={'Content-Encoding': 'gzip'})
+    httpretty.register_uri(httpretty.POST, 'http://example.com/service.asmx',
+            body=lambda request, uri, headers: [200, headers, request.body])
+
+    def harvest(session):
+        stream = session.get(url, params={'site': '1'}, stream=True)
+        with util.ResponseStream(stream) as f:
+            streamed = f.read()
+        return [
+            session.get(url, params={'site': '1'}).content,
+            streamed,
+            session.post('http://example.com/service.asmx', data=b'one').content,
+        ]
+
+    with test_util.temp_dir() as temp_dir:
+        path = os.path.join(temp_dir, 'harvest.cassette')
+        with util.use_cassette(path) as cassette:
+            assert cassette.recording
+            recorded = harvest(util.get_session())
+        assert recorded == [b'<values>recorded</values>'] * 2 + [b'one']
+        request_count = len(httpretty.latest_requests())
+
+        httpretty.register_uri(httpretty.GET, url, body='<values>changed</values>')
+        with util.use_cassette(path) as cassette:
+            assert cassette.replaying
+            session = util.get_session()
+            assert harvest(session) == recorded
+            response = session.get(url, params={'site': '1'})
+            assert response.status_code == 200
+            assert response.url == url + '?site=1'
+            with pytest.raises(util.CassetteError):
+                session.get(url, params={'site': '2'})
+        assert len(httpretty.latest_requests()) == request_count
+        assert util.get_cassette() is None
+
+
+@httpretty.activate
+def test_cassette_records_response_after_retries():
+    url = 'http://example.com/flaky.xml'
+    httpretty.register_uri(httpretty.GET, url, responses=[
+        httpretty.Response(body='busy', status=503),
+        httpretty.Response(body='<values>recorded</values>', status=200),
+    ])
+    util.configure_session('test.cassette_retries', max_retries=2)
+    with test_util.temp_dir() as temp_dir:
+        path = os.path.join(temp_dir, 'retried.cassette')
+        with util.use_cassette(path):
+            with mock.patch('ulmo.util.throttling.time.sleep'):
+                response = util.get_session('test.cassette_retries').get(url)
+            assert response.status_code == 200
+
+        # the 503 that was retried isn't replayed in place of the response
+        with util.use_cassette(path):
+            session = util.get_session('test.cassette_retries')
+            for i in range(2):
+                response = session.get(url)
+                assert response.status_code == 200
+                assert response.content == b'<values>recorded</values>'
+
+
+def test_cassette_records_and_replays_ftp():
+    util.close_ftp_connections()
+    ftp = _mock_ftp([
+        'type=cdir;modify=20130301051034; .',
+        'size=4;type=file;modify=20130301051034; file1.txt',
+    ])
+    ftp.cwd.return_value = '250 CWD command successful'
+    with test_util.temp_dir() as temp_dir:
+        path = os.path.join(temp_dir, 'ftp.cassette')
+        with mock.patch('ftplib.FTP', return_value=ftp):
+            with util.use_cassette(path, mode='record'):
+                assert util.dir_list('ftp://example.com/pub/') == ['file1.txt', 'file2.txt']
+                util.download_if_new('ftp://example.com/pub/file1.txt',
+                        os.path.join(temp_dir, 'recorded.txt'))
+
+        with mock.patch('ftplib.FTP', side_effect=AssertionError) as ftp_class:
+            with util.use_cassette(path, mode='replay'):
+                assert util.dir_list('ftp://example.com/pub/') == ['file1.txt', 'file2.txt']
+                replayed_path = os.path.join(temp_dir, 'replayed.txt')
+                util.download_if_new('ftp://example.com/pub/file1.txt', replayed_path)
+                with open(replayed_path, 'rb') as f:
+                    assert f.read() == b'data'
+            assert not ftp_class.called
+    util.close_ftp_connections()
+
+
+@httpretty.activate
+def test_cassette_replays_with_latency():
+    url = 'http://example.com/sites.html'
+    httpretty.register_uri(httpretty.GET, url, body='<html>sites</html>')
+    with test_util.temp_dir() as temp_dir:
+        path = os.path.join(temp_dir, 'sites.cassette')
+        with util.use_cassette(path):
+            util.get_session().get(url)
+
+        with mock.patch('time.sleep') as sleep:
+            with util.use_cassette(path, latency=0.25):
+                util.get_session().get(url)
+            sleep.assert_called_once_with(0.25)
+
+            sleep.reset_mock()
+            with util.use_cassette(path, latency='recorded'):
+                util.get_session().get(url)
+            assert sleep.call_count == 1
+            assert sleep.call_args[0][0] >= 0
+
+
+def test_single_flight_shares_concurrent_calls():
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {'values': [1, 2, 3]}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(
+        util.single_flight('site', fetch, copy=copy.deepcopy)))
+    leader.start()
+    started.wait(5)
+    waiters = [
+        threading.Thread(target=lambda: results.append(
+            util.single_flight('site', fetch, copy=copy.deepcopy)))
+        for i in range(3)
+    ]
+    for thread in waiters:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in [leader] + waiters:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [{'values': [1, 2, 3]}] * 4
+    assert len(set(id(result) for result in results)) == 4
+
+    with pytest.raises(ValueError):
+        util.single_flight('site', lambda: int('a'))
+    assert util.single_flight('site', fetch) == {'values': [1, 2, 3]}
+    assert len(calls) == 2
+
+
+@httpretty.activate
+def test_download_if_new_shares_concurrent_downloads():
+    url = 'http://example.com/station.dly'
+
+    def slow_body(request, uri, headers):
+        time.sleep(0.2)
+        return [200, headers, b'station data']
+    httpretty.register_uri(httpretty.GET, url, body=slow_body)
+
+    with test_util.temp_dir() as temp_dir:
+        path = os.path.join(temp_dir, 'station.dly')
+        threads = [
+            threading.Thread(target=util.download_if_new, args=(url, path))
+            for i in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        with open(path, 'rb') as f:
+            assert f.read() == b'station data'
+    assert len(httpretty.latest_requests()) == 1
+
+
+def test_gather_bounded_limits_concurrency():
+    lock = threading.Lock()
+    running = [0]
+    most_running = [0]
+
+    def fetch(i):
+        with lock:
+            running[0] += 1
+            most_running[0] = max(most_running[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return i * 2
+
+    async def fetch_all():
+        return await util.gather_bounded([
+            util.run_blocking(fetch, i) for i in range(20)], limit=3)
+
+    assert asyncio.run(fetch_all()) == [i * 2 for i in range(20)]
+    assert most_running[0] == 3
+
+
+@httpretty.activate
+def test_download_many():
+    urls = ['http://example.com/file%s.txt' % i for i in range(5)]
+    for url in urls:
+        httpretty.register_uri(httpretty.GET, url, body='contents of ' + url)
+
+    progress = []
+    with test_util.temp_dir() as temp_dir:
+        pairs = [(url, os.path.join(temp_dir, url.split('/')[-1])) for url in urls]
+        failures = util.download_many(pairs, max_workers=3, per_host_limit=2,
+                progress=lambda *args: progress.append(args))
+
+        assert failures == {}
+        for url, path in pairs:
+            with open(path) as f:
+                assert f.read() == 'contents of ' + url
+    assert sorted(p[0] for p in progress) == [1, 2, 3, 4, 5]
+
+
+@httpretty.activate
+def test_download_many_reports_all_failures():
+    httpretty.register_uri(httpretty.GET, 'http://example.com/good.txt', body='ok')
+    bad_urls = ['gopher://example.com/bad1.txt', 'gopher://example.com/bad2.txt']
+
+    with test_util.temp_dir() as temp_dir:
+        pairs = [
+            (url, os.path.join(temp_dir, url.split('/')[-1]))
+            for url in ['http://example.com/good.txt'] + bad_urls
+        ]
+        with pytest.raises(util.DownloadError) as error:
+            util.download_many(pairs)
+        assert sorted(error.value.failures.keys()) == bad_urls
+        assert os.path.exists(os.path.join(temp_dir, 'good.txt'))
+
+        failures = util.download_many(pairs, raise_errors=False)
+        assert sorted(failures.keys()) == bad_urls
+
+
+@httpretty.activate
+def test_download_resumes_partial_file():
+    url = 'http://example.com/archive.tar'
+    contents = b'0123456789' * 10
+
+    def callback(request, uri, response_headers):
+        response_headers.update({'ETag': '"v1"', 'Accept-Ranges': 'bytes'})
+        range_header = request.headers.get('Range')
+        if range_header and request.headers.get('If-Range') == '"v1"':
+            start = int(range_header.split('=')[1].rstrip('-'))
+            response_headers['Content-Range'] = 'bytes %s-%s/%s' % (
+                start, len(contents) - 1, len(contents))
+            return [206, response_headers, contents[start:]]
+        return [200, response_headers, contents]
+    httpretty.register_uri(httpretty.GET, url, body=callback)
+
+    with test_util.temp_dir() as temp_dir:
+        path = os.path.join(temp_dir, 'archive.tar')
+        part_path = path + util.misc.PARTIAL_DOWNLOAD_SUFFIX
+        with open(part_path, 'wb') as f:
+            f.write(contents[:40])
+        util.misc._write_partial_metadata(part_path, url, version='"v1"')
+
+        util.download_if_new(url, path)
+
+        assert httpretty.last_request().headers.get('Range') == 'bytes=40-'
+        with open(path, 'rb') as f:
+            assert f.read() == contents
+        assert not os.path.exists(part_path)
+
+
+@httpretty.activate
+def test_resumed_download_is_checked_with_its_validators():
+    url = 'http://example.com/archive.tar'
+    contents = b'0123456789' * 10
+
+    def callback(request, uri, response_headers):
+        response_headers.update({'ETag': '"v1"', 'Accept-Ranges': 'bytes'})
+        if request.headers.get('If-None-Match') == '"v1"':
+            return [304, response_headers, '']
+        start = int(request.headers['Range'].split('=')[1].rstrip('-'))
+        response_headers['Content-Range'] = 'bytes %s-%s/%s' % (
+            start, len(contents) - 1, len(contents))
+        return [206, response_headers, contents[start:]]
+    httpretty.register_uri(httpretty.GET, url, body=callback)
+
+    with test_util.temp_dir() as temp_dir:
+        path = os.path.join(temp_dir, 'archive.tar')
+        part_path = path + util.misc.PARTIAL_DOWNLOAD_SUFFIX
+        with open(part_path, 'wb') as f:
+            f.write(contents[:40])
+        util.misc._write_partial_metadata(part_path, url, version='"v1"')
+
+        util.download_if_new(url, path)
+        util.download_if_new(url, path)
+
+        assert httpretty.last_request().headers.get('If-None-Match') == '"v1"'
+        assert len(httpretty.latest_requests()) == 2
+        with open(path, 'rb') as f:
+            assert f.read() == contents
+
+
+def test_interrupted_download_leaves_no_file():
+    response = mock.MagicMock(status_code=200, headers={'Content-Length': '1000'})
+    response.__enter__.return_value = response
+
+    def iter_content(chunk_size):
+        yield b'truncated'
+        raise requests.exceptions.ChunkedEncodingError('connection reset')
+    response.iter_content.side_effect = iter_content
+
+    session = mock.Mock()
+    session.get.return_value = response
+    with test_util.temp_dir() as temp_dir:
+        path = os.path.join(temp_dir, 'archive.tar')
+        with mock.patch('ulmo.util.misc.get_session', return_value=session):
+            with pytest.raises(requests.exceptions.ChunkedEncodingError):
+                util.download_if_new('http://example.com/archive.tar', path)
+        assert not os.path.exists(path)
+        assert os.path.exists(path + util.misc.PARTIAL_DOWNLOAD_SUFFIX)
@@ -1,3 +1,8 @@
+import io
+
+import numpy as np
+import pandas
+
 import ulmo
 
 import test_util
@@ -57,3 +62,207 @@ def test_parse_site_values():
         values = ulmo.waterml.v1_1.parse_site_values(content_io, query_isodate)
 
     assert len(values['00062:00011']['values']) > 1000
+
+
+def test_parse_site_values_as_arrays():
+    value_file = test_util.get_test_file_path(
+            'usgs/nwis/site_07335390_instantaneous.xml')
+    with open(value_file, 'rb') as content_io:
+        values = ulmo.waterml.v1_1.parse_site_values(content_io)
+        content_io.seek(0)
+        arrays = ulmo.waterml.v1_1.parse_site_values(content_io,
+                as_arrays=True)
+
+    assert sorted(arrays.keys()) == sorted(values.keys())
+    value_dicts = values['00062:00011']['values']
+    columns = arrays['00062:00011']['values']
+    assert arrays['00062:00011']['variable'] == values['00062:00011']['variable']
+    assert len(columns['value']) == len(value_dicts)
+    assert columns['value'].dtype == np.float64
+    assert columns['datetime'].dtype == np.dtype('datetime64[ns]')
+    for index in (0, len(value_dicts) - 1):
+        value_dict = value_dicts[index]
+        assert columns['value'][index] == float(value_dict['value'])
+        assert columns['qualifiers'][index] == value_dict['qualifiers']
+        assert columns['datetime'][index] == pandas.Timestamp(
+            value_dict['datetime']).tz_convert(None).to_datetime64()
+
+
+def test_parse_site_values_as_arrays_missing_attributes():
+    content = (
+        '<timeSeriesResponse xmlns="http://www.cuahsi.org/waterML/1.1/">'
+        '<timeSeries><sourceInfo><siteName>site</siteName>'
+        '<siteCode network="NWIS">1</siteCode></sourceInfo>'
+        '<variable><variableCode>00060</variableCode>'
+        '<variableName>flow</variableName></variable><values>'
+        '<value dateTime="2012-10-25T00:00:00">1</value>'
+        '<value dateTime="2012-10-25T01:00:00" qualifiers="P">2</value>'
+        '<value dateTime="2012-10-25T02:00:00"></value>'
+        '</values></timeSeries></timeSeriesResponse>').encode('utf-8')
+
+    columns = ulmo.waterml.v1_1.parse_site_values(io.BytesIO(content),
+            as_arrays=True)['00060']['values']
+    assert np.array_equal(columns['value'], [1, 2, np.nan], equal_nan=True)
+    assert list(columns['qualifiers'].codes) == [-1, 0, -1]
+    assert list(columns['qualifiers'].categories) == ['P']
+    assert columns['datetime'][2] == np.datetime64('2012-10-25T02:00:00')
+
+
+def test_parse_site_values_datetime_resolution():
+    value_file = test_util.get_test_file_path(
+            'usgs/nwis/site_07335390_instantaneous.xml')
+    with open(value_file, 'rb') as f:
+        content = f.read()
+    # the fixture's datetimes all have .000 fractions and the same offset
+    for original, replacement in [
+            (b'2012-10-25T00:00:00.000-05:00',
+                b'2012-10-25T00:00:00.750123456-05:00'),
+            (b'2012-10-25T01:00:00.000-05:00', b'2012-10-25T06:00:00+00:00'),
+            (b'2012-10-25T02:00:00.000-05:00',
+                b'20121025T020000.123456789-0500')]:
+        content = content.replace(original, replacement)
+
+    def parse(**kwargs):
+        values = ulmo.waterml.v1_1.parse_site_values(io.BytesIO(content),
+                **kwargs)
+        return values['00062:00011']['values']
+
+    assert [value['datetime'] for value in parse()[:4]] == [
+        '2012-10-25T00:00:00-05:00',
+        '2012-10-25T06:00:00Z',
+        '2012-10-25T02:00:00-05:00',
+        '2012-10-25T03:00:00-05:00',
+    ]
+    assert [value['datetime'] for value in parse(
+        datetime_resolution='ms')[:4]] == [
+        '2012-10-25T00:00:00.750-05:00',
+        '2012-10-25T06:00:00.000Z',
+        '2012-10-25T02:00:00.123-05:00',
+        '2012-10-25T03:00:00.000-05:00',
+    ]
+    # datetimes that isodate parses only have microseconds
+    assert [value['datetime'] for value in parse(
+        datetime_resolution='ns')[:4]] == [
+        '2012-10-25T00:00:00.750123000-05:00',
+        '2012-10-25T06:00:00.000000000Z',
+        '2012-10-25T02:00:00.123456000-05:00',
+        '2012-10-25T03:00:00.000000000-05:00',
+    ]
+    assert parse(as_arrays=True)['datetime'][0] == \
+        np.datetime64('2012-10-25T05:00:00')
+    assert parse(as_arrays=True, datetime_resolution='ms')['datetime'][0] == \
+        np.datetime64('2012-10-25T05:00:00.750')
+
+
+def test_element_dict_keys_are_reused_per_tag():
+    from lxml import etree
+    method = etree.fromstring(
+        '<method xmlns="http://www.cuahsi.org/waterML/1.1/" methodID="2">'
+        '<methodCode>2</methodCode></method>')
+    value = etree.fromstring(
+        '<value xmlns="http://www.cuahsi.org/waterML/1.1/" '
+        'qualityControlLevelCode="1" dateTime="2012-10-25T00:00:00">1</value>')
+
+    for i in range(2):
+        assert ulmo.waterml.common._element_dict(method) == {
+            'method_id': '2', 'method_code': '2'}
+        assert ulmo.waterml.common._element_dict(value) == {
+            'value': '1', 'value_quality_control_level_code': '1',
+            'value_date_time': '2012-10-25T00:00:00'}
+        assert ulmo.waterml.common._element_dict(value,
+                prepend_attributes=False) == {
+            'value': '1', 'quality_control_level_code': '1',
+            'date_time': '2012-10-25T00:00:00'}
+
+
+def test_parsed_elements_are_cleared():
+    namespace = '{http://www.cuahsi.org/waterML/1.1/}'
+    content = (
+        '<timeSeriesResponse xmlns="http://www.cuahsi.org/waterML/1.1/">' +
+        ''.join([
+            '<timeSeries><values><value>%s</value></values></timeSeries>' % i
+            for i in range(1000)
+        ]) + '</timeSeriesResponse>').encode('utf-8')
+
+    seen = 0
+    for element in ulmo.waterml.common._iter_elements(
+            io.BytesIO(content), namespace + 'timeSeries'):
+        # only the last element, now empty, is left before this one
+        previous = element.getprevious()
+        if previous is not None:
+            assert len(previous) == 0
+            assert previous.getprevious() is None
+        assert element.find(namespace + 'values/' + namespace + 'value').text \
+            == str(seen)
+        seen += 1
+    assert seen == 1000
+
+
+def test_parsed_values_are_cleared():
+    namespace = '{http://www.cuahsi.org/waterML/1.1/}'
+    content = (
+        '<timeSeriesResponse xmlns="http://www.cuahsi.org/waterML/1.1/">'
+        '<timeSeries><values>' +
+        ''.join([
+            '<value dateTime="2012-10-25T00:%02d:00">%s</value>' % (i % 60, i)
+            for i in range(1000)
+        ]) + '<method methodID="1"/></values></timeSeries>'
+        '</timeSeriesResponse>').encode('utf-8')
+
+    seen = 0
+    for element, series_values in ulmo.waterml.common._iter_time_series(
+            io.BytesIO(content), namespace):
+        # only the last value, now empty, is left when the series is yielded
+        value_elements = element.findall(
+                namespace + 'values/' + namespace + 'value')
+        assert len(value_elements) == 1
+        assert value_elements[0].text is None
+        values_element, values = series_values[0]
+        assert values_element.find(namespace + 'method') is not None
+        assert [value['value'] for value in values] == [
+            str(i) for i in range(1000)]
+        seen += 1
+    assert seen == 1
+
+
+class _UnseekableFile(io.RawIOBase):
+    def __init__(self, path):
+        self._f = open(path, 'rb')
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self._f.readinto(b)
+
+    def close(self):
+        self._f.close()
+        super(_UnseekableFile, self).close()
+
+
+def test_parse_site_infos_reads_file_once():
+    site_file = test_util.get_test_file_path('usgs/nwis/RI_daily.xml')
+    with open(site_file, 'rb') as f:
+        expected = ulmo.waterml.v1_1.parse_site_infos(f)
+    with _UnseekableFile(site_file) as f:
+        site_infos = ulmo.waterml.v1_1.parse_site_infos(f)
+
+    assert site_infos == expected
+    assert len(site_infos) > 0
+
+
+def test_parse_all_matches_parse_functions():
+    value_file = test_util.get_test_file_path(
+            'usgs/nwis/site_07335390_instantaneous.xml')
+    with open(value_file, 'rb') as content_io:
+        parsed = ulmo.waterml.v1_1.parse_all(content_io, '2000-01-01')
+        parse_functions = [
+            ('site_infos', ulmo.waterml.v1_1.parse_site_infos),
+            ('sites', ulmo.waterml.v1_1.parse_sites),
+            ('values', lambda f: ulmo.waterml.v1_1.parse_site_values(
+                f, '2000-01-01')),
+            ('variables', ulmo.waterml.v1_1.parse_variables),
+        ]
+        for key, parse_function in parse_functions:
+            content_io.seek(0)
+            assert parsed[key] == parse_function(content_io), key
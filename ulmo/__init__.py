@@ -6,17 +6,49 @@
 """
 from __future__ import (absolute_import, division, print_function)
 
+import importlib
+import sys
+
 # ulmo version PEP-0440
 __version__ = '0.8.8'
 
-from . import cdec
-from . import cpc
-from . import cuahsi
-from . import lcra
-from . import nasa
-from . import ncdc
-from . import noaa
-from . import twc
-from . import usace
-from . import usgs
-from . import util
+
+def _lazy_submodules(package_name, submodule_names):
+    """Returns module-level ``__getattr__`` and ``__dir__`` functions (PEP 562)
+    for a package that import its submodules the first time they are
+    accessed, so importing a package doesn't import every data provider and
+    its dependencies. Python versions without module ``__getattr__`` (before
+    3.7) import the submodules right away.
+    """
+    package = sys.modules[package_name]
+
+    def __getattr__(name):
+        if name in submodule_names:
+            return importlib.import_module('.' + name, package_name)
+        raise AttributeError(
+            "module %r has no attribute %r" % (package_name, name))
+
+    def __dir__():
+        return sorted(set(vars(package)) | set(submodule_names))
+
+    if sys.version_info < (3, 7):
+        for name in submodule_names:
+            __getattr__(name)
+    return __getattr__, __dir__
+
+
+__all__ = [
+    'cdec',
+    'cpc',
+    'cuahsi',
+    'lcra',
+    'nasa',
+    'ncdc',
+    'noaa',
+    'twc',
+    'usace',
+    'usgs',
+    'util',
+    'waterml',
+]
+__getattr__, __dir__ = _lazy_submodules(__name__, __all__)
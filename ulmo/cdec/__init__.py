@@ -1 +1,4 @@
-from . import historical
\ No newline at end of file
+from ulmo import _lazy_submodules
+
+__all__ = ['historical']
+__getattr__, __dir__ = _lazy_submodules(__name__, __all__)
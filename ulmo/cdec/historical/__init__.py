@@ -3,5 +3,6 @@ from .core import (
         get_stations,
         get_sensors,
         get_station_sensors,
-        get_data
+        get_data,
+        get_data_async,
     )
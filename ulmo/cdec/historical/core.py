@@ -52,6 +52,7 @@
 
 """
 from builtins import str
+import io
 
 import pandas as pd
 
@@ -74,9 +75,12 @@ def get_stations():
     url = 'http://cdec.water.ca.gov/misc/all_stations.csv'
     # the csv is malformed, so some rows think there are 7-8 fields
     col_names = ['id', 'meta_url', 'name', 'num', 'lat', 'lon']
-    df = pd.read_csv(
-        url, names=col_names, header=None, quotechar="'", index_col=0, on_bad_lines='skip'
-    )
+    content_io = _open_url(url)
+    with util.timed('parse', provider='cdec.historical') as timing:
+        df = pd.read_csv(
+            content_io, names=col_names, header=None, quotechar="'", index_col=0, on_bad_lines='skip'
+        )
+        timing.records = len(df)
 
     return df
 
@@ -105,7 +109,10 @@ def get_sensors(sensor_id=None):
     """
 
     url = 'http://cdec.water.ca.gov/misc/senslist.html'
-    df = pd.read_html(url, header=0)[0]
+    content_io = _open_url(url)
+    with util.timed('parse', provider='cdec.historical') as timing:
+        df = pd.read_html(content_io, header=0)[0]
+        timing.records = len(df)
     df.set_index('Sensor No')
 
     if sensor_id is None:
@@ -161,10 +168,14 @@ def get_station_sensors(station_ids=None, sensor_ids=None, resolutions=None):
     for station_id in station_ids:
         url = 'http://cdec.water.ca.gov/dynamicapp/staMeta?station_id=%s' % station_id
 
-        try:
-            sensor_list = pd.read_html(url, match='Sensor Description')[0]
-        except:
-            sensor_list = pd.read_html(url)[0]
+        page = _open_url(url)
+        with util.timed('parse', provider='cdec.historical') as timing:
+            try:
+                sensor_list = pd.read_html(page, match='Sensor Description')[0]
+            except:
+                page.seek(0)
+                sensor_list = pd.read_html(page)[0]
+            timing.records = len(sensor_list)
     
         try:
             sensor_list.columns = ['sensor_id', 'variable', 'resolution', 'timerange']
@@ -178,7 +189,8 @@ def get_station_sensors(station_ids=None, sensor_ids=None, resolutions=None):
     return station_sensors
 
 
-def get_data(station_ids=None, sensor_ids=None, resolutions=None, start=None, end=None):
+def get_data(station_ids=None, sensor_ids=None, resolutions=None, start=None, end=None,
+        memory_limit=None):
     """
     Downloads data for a set of CDEC station and sensor ids. If either is not
     provided, all available data will be downloaded. Be really careful with
@@ -203,42 +215,84 @@ def get_data(station_ids=None, sensor_ids=None, resolutions=None, start=None, en
         Possible values are 'event', 'hourly', 'daily', and 'monthly' but not
         all of these time resolutions are available at every station.
 
+    memory_limit : ``None`` or int
+        If specified (a positive number), at most this many bytes of
+        downloaded data are kept in memory; the rest are spilled to disk and a
+        ulmo.util.SpillDict, which reads each station's data back when it is
+        looked up, is returned instead of a dict. Handy with
+        ``station_ids=None``; call its close() method to remove the spilled
+        data.
+
 
     Returns
     -------
-    dict : a python dict
+    dict : a python dict or ulmo.util.SpillDict
         a python dict with site codes as keys. Values will be nested dicts
         containing all the sensor/resolution combinations.
     """
 
-    if start is None:
-        start_date = util.convert_date(DEFAULT_START_DATE)
-    else:
-        start_date = util.convert_date(start)
-    if end is None:
-        end_date = util.convert_date(DEFAULT_END_DATE)
-    else:
-        end_date = util.convert_date(end)
-
-    start_date_str = _format_date(start_date)
-    end_date_str = _format_date(end_date)
+    start_date_str, end_date_str = _format_date_range(start, end)
 
     if station_ids is None:
         station_ids = get_stations().index
 
     sensors = get_station_sensors(station_ids, sensor_ids, resolutions)
 
-    d = {}
+    if memory_limit is not None:
+        d = util.SpillDict(memory_limit, combine=_merge_sensor_data)
+        for station_id in sensors:
+            d.add(station_id, {})
+        for station_id, var, sensor_id, dur_code in _sensor_downloads(sensors):
+            d.add(station_id, {var: _download_raw(station_id, sensor_id,
+                dur_code, start_date_str, end_date_str)})
+        return d
+
+    d = dict([(station_id, {}) for station_id in sensors])
+    for station_id, var, sensor_id, dur_code in _sensor_downloads(sensors):
+        d[station_id][var] = _download_raw(station_id, sensor_id, dur_code,
+                start_date_str, end_date_str)
+
+    return d
 
-    for station_id, sensor_list in list(sensors.items()):
-        station_data = {}
 
-        for index, row in sensor_list.iterrows():
-            res = row.loc['resolution']
-            var = row.loc['variable']
-            sensor_id = row.loc['sensor_id']
-            station_data[var] = _download_raw(station_id, sensor_id, _res_to_dur_code(res), start_date_str, end_date_str)
-        d[station_id] = station_data
+async def get_data_async(station_ids=None, sensor_ids=None, resolutions=None,
+        start=None, end=None, concurrency=None):
+    """
+    awaitable variant of get_data, which takes the same arguments. The sensor
+    lists of the stations and then the data for each of their sensors are
+    downloaded concurrently, at most `concurrency` at a time (by default, the
+    number of workers set with ulmo.util.configure_async). Each download is a
+    blocking request run in a thread of ulmo's shared worker pool.
+
+    Usage example::
+
+        import asyncio
+        from ulmo import cdec
+        dat = asyncio.run(cdec.historical.get_data_async(
+            ['PRA', 'NEW'], resolutions=['daily'], concurrency=4))
+    """
+    start_date_str, end_date_str = _format_date_range(start, end)
+
+    if station_ids is None:
+        station_ids = (await util.run_blocking(get_stations)).index
+
+    sensors = {}
+    for station_sensors in await util.gather_bounded([
+            util.run_blocking(get_station_sensors, [station_id], sensor_ids,
+                resolutions)
+            for station_id in station_ids], limit=concurrency):
+        sensors.update(station_sensors)
+
+    downloads = _sensor_downloads(sensors)
+    data = await util.gather_bounded([
+        util.run_blocking(_download_raw, station_id, sensor_id, dur_code,
+            start_date_str, end_date_str)
+        for station_id, var, sensor_id, dur_code in downloads
+    ], limit=concurrency)
+
+    d = dict([(station_id, {}) for station_id in sensors])
+    for (station_id, var, sensor_id, dur_code), df in zip(downloads, data):
+        d[station_id][var] = df
 
     return d
 
@@ -263,12 +317,31 @@ def _download_raw(station_id, sensor_num, dur_code, start_date, end_date):
           '&Start=' + start_date + \
           '&End=' + end_date
 
-    df = pd.read_csv(url, parse_dates=[4, 5], index_col='DATE TIME', na_values='---')
+    content_io = _open_url(url)
+    with util.timed('parse', provider='cdec.historical') as timing:
+        df = pd.read_csv(content_io, parse_dates=[4, 5], index_col='DATE TIME', na_values='---')
+        timing.records = len(df)
     df.columns = ['station_id', 'duration', 'sensor_number', 'sensor_type', 'obs_date', 'value', 'data_flag', 'units']
 
     return df
 
 
+def _merge_sensor_data(sensor_dicts):
+    merged = {}
+    for sensor_dict in sensor_dicts:
+        merged.update(sensor_dict)
+    return merged
+
+
+def _open_url(url):
+    """fetches url through the shared session and returns the response text as
+    a file-like object for the pandas readers
+    """
+    response = util.get_session('cdec.historical').get(url)
+    response.raise_for_status()
+    return io.StringIO(response.text)
+
+
 def _res_to_dur_code(res):
     code_map = {
         'hourly': 'H',
@@ -282,3 +355,28 @@ def _res_to_dur_code(res):
 
 def _format_date(date):
     return '{:02}/{:02}/{}'.format(date.month, date.day, date.year)
+
+
+def _format_date_range(start, end):
+    if start is None:
+        start_date = util.convert_date(DEFAULT_START_DATE)
+    else:
+        start_date = util.convert_date(start)
+    if end is None:
+        end_date = util.convert_date(DEFAULT_END_DATE)
+    else:
+        end_date = util.convert_date(end)
+
+    return _format_date(start_date), _format_date(end_date)
+
+
+def _sensor_downloads(sensors):
+    """returns a (station_id, variable, sensor_id, duration code) tuple for
+    each sensor in a dict of station sensor lists
+    """
+    return [
+        (station_id, row.loc['variable'], row.loc['sensor_id'],
+            _res_to_dur_code(row.loc['resolution']))
+        for station_id, sensor_list in list(sensors.items())
+        for index, row in sensor_list.iterrows()
+    ]
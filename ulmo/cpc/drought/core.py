@@ -15,7 +15,6 @@ from past.utils import old_div
 
 import datetime
 import os
-import requests
 
 import numpy as np
 import pandas
@@ -131,9 +130,16 @@ def get_data(state=None, climate_division=None, start=None, end=None,
     else:
         state_code = None
 
+    # fetch the file for every year concurrently before parsing any of them
+    years = list(range(start_year, end_year + 1))
+    data_urls = [_get_data_url(year) for year in years]
+    util.download_many([
+        (url, _data_file_path(url))
+        for url, current_year_flag in data_urls
+    ])
+
     data = None
-    for year in range(start_year, end_year + 1):
-        url, current_year_flag = _get_data_url(year)
+    for year, (url, current_year_flag) in zip(years, data_urls):
         format_type = _get_data_format(year)
         with _open_data_file(url) as data_file:
             year_data = _parse_data_file(data_file, format_type, year, current_year_flag)
@@ -143,7 +149,9 @@ def get_data(state=None, climate_division=None, start=None, end=None,
         if climate_division:
             year_data = year_data[year_data['climate_division'] == climate_division]
 
-        year_data = _reindex_data(year_data)
+        with util.timed('dataframe', provider='cpc.drought') as timing:
+            year_data = _reindex_data(year_data)
+            timing.records = len(year_data)
 
         if data is None:
             data = year_data
@@ -212,6 +220,11 @@ def _convert_week_numbers(dataframe):
     return merged[column_names]
 
 
+def _data_file_path(url):
+    file_name = url.rsplit('/', 1)[-1]
+    return os.path.join(CPC_DROUGHT_DIR, file_name)
+
+
 def _first_sunday(year):
     """returns the first Sunday of a growing season, which is the first Sunday
     after the first Wednesday in March
@@ -255,10 +268,10 @@ def _get_data_url(year):
 
 
 def _open_data_file(url):
-    """returns an open file handle for a data file; downloading if necessary or otherwise using a previously downloaded file"""
-    file_name = url.rsplit('/', 1)[-1]
-    file_path = os.path.join(CPC_DROUGHT_DIR, file_name)
-    return util.open_file_for_url(url, file_path, check_modified=True, use_bytes=True)
+    """returns an open file handle for a data file that has already been
+    downloaded
+    """
+    return open(_data_file_path(url), 'rb')
 
 
 def _parse_data_file(data_file, palmer_format, year, current_year_flag):
@@ -296,10 +309,14 @@ def _parse_data_file(data_file, palmer_format, year, current_year_flag):
     ]
 
     decodef = lambda x: x.decode("utf-8")
-    data_array = np.genfromtxt(data_file, dtype=dtype, delimiter=delim_sequence, usecols=use_columns)
+    with util.timed('parse', provider='cpc.drought') as timing:
+        data_array = np.genfromtxt(data_file, dtype=dtype, delimiter=delim_sequence, usecols=use_columns)
+        timing.records = len(data_array)
     if not current_year_flag:
         data_array['year'] = year
-    dataframe = pandas.DataFrame(data_array)
+    with util.timed('dataframe', provider='cpc.drought') as timing:
+        dataframe = pandas.DataFrame(data_array)
+        timing.records = len(dataframe)
     return dataframe
 
 
@@ -321,7 +338,7 @@ def _reindex_data(dataframe):
 
 
 def _url_exists(url):
-    return requests.head(url).status_code == 200
+    return util.get_session('cpc.drought').head(url).status_code == 200
 
 
 def _value_dict(value):
@@ -1,2 +1,4 @@
-from . import wof
-from . import his_central
+from ulmo import _lazy_submodules
+
+__all__ = ['wof', 'his_central']
+__getattr__, __dir__ = _lazy_submodules(__name__, __all__)
@@ -42,9 +42,11 @@ def get_services(bbox=None, user_cache=False):
         cache_dir = os.path.join(util.get_ulmo_dir(), 'suds')
         util.mkdir_if_doesnt_exist(cache_dir)
         suds_client = suds.client.Client(HIS_CENTRAL_WSDL_URL,
-                                          cache=ObjectCache(location=cache_dir))
+                                          cache=ObjectCache(location=cache_dir),
+                                          transport=util.suds_transport('cuahsi.his_central'))
     else:
-        suds_client = suds.client.Client(HIS_CENTRAL_WSDL_URL)
+        suds_client = suds.client.Client(HIS_CENTRAL_WSDL_URL,
+                                          transport=util.suds_transport('cuahsi.his_central'))
 
     if bbox is None:
         services = suds_client.service.GetWaterOneFlowServiceInfo()
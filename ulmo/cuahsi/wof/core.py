@@ -10,6 +10,7 @@ standard_library.install_aliases()
 import os
 from builtins import str
 import io
+import threading
 
 import suds.client
 from suds.cache import ObjectCache
@@ -19,7 +20,9 @@ from ulmo import util
 from ulmo import waterml
 
 
-_suds_client = None
+# suds clients are not thread safe, so each thread keeps its own clients,
+# keyed on the options they were created with
+_suds_clients = threading.local()
 
 
 def get_sites(wsdl_url, suds_cache=("default",), timeout=None, user_cache=False):
@@ -59,11 +62,11 @@ def get_sites(wsdl_url, suds_cache=("default",), timeout=None, user_cache=False)
     if waterml_version == '1.0':
         response = suds_client.service.GetSitesXml('')
         response_buffer = io.BytesIO(util.to_bytes(response))
-        sites = waterml.v1_0.parse_site_infos(response_buffer)
+        sites = _parse_response(waterml.v1_0.parse_site_infos, response_buffer)
     elif waterml_version == '1.1':
         response = suds_client.service.GetSites('')
         response_buffer = io.BytesIO(util.to_bytes(response))
-        sites = waterml.v1_1.parse_site_infos(response_buffer)
+        sites = _parse_response(waterml.v1_1.parse_site_infos, response_buffer)
 
     return dict([
         (site['network'] + ':' + site['code'], site)
@@ -110,11 +113,11 @@ def get_site_info(wsdl_url, site_code, suds_cache=("default",), timeout=None, us
     if waterml_version == '1.0':
         response = suds_client.service.GetSiteInfo(site_code)
         response_buffer = io.BytesIO(util.to_bytes(response))
-        sites = waterml.v1_0.parse_sites(response_buffer)
+        sites = _parse_response(waterml.v1_0.parse_sites, response_buffer)
     elif waterml_version == '1.1':
         response = suds_client.service.GetSiteInfo(site_code)
         response_buffer = io.BytesIO(util.to_bytes(response))
-        sites = waterml.v1_1.parse_sites(response_buffer)
+        sites = _parse_response(waterml.v1_1.parse_sites, response_buffer)
 
     if len(sites) == 0:
         return {}
@@ -209,11 +212,13 @@ def get_values(wsdl_url, site_code, variable_code, start=None, end=None,
         site_code, variable_code, startDate=start_dt_isostr,
         endDate=end_dt_isostr)
 
-    response_buffer = io.BytesIO(util.to_bytes(response))
+    # suds hands back the WaterML as one decoded string; encode it as it is
+    # parsed rather than making a second, encoded copy of the whole response
+    response_buffer = util.EncodedTextStream(response)
     if waterml_version == '1.0':
-        values = waterml.v1_0.parse_site_values(response_buffer)
+        values = _parse_response(waterml.v1_0.parse_site_values, response_buffer)
     elif waterml_version == '1.1':
-        values = waterml.v1_1.parse_site_values(response_buffer)
+        values = _parse_response(waterml.v1_1.parse_site_values, response_buffer)
 
     if not variable_code is None:
         return list(values.values())[0]
@@ -266,9 +271,9 @@ def get_variable_info(wsdl_url, variable_code=None,
     response_buffer = io.BytesIO(util.to_bytes(response))
 
     if waterml_version == '1.0':
-        variable_info = waterml.v1_0.parse_variables(response_buffer)
+        variable_info = _parse_response(waterml.v1_0.parse_variables, response_buffer)
     elif waterml_version == '1.1':
-        variable_info = waterml.v1_1.parse_variables(response_buffer)
+        variable_info = _parse_response(waterml.v1_1.parse_variables, response_buffer)
 
     if not variable_code is None and len(variable_info) == 1:
         return list(variable_info.values())[0]
@@ -279,6 +284,14 @@ def get_variable_info(wsdl_url, variable_code=None,
         ])
 
 
+def _parse_response(parse_function, response_buffer):
+    """parses a WaterML response with parse_function, timing the parsing"""
+    with util.timed('parse', provider='cuahsi.wof') as timing:
+        parsed = parse_function(response_buffer)
+        timing.records = len(parsed)
+    return parsed
+
+
 def _waterml_version(suds_client):
     tns_str = str(suds_client.wsdl.tns[1])
     if tns_str == 'http://www.cuahsi.org/his/1.0/ws/':
@@ -292,9 +305,9 @@ def _waterml_version(suds_client):
 
 def _get_client(wsdl_url, suds_cache=("default",), suds_timeout=None, user_cache=False):
     """
-    Open and re-use (persist) a suds.client.Client instance _suds_client throughout
-    the session, to minimize WOF server impact and improve performance.  _suds_client
-    is global in scope.
+    Open and re-use (persist) suds.client.Client instances throughout the
+    session, to minimize WOF server impact and improve performance. Clients
+    are kept per thread, so that concurrent requests don't share a client.
 
     Parameters
     ----------
@@ -317,24 +330,30 @@ def _get_client(wsdl_url, suds_cache=("default",), suds_timeout=None, user_cache
 
     Returns
     -------
-    _suds_client : suds Client
+    suds_client : suds Client
         Newly or previously instantiated (reused) suds Client object.
     """
-    global _suds_client
+    clients = getattr(_suds_clients, 'clients', None)
+    if clients is None:
+        clients = _suds_clients.clients = {}
+    key = (wsdl_url, repr(suds_cache), suds_timeout, user_cache)
+    suds_client = clients.get(key)
 
     # Handle new or changed client request (create new client)
-    if _suds_client is None or _suds_client.wsdl.url != wsdl_url or not suds_timeout is None:
+    if suds_client is None or suds_client.wsdl.url != wsdl_url:
         if user_cache:
             cache_dir = os.path.join(util.get_ulmo_dir(), 'suds')
             util.mkdir_if_doesnt_exist(cache_dir)
-            _suds_client = suds.client.Client(wsdl_url, cache=ObjectCache(location=cache_dir))
+            suds_client = suds.client.Client(wsdl_url, cache=ObjectCache(location=cache_dir),
+                                             transport=util.suds_transport('cuahsi.wof'))
         else:
-            _suds_client = suds.client.Client(wsdl_url)
+            suds_client = suds.client.Client(wsdl_url,
+                                             transport=util.suds_transport('cuahsi.wof'))
 
         if suds_cache is None:
-            _suds_client.set_options(cache=None)
+            suds_client.set_options(cache=None)
         else:
-            cache = _suds_client.options.cache
+            cache = suds_client.options.cache
             # could add some error catching ...
             if suds_cache[0] == "default":
                 cache.setduration(days=1)
@@ -342,6 +361,7 @@ def _get_client(wsdl_url, suds_cache=("default",), suds_timeout=None, user_cache
                 cache.setduration(**dict([suds_cache]))
 
         if not suds_timeout is None:
-            _suds_client.set_options(timeout=suds_timeout)
+            suds_client.set_options(timeout=suds_timeout)
+        clients[key] = suds_client
 
-    return _suds_client
+    return suds_client
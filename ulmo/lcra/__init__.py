@@ -1,2 +1,4 @@
-from . import hydromet
-from . import waterquality
+from ulmo import _lazy_submodules
+
+__all__ = ['hydromet', 'waterquality']
+__getattr__, __dir__ = _lazy_submodules(__name__, __all__)
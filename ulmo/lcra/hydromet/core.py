@@ -13,7 +13,6 @@ import datetime
 from dateutil.relativedelta import relativedelta
 from geojson import Point, Feature, FeatureCollection
 import logging
-import requests
 import pandas
 
 from ulmo import util
@@ -78,7 +77,7 @@ def get_sites_by_type(site_type):
     if site_type not in site_types.keys():
         return {}
 
-    res = requests.get(sites_base_url % site_type)
+    res = util.get_session('lcra.hydromet').get(sites_base_url % site_type)
     soup = BeautifulSoup(res.content, 'html')
     sites_str = [
         site.text.replace('&nbsp', '').replace(u'\xa0', '') for site
@@ -92,7 +91,7 @@ def get_all_sites():
     """Returns list of all LCRA hydromet sites as geojson featurecollection.
     """
     sites_url = 'http://hydromet.lcra.org/data/datafull.xml'
-    res = requests.get(sites_url)
+    res = util.get_session('lcra.hydromet').get(sites_url)
     soup = BeautifulSoup(res.content, 'xml')
     rows = soup.findAll('row')
     features = [_create_feature(row) for row in rows]
@@ -137,14 +136,17 @@ def get_current_data(service, as_geojson=False):
         return {}
     request_body = request_body_template % service
     headers = {'Content-Type': 'text/xml; charset=utf-8'}
-    res = requests.post(current_data_url, data=request_body, headers=headers)
+    res = util.get_session('lcra.hydromet').post(current_data_url, data=request_body, headers=headers)
     if res.status_code != 200:
         log.info('http request failed with status code %s' % res.status_code)
         return {}
-    soup = BeautifulSoup(res.content)
-    sites_els = soup.findAll('cls%s' % service.lower().replace('get', ''))
-    current_values_dicts = [_parse_current_values(site_el) for site_el in
-                            sites_els]
+    with util.timed('parse', provider='lcra.hydromet') as timing:
+        soup = BeautifulSoup(res.content)
+        sites_els = soup.findAll('cls%s' % service.lower().replace('get', ''))
+        current_values_dicts = [_parse_current_values(site_el) for site_el in
+                                sites_els]
+        timing.bytes = len(res.content)
+        timing.records = len(current_values_dicts)
     if as_geojson:
         features = []
         for value_dict in current_values_dicts:
@@ -194,7 +196,7 @@ def get_site_data(site_code, parameter_code, as_dataframe=True,
     if parameter_code.lower() not in PARAMETERS.keys():
         log.info('%s is not an LCRA parameter' % parameter_code)
         return None
-    initial_request = requests.get(historical_data_url)
+    initial_request = util.get_session('lcra.hydromet').get(historical_data_url)
     if initial_request.status_code != 200:
         return None
     list_request_headers = {
@@ -291,12 +293,14 @@ def _parse_current_values(site_el):
 def _values_dict_to_df(values_dict):
     if not len(values_dict):
         return pandas.DataFrame({})
-    df = pandas.DataFrame(values_dict)
-    df.index = df['Date - Time'].apply(util.convert_datetime)
-    df.drop('Date - Time', axis=1, inplace=True)
-    df.sort_index(inplace=True)
-    df.dropna(axis=1, how='all', inplace=True)
-    df.dropna(axis=0, how='all', inplace=True)
+    with util.timed('dataframe', provider='lcra.hydromet') as timing:
+        df = pandas.DataFrame(values_dict)
+        df.index = df['Date - Time'].apply(util.convert_datetime)
+        df.drop('Date - Time', axis=1, inplace=True)
+        df.sort_index(inplace=True)
+        df.dropna(axis=1, how='all', inplace=True)
+        df.dropna(axis=0, how='all', inplace=True)
+        timing.records = len(df)
     return df
 
 
@@ -320,9 +324,12 @@ def _get_data(site_code, parameter_code, list_request, start, end):
     if data_request.status_code != 200:
         return None
 
-    soup = BeautifulSoup(data_request.content, 'html.parser')
-    columns = [col.get_text() for col in soup.findAll('th')]
-    values_dict = [_get_row_values(row, columns) for row in soup.findAll('tr')[1:]]
+    with util.timed('parse', provider='lcra.hydromet') as timing:
+        soup = BeautifulSoup(data_request.content, 'html.parser')
+        columns = [col.get_text() for col in soup.findAll('th')]
+        values_dict = [_get_row_values(row, columns) for row in soup.findAll('tr')[1:]]
+        timing.bytes = len(data_request.content)
+        timing.records = len(values_dict)
     return values_dict
 
 
@@ -341,7 +348,7 @@ def _extract_headers_for_next_request(request):
 def _make_next_request(url, previous_request, data):
     data_headers = _extract_headers_for_next_request(previous_request)
     data_headers.update(data)
-    return requests.post(url, cookies=previous_request.cookies, data=data_headers)
+    return util.get_session('lcra.hydromet').post(url, cookies=previous_request.cookies, data=data_headers)
 
 
 def _parse_val(val):
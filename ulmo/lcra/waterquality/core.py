@@ -8,6 +8,7 @@
     .. _Water Quality: http://waterquality.lcra.org/
 """
 from bs4 import BeautifulSoup
+import io
 import logging
 from geojson import Point, Feature, FeatureCollection
 # import unicode
@@ -24,8 +25,6 @@ LCRA_WATERQUALITY_DIR = op.join(util.get_ulmo_dir(), 'lcra/waterquality')
 
 log = logging.getLogger(__name__)
 
-import requests
-
 
 import pandas as pd
 
@@ -65,7 +64,7 @@ def get_sites(source_agency=None):
     sites_geojson : geojson FeatureCollection
     """
     sites_url = 'http://waterquality.lcra.org/'
-    response = requests.get(sites_url)
+    response = util.get_session('lcra.waterquality').get(sites_url)
     lines = response.content.decode('utf-8').split('\n')
     sites_unprocessed = [
         line.strip().strip('createMarker').strip("(").strip(")").split(',')
@@ -119,7 +118,7 @@ def get_historical_data(site_code, start=None, end=None, as_dataframe=False):
     waterquality_url = "http://waterquality.lcra.org/parameter.aspx?qrySite=%s" % site_code
     waterquality_url2 = 'http://waterquality.lcra.org/events.aspx'
 
-    initial_request = requests.get(waterquality_url)
+    initial_request = util.get_session('lcra.waterquality').get(waterquality_url)
     initialsoup = BeautifulSoup(initial_request.content, 'html.parser')
 
     sitevals = [statag.get('value', None)
@@ -131,21 +130,24 @@ def get_historical_data(site_code, start=None, end=None, as_dataframe=False):
                                 {'multiple': sitevals,
                                 'site': site_code})
 
-    soup = BeautifulSoup(result.content, 'html.parser')
+    with util.timed('parse', provider='lcra.waterquality') as timing:
+        soup = BeautifulSoup(result.content, 'html.parser')
 
-    gridview = soup.find(id="GridView1")
+        gridview = soup.find(id="GridView1")
 
-    results = []
+        results = []
 
-    headers = [head.text for head in gridview.findAll('th')]
+        headers = [head.text for head in gridview.findAll('th')]
 
-    # uses \xa0 for blank
+        # uses \xa0 for blank
 
-    for row in gridview.findAll('tr'):
-        vals = [_parse_val(aux.text) for aux in row.findAll('td')]
-        if len(vals) == 0:
-            continue
-        results.append(dict(zip(headers, vals)))
+        for row in gridview.findAll('tr'):
+            vals = [_parse_val(aux.text) for aux in row.findAll('td')]
+            if len(vals) == 0:
+                continue
+            results.append(dict(zip(headers, vals)))
+        timing.bytes = len(result.content)
+        timing.records = len(results)
 
     data = _create_dataframe(results)
 
@@ -185,7 +187,11 @@ def get_recent_data(site_code, as_dataframe=False):
         return {}
     data_url = 'http://waterquality.lcra.org/salinity.aspx?sNum=%s&name=%s' % (
         site_code, real_time_sites[site_code])
-    data = pd.read_html(data_url, header=0)[1]
+    response = util.get_session('lcra.waterquality').get(data_url)
+    response.raise_for_status()
+    with util.timed('parse', provider='lcra.waterquality') as timing:
+        data = pd.read_html(io.StringIO(response.text), header=0)[1]
+        timing.records = len(data)
     data.index = data['Date - Time'].apply(lambda x: util.convert_datetime(
         x))
     data.drop('Date - Time', axis=1, inplace=True)
@@ -224,11 +230,13 @@ def get_site_info(site_code):
 
 
 def _create_dataframe(results):
-    df = pd.DataFrame.from_records(results)
-    df['Date'] = df['Date'].apply(util.convert_date)
-    df.set_index(['Date'], inplace=True)
-    df.dropna(how='all', axis=0, inplace=True)
-    df.dropna(how='all', axis=1, inplace=True)
+    with util.timed('dataframe', provider='lcra.waterquality') as timing:
+        df = pd.DataFrame.from_records(results)
+        df['Date'] = df['Date'].apply(util.convert_date)
+        df.set_index(['Date'], inplace=True)
+        df.dropna(how='all', axis=0, inplace=True)
+        df.dropna(how='all', axis=1, inplace=True)
+        timing.records = len(df)
     return df
 
 
@@ -285,7 +293,7 @@ def _get_water_body(site_type_code):
 def _make_next_request(url, previous_request, data):
     data_headers = _extract_headers_for_next_request(previous_request)
     data_headers.update(data)
-    return requests.post(url, cookies=previous_request.cookies, data=data_headers)
+    return util.get_session('lcra.waterquality').post(url, cookies=previous_request.cookies, data=data_headers)
 
 
 def _parse_val(val):
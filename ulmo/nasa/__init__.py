@@ -1,2 +1,6 @@
 from __future__ import absolute_import
-from . import daymet
\ No newline at end of file
+
+from ulmo import _lazy_submodules
+
+__all__ = ['daymet']
+__getattr__, __dir__ = _lazy_submodules(__name__, __all__)
@@ -8,7 +8,7 @@ from __future__ import absolute_import
 
 from . import core
 
-from .core import (get_daymet_singlepixel)
+from .core import (get_daymet_singlepixel, get_daymet_singlepixel_async)
 from .core import (get_variables)
 
 from ulmo import util
\ No newline at end of file
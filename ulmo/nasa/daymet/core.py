@@ -18,7 +18,6 @@ import datetime
 import time
 import logging
 
-import requests
 import pandas as pd
 
 from ulmo import util
@@ -109,9 +108,13 @@ def get_daymet_singlepixel(latitude, longitude,
 
     url = _get_service_url(url_params)
     log.info("making request for latitude, longitude: {}, {}".format(latitude, longitude))
-    df = pd.read_csv(url, header=6)
-    df.year, df.yday = df.year.astype('int'), df.yday.astype('int')
-    df.index = pd.to_datetime(df.year.astype('str') + '-' + df.yday.astype('str'), format="%Y-%j")
+    response = util.get_session('nasa.daymet').get(url)
+    response.raise_for_status()
+    with util.timed('parse', provider='nasa.daymet') as timing:
+        df = pd.read_csv(io.StringIO(response.text), header=6)
+        df.year, df.yday = df.year.astype('int'), df.yday.astype('int')
+        df.index = pd.to_datetime(df.year.astype('str') + '-' + df.yday.astype('str'), format="%Y-%j")
+        timing.records = len(df)
     df.columns = [c[:c.index('(')].strip() if '(' in c else c for c in df.columns ]
     if as_dataframe:
         return df
@@ -123,6 +126,15 @@ def get_daymet_singlepixel(latitude, longitude,
         return results
 
 
+async def get_daymet_singlepixel_async(latitude, longitude, **kwargs):
+    """awaitable version of get_daymet_singlepixel, with the same arguments;
+    get_daymet_singlepixel runs in a thread of ulmo's shared worker pool (see
+    ulmo.util.configure_async)
+    """
+    return await util.run_blocking(get_daymet_singlepixel, latitude,
+            longitude, **kwargs)
+
+
 def _check_variables(variables):
     """make sure all variables are in list
     """
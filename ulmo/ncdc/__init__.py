@@ -1,4 +1,6 @@
 from __future__ import absolute_import
-from . import cirs
-from . import ghcn_daily
-from . import gsod
+
+from ulmo import _lazy_submodules
+
+__all__ = ['cirs', 'ghcn_daily', 'gsod']
+__getattr__, __dir__ = _lazy_submodules(__name__, __all__)
@@ -223,7 +223,9 @@ def _parse_values(file_handle, by_state, location_names, element):
     columns = id_columns + month_columns
 
     na_values = [NO_DATA_VALUES.get(element)]
-    parsed = util.parse_fwf(file_handle, columns, na_values=na_values)
+    with util.timed('parse', provider='ncdc.cirs', element=element) as timing:
+        parsed = util.parse_fwf(file_handle, columns, na_values=na_values)
+        timing.records = len(parsed)
 
     month_columns = [id_column[0] for id_column in id_columns]
     melted = pandas.melt(parsed, id_vars=month_columns)\
@@ -5,4 +5,4 @@
     .. _National Climatic Data Center: http://www.ncdc.noaa.gov
     .. _Global Historical Climate Network - Daily: http://www.ncdc.noaa.gov/oa/climate/ghcn-daily/
 """
-from .core import (get_data, get_stations)
+from .core import (get_data, get_data_async, get_stations)
@@ -25,7 +25,8 @@ from ulmo import util
 GHCN_DAILY_DIR = os.path.join(util.get_ulmo_dir(), 'ncdc/ghcn_daily')
 
 
-def get_data(station_id, elements=None, update=True, as_dataframe=False):
+def get_data(station_id, elements=None, update=True, as_dataframe=False,
+        as_timeseries=False):
     """Retrieves data for a given station.
 
 
@@ -46,6 +47,10 @@ def get_data(station_id, elements=None, update=True, as_dataframe=False):
         pandas.DataFrame objects will be returned. The pandas dataframe is used
         internally, so setting this to ``True`` is a little bit faster as it
         skips a serialization step.
+    as_timeseries : bool
+        If ``True``, element codes are mapped to ulmo.util.TimeSeries objects
+        with the values and their flags, which use much less memory than value
+        dicts.
 
 
     Returns
@@ -76,7 +81,10 @@ def get_data(station_id, elements=None, update=True, as_dataframe=False):
 
     station_file_path = _get_ghcn_file(
         station_id + '.dly', check_modified=update)
-    station_data = util.parse_fwf(station_file_path, columns, na_values=[-9999])
+    with util.timed('parse', provider='ncdc.ghcn_daily') as timing:
+        station_data = util.parse_fwf(station_file_path, columns, na_values=[-9999])
+        timing.bytes = os.path.getsize(station_file_path)
+        timing.records = len(station_data)
 
     dataframes = {}
 
@@ -99,22 +107,32 @@ def get_data(station_id, elements=None, update=True, as_dataframe=False):
         # XXX: hackish; pandas support for this sort of thing will probably be
         # added soon
         month_starts = (monthly_index - 1).asfreq('D') + 1
-        dataframe = pandas.DataFrame(
-                columns=['value', 'mflag', 'qflag', 'sflag'], index=daily_index)
-
-        for day_of_month in range(1, 32):
-            dates = [date for date in (month_starts + day_of_month - 1)
-                    if date.day == day_of_month]
-            if not len(dates):
-                continue
-            months = pandas.PeriodIndex([pandas.Period(date, 'M') for date in dates])
-            for column_name in dataframe.columns:
-                col = column_name + str(day_of_month)
-                dataframe[column_name][dates] = element_df[col][months].values
+        with util.timed('dataframe', provider='ncdc.ghcn_daily',
+                element=element_name) as timing:
+            dataframe = pandas.DataFrame(
+                    columns=['value', 'mflag', 'qflag', 'sflag'], index=daily_index)
+
+            for day_of_month in range(1, 32):
+                dates = [date for date in (month_starts + day_of_month - 1)
+                        if date.day == day_of_month]
+                if not len(dates):
+                    continue
+                months = pandas.PeriodIndex([pandas.Period(date, 'M') for date in dates])
+                for column_name in dataframe.columns:
+                    col = column_name + str(day_of_month)
+                    dataframe[column_name][dates] = element_df[col][months].values
+            timing.records = len(dataframe)
 
         dataframes[element_name] = dataframe
 
-    if as_dataframe:
+    if as_timeseries:
+        return dict([
+            (key, util.TimeSeries.from_dataframe(dataframe,
+                value_columns=['value'],
+                metadata={'station_id': station_id, 'element': key}))
+            for key, dataframe in dataframes.items()
+        ])
+    elif as_dataframe:
         return dataframes
     else:
         return dict([
@@ -123,6 +141,18 @@ def get_data(station_id, elements=None, update=True, as_dataframe=False):
         ])
 
 
+async def get_data_async(station_id, elements=None, update=True,
+        as_dataframe=False, as_timeseries=False):
+    """awaitable variant of get_data, which takes the same arguments; get_data
+    runs in a thread of ulmo's shared worker pool (see
+    ulmo.util.configure_async). Several stations can be fetched on one event
+    loop with ulmo.util.gather_bounded.
+    """
+    return await util.run_blocking(get_data, station_id, elements=elements,
+            update=update, as_dataframe=as_dataframe,
+            as_timeseries=as_timeseries)
+
+
 def get_stations(country=None, state=None, elements=None, start_year=None,
         end_year=None, update=True, as_dataframe=False):
     """Retrieves station information, optionally limited to specific parameters.
@@ -182,7 +212,10 @@ def get_stations(country=None, state=None, elements=None, start_year=None,
     ]
 
     stations_file = _get_ghcn_file('ghcnd-stations.txt', check_modified=update)
-    stations = util.parse_fwf(stations_file, columns)
+    with util.timed('parse', provider='ncdc.ghcn_daily') as timing:
+        stations = util.parse_fwf(stations_file, columns)
+        timing.bytes = os.path.getsize(stations_file)
+        timing.records = len(stations)
 
     if not country is None:
         stations = stations[stations['country'] == country]
@@ -256,4 +289,8 @@ def _get_inventory(update=True):
 
     inventory_file = _get_ghcn_file('ghcnd-inventory.txt',
             check_modified=update)
-    return util.parse_fwf(inventory_file, columns)
+    with util.timed('parse', provider='ncdc.ghcn_daily') as timing:
+        inventory = util.parse_fwf(inventory_file, columns)
+        timing.bytes = os.path.getsize(inventory_file)
+        timing.records = len(inventory)
+    return inventory
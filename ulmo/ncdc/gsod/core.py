@@ -14,12 +14,15 @@ from past.builtins import basestring
 from contextlib import contextmanager
 import csv
 import datetime
+import functools
 import gzip
+import io
 import itertools
 import os
 import tarfile
 
 import numpy as np
+import pandas
 
 from ulmo import util
 
@@ -66,7 +69,8 @@ def get_parameters():
                 'FRSHTT' : 'FRSHTT'}
     return VARIABLES
 
-def get_data(station_codes, start=None, end=None, parameters=None):
+def get_data(station_codes, start=None, end=None, parameters=None,
+        as_timeseries=False, memory_limit=None):
     """Retrieves data for a set of stations.
 
 
@@ -80,11 +84,22 @@ def get_data(station_codes, start=None, end=None, parameters=None):
         If specified, data are limited to values before this date.
     parameters : ``None``, str or list
         If specified, data are limited to this set of parameter codes.
+    as_timeseries : bool
+        If ``True``, station codes are mapped to ulmo.util.TimeSeries objects
+        rather than lists of value dicts, which use much less memory.
+    memory_limit : ``None`` or int
+        If specified (a positive number), at most this many bytes of parsed
+        data are held in memory while reading the yearly files; the rest are
+        spilled to disk, and a ulmo.util.SpillDict is returned in place of the
+        dict. Its values are read back from disk (and converted to value dicts
+        or TimeSeries) one station at a time, when they are looked up. This is
+        meant for requests for many stations; call its close() method to
+        remove the spilled data when you're done with it.
 
 
     Returns
     -------
-    data_dict : dict
+    data_dict : dict or ulmo.util.SpillDict
         Dict with station codes keyed to lists of value dicts.
     """
     if start:
@@ -98,18 +113,32 @@ def get_data(station_codes, start=None, end=None, parameters=None):
     if isinstance(parameters, basestring):
         parameters = [parameters]
     if parameters and not 'date' in parameters:
-        # add date to list of parameters if it's not there already
-        parameters.insert(0, 'date')
+        # add date to list of parameters if it's not there already (without
+        # modifying the caller's list)
+        parameters = ['date'] + list(parameters)
     if isinstance(station_codes, basestring):
         station_codes = [station_codes]
 
     # note: opening tar files and parsing the headers and such is a relatively
     # lengthy operation so you don't want to do it too often, hence try to
     # grab all stations at the same time per tarfile
-    data_dict = dict([(station_code, None) for station_code in station_codes])
-
-    for year in range(start_date.year, end_date.year + 1):
-        tar_path = _get_gsod_file(year)
+    if memory_limit is None:
+        data_dict = dict([
+            (station_code, None) for station_code in station_codes])
+    else:
+        data_dict = util.SpillDict(memory_limit, combine=np.concatenate,
+                convert=functools.partial(_convert_record_array,
+                    as_timeseries=as_timeseries))
+        for station_code in station_codes:
+            data_dict.add(station_code)
+
+    # the yearly tar files are large, so fetch all of them concurrently before
+    # reading any
+    years = list(range(start_date.year, end_date.year + 1))
+    util.download_many([_gsod_url_and_path(year) for year in years])
+
+    for year in years:
+        tar_path = _gsod_url_and_path(year)[1]
         with tarfile.open(tar_path, 'r:') as gsod_tar:
             stations_in_file = [
                 name.split('./')[-1].rsplit('-', 1)[0]
@@ -118,8 +147,13 @@ def get_data(station_codes, start=None, end=None, parameters=None):
                 stations = list(set(station_codes) & set(stations_in_file))
             else:
                 stations = stations_in_file
-            for station in stations:
-                year_data = _read_gsod_file(gsod_tar, station, year)
+            # the station files are parsed in the parse pool if that is
+            # enabled, with each file read from the tar as a worker is free
+            station_files = (
+                (_read_gsod_member(gsod_tar, station, year), station, year)
+                for station in stations)
+            parsed_files = util.parse_many(_parse_gsod_file, station_files)
+            for station, year_data in zip(stations, parsed_files):
                 if parameters:
                     year_data = _subset_record_array(year_data, parameters)
                 if not year_data is None:
@@ -132,15 +166,20 @@ def get_data(station_codes, start=None, end=None, parameters=None):
                             mask = mask & (year_data['date'] <= end_date)
                         year_data = year_data[mask]
 
-                    if not data_dict[station] is None:
+                    if memory_limit is not None:
+                        data_dict.add(station, year_data)
+                    elif not data_dict[station] is None:
                         # XXX: this could be more efficient for large numbers
                         # of years with a list comprehension or generator
                         data_dict[station] = np.append(data_dict[station], year_data)
                     else:
                         data_dict[station] = year_data
+    if memory_limit is not None:
+        return data_dict
     for station, data_array in data_dict.items():
         if not data_dict[station] is None:
-            data_dict[station] = _record_array_to_value_dicts(data_array)
+            data_dict[station] = _convert_record_array(station, data_array,
+                    as_timeseries)
     return data_dict
 
 
@@ -226,12 +265,11 @@ def _convert_date_string(date_string):
     return datetime.datetime.strptime(date_string, '%Y%m%d').date()
 
 
-def _get_gsod_file(year):
+def _gsod_url_and_path(year):
     url = 'http://www1.ncdc.noaa.gov/pub/data/gsod/%s/gsod_%s.tar' % (year, year)
     filename = url.split('/')[-1]
     path = os.path.join(NCDC_GSOD_DIR, filename)
-    util.download_if_new(url, path, check_modified=True)
-    return path
+    return url, path
 
 
 def _passes_row_filter(row, country=None, state=None, start_str=None,
@@ -268,19 +306,14 @@ def _process_station(station_row):
     return station_dict
 
 
-def _read_gsod_file(gsod_tar, station, year):
-    tar_station_filename = station + '-' + str(year) + '.op.gz'
-    try:
-        gsod_tar.getmember('./' + tar_station_filename)
-    except KeyError:
+def _parse_gsod_file(gzipped_data, station, year):
+    """parses the gzipped contents of a station's file into a record array;
+    this is run in the parse pool workers if that is enabled
+    """
+    if gzipped_data is None:
         return None
 
-    ncdc_temp_dir = os.path.join(NCDC_GSOD_DIR, 'temp')
-    util.mkdir_if_doesnt_exist(ncdc_temp_dir)
-    temp_path = os.path.join(ncdc_temp_dir, tar_station_filename)
-
-    gsod_tar.extract('./' + tar_station_filename, ncdc_temp_dir)
-    with gzip.open(temp_path, 'rb') as gunzip_f:
+    with gzip.GzipFile(fileobj=io.BytesIO(gzipped_data)) as gunzip_f:
         columns = [
             # name, length, # of spaces separating previous column, dtype
             ('USAF', 6, 0, 'U6'),
@@ -318,9 +351,12 @@ def _read_gsod_file(gsod_tar, station, year):
         delimiter = itertools.chain(*[column[1:3][::-1] for column in columns])
         usecols = list(range(1, len(columns) * 2, 2))
 
-        data = np.genfromtxt(gunzip_f, skip_header=1, delimiter=delimiter,
-                usecols=usecols, dtype=dtype, converters={5: _convert_date_string})
-    os.remove(temp_path)
+        # the file is gunzipped as it is read, so this includes decompression
+        with util.timed('parse', provider='ncdc.gsod', station=station,
+                year=year) as timing:
+            data = np.genfromtxt(gunzip_f, skip_header=1, delimiter=delimiter,
+                    usecols=usecols, dtype=dtype, converters={5: _convert_date_string})
+            timing.records = data.size
 
     # somehow we can end up with single-element arrays that are 0-dimensional??
     # (occurs on tyler's machine but is hard to reproduce)
@@ -330,6 +366,47 @@ def _read_gsod_file(gsod_tar, station, year):
     return data
 
 
+def _read_gsod_file(gsod_tar, station, year):
+    return _parse_gsod_file(_read_gsod_member(gsod_tar, station, year),
+            station, year)
+
+
+def _read_gsod_member(gsod_tar, station, year):
+    """returns the gzipped contents of a station's file in a yearly tar file,
+    or None if the station has no file for the year
+    """
+    tar_station_filename = station + '-' + str(year) + '.op.gz'
+    try:
+        member = gsod_tar.getmember('./' + tar_station_filename)
+    except KeyError:
+        return None
+
+    with util.timed('decompress', provider='ncdc.gsod', station=station,
+            year=year) as timing:
+        gzipped_data = gsod_tar.extractfile(member).read()
+        timing.bytes = member.size
+    return gzipped_data
+
+
+def _convert_record_array(station, record_array, as_timeseries=False):
+    with util.timed('dataframe', provider='ncdc.gsod',
+            station=station) as timing:
+        timing.records = len(record_array)
+        if as_timeseries:
+            return _record_array_to_timeseries(record_array, station)
+        else:
+            return _record_array_to_value_dicts(record_array)
+
+
+def _record_array_to_timeseries(record_array, station):
+    # the USAF and WBAN ids are the station code, which is kept once in the
+    # metadata
+    dataframe = pandas.DataFrame.from_records(record_array, exclude=[
+        name for name in ('USAF', 'WBAN') if name in record_array.dtype.names])
+    return util.TimeSeries.from_dataframe(dataframe.set_index('date'),
+            metadata={'station': station})
+
+
 def _record_array_to_value_dicts(record_array):
     names = record_array.dtype.names
     value_dicts = [
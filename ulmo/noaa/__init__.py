@@ -1 +1,4 @@
-from . import goes
+from ulmo import _lazy_submodules
+
+__all__ = ['goes']
+__getattr__, __dir__ = _lazy_submodules(__name__, __all__)
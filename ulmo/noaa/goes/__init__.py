@@ -5,4 +5,4 @@
     .. _GOES Data Collection System: https://www.noaasis.noaa.gov/GOES/GOES_DCS/goes_dcs.html
 """
 
-from .core import get_data, decode
+from .core import get_data, get_data_async, decode
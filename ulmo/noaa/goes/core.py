@@ -1,5 +1,4 @@
 from datetime import datetime, timedelta
-import requests
 import pandas as pd
 from . import parsers
 import os
@@ -110,7 +109,9 @@ def get_data(dcp_address, hours, use_cache=False, cache_path=None,
     params['hours'] = hours,
 
     messages = _fetch_url(params)
-    new_data = pd.DataFrame([_parse(row) for row in messages])
+    with util.timed('dataframe', provider='noaa.goes') as timing:
+        new_data = pd.DataFrame([_parse(row) for row in messages])
+        timing.records = len(new_data)
 
     if not new_data.empty:
         new_data.index = new_data.message_timestamp_utc
@@ -119,8 +120,11 @@ def get_data(dcp_address, hours, use_cache=False, cache_path=None,
         if use_cache:
             # write to a tmp file and move to avoid ballooning h5 file
             tmp = dcp_data_path + '.tmp'
-            data.to_hdf(tmp, dcp_address)
-            shutil.move(tmp, dcp_data_path)
+            with util.timed('write', provider='noaa.goes',
+                    path=dcp_data_path) as timing:
+                data.to_hdf(tmp, dcp_address)
+                shutil.move(tmp, dcp_data_path)
+                timing.records = len(data)
 
     if data.empty:
         if as_dataframe:
@@ -133,9 +137,19 @@ def get_data(dcp_address, hours, use_cache=False, cache_path=None,
     return data
 
 
+async def get_data_async(dcp_address, hours, **kwargs):
+    """awaitable version of get_data, with the same arguments; get_data runs
+    in a thread of ulmo's shared worker pool (see ulmo.util.configure_async)
+    """
+    return await util.run_blocking(get_data, dcp_address, hours, **kwargs)
+
+
 def _fetch_url(params):
-    r = requests.post(dcs_url, params=params, timeout=60)
-    messages = r.json()
+    r = util.get_session('noaa.goes').post(dcs_url, params=params)
+    with util.timed('parse', provider='noaa.goes') as timing:
+        messages = r.json()
+        timing.bytes = len(r.content)
+        timing.records = len(messages)
     return messages
 
 
@@ -1 +1,4 @@
-from . import kbdi
+from ulmo import _lazy_submodules
+
+__all__ = ['kbdi']
+__getattr__, __dir__ = _lazy_submodules(__name__, __all__)
@@ -63,13 +63,24 @@ def get_data(county=None, start=None, end=None, as_dataframe=False, data_dir=Non
     if data_dir is None:
         data_dir = os.path.join(util.get_ulmo_dir(), 'twc/kbdi')
 
-    df = pandas.concat([
-        _date_dataframe(date, data_dir)
-        for date in pandas.period_range(start_date, end_date, freq='D')
-    ], ignore_index=True)
-    fips_df = _fips_dataframe()
-    df = pandas.merge(df, fips_df, left_on='county', right_on='name')
-    del df['name']
+    dates = pandas.period_range(start_date, end_date, freq='D')
+    # there is one file per day, so fetch all of them concurrently up front
+    util.download_many([
+        (url, _data_file_path(url, data_dir))
+        for url in [_get_date_url(date) for date in dates]
+    ])
+
+    # the daily files are parsed in the parse pool, if that is enabled
+    with util.timed('parse', provider='twc.kbdi') as timing:
+        date_dataframes = list(util.parse_many(_date_dataframe, [
+            (date, data_dir) for date in dates]))
+        timing.records = sum([len(date_df) for date_df in date_dataframes])
+    with util.timed('dataframe', provider='twc.kbdi') as timing:
+        df = pandas.concat(date_dataframes, ignore_index=True)
+        fips_df = _fips_dataframe()
+        df = pandas.merge(df, fips_df, left_on='county', right_on='name')
+        del df['name']
+        timing.records = len(df)
 
     if county:
         df = df[df['fips'] == county]
@@ -92,15 +103,18 @@ def _as_data_dict(df):
     return county_dict
 
 
+def _data_file_path(url, data_dir):
+    file_name = url.rsplit('/', 1)[-1]
+    return os.path.join(data_dir, file_name)
+
+
 def _date_dataframe(date, data_dir):
 
-    if date.to_timestamp() < CSV_SWITCHOVER:
-        url = _get_text_url(date)
-        with _open_data_file(url, data_dir) as data_file:
+    url = _get_date_url(date)
+    with _open_data_file(url, data_dir) as data_file:
+        if date.to_timestamp() < CSV_SWITCHOVER:
             date_df = _parse_text_file(data_file)
-    else:
-        url = _get_csv_url(date)
-        with _open_data_file(url, data_dir) as data_file:
+        else:
             date_df = _parse_csv_file(data_file)
 
     date_df['date'] = pandas.Period(date, freq='D')
@@ -375,6 +389,13 @@ def _fips_dataframe():
     return df
 
 
+def _get_date_url(date):
+    if date.to_timestamp() < CSV_SWITCHOVER:
+        return _get_text_url(date)
+    else:
+        return _get_csv_url(date)
+
+
 def _get_text_url(date):
     return 'http://twc.tamu.edu/weather_images/summ/summ%s.txt' % date.strftime('%Y%m%d')
 
@@ -429,9 +450,7 @@ def _parse_csv_file(data_file):
     return dataframe
 
 def _open_data_file(url, data_dir):
-    """returns an open file handle for a data file; downloading if necessary or
-    otherwise using a previously downloaded file
+    """returns an open file handle for a data file that has already been
+    downloaded to data_dir
     """
-    file_name = url.rsplit('/', 1)[-1]
-    file_path = os.path.join(data_dir, file_name)
-    return util.open_file_for_url(url, file_path, check_modified=True, use_bytes=True)
+    return open(_data_file_path(url, data_dir), 'rb')
@@ -1,3 +1,6 @@
 from __future__ import absolute_import
-from . import rivergages
-from . import swtwc
+
+from ulmo import _lazy_submodules
+
+__all__ = ['rivergages', 'swtwc']
+__getattr__, __dir__ = _lazy_submodules(__name__, __all__)
@@ -11,7 +11,6 @@
 import datetime
 import os.path
 
-import requests
 from bs4 import BeautifulSoup
 
 from ulmo import util
@@ -61,18 +60,22 @@ def get_station_data(station_code, parameter, start=None, end=None,
         'hdn_excel': '',
     }
 
-    req = requests.post(URL, params=dict(sid=station_code), data=form_data)
-    soup = BeautifulSoup(req.content)
-    data_table = soup.find('table').find_all('table')[-1]
+    req = util.get_session('usace.rivergages').post(URL, params=dict(sid=station_code), data=form_data)
+    with util.timed('parse', provider='usace.rivergages') as timing:
+        soup = BeautifulSoup(req.content)
+        data_table = soup.find('table').find_all('table')[-1]
 
-    return dict([
-        _parse_value(value_tr)
-        for value_tr in data_table.find_all('tr')[2:]
-    ])
+        values = dict([
+            _parse_value(value_tr)
+            for value_tr in data_table.find_all('tr')[2:]
+        ])
+        timing.bytes = len(req.content)
+        timing.records = len(values)
+    return values
 
 
 def get_station_parameters(station_code):
-    req = requests.get(URL, params=dict(sid=station_code))
+    req = util.get_session('usace.rivergages').get(URL, params=dict(sid=station_code))
     soup = BeautifulSoup(req.content)
 
     options = soup.find('select', id='fld_parameter').find_all()
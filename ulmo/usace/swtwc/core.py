@@ -19,7 +19,6 @@ import os.path
 
 from bs4 import BeautifulSoup
 import numpy as np
-import requests
 import pandas
 
 from ulmo import util
@@ -74,7 +73,7 @@ def get_station_data(station_code, date=None, as_dataframe=False):
     headers = {
         'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/72.0.3626.121 Safari/537.36'
     }
-    resp = requests.get(data_url, headers=headers)
+    resp = util.get_session('usace.swtwc').get(data_url, headers=headers)
     soup = BeautifulSoup(resp.content)
     pre = soup.find('pre')
     if pre is None:
@@ -125,10 +124,12 @@ def get_station_data(station_code, date=None, as_dataframe=False):
         for variable_name in variable_names
     ])
     date_parser = lambda x: _convert_datetime(x, year)
-    dataframe = pandas.read_fwf(
-        sio, names=column_names, widths=widths, index_col=['datetime'],
-        na_values=['----'], converters=converters, parse_dates=True,
-        date_parser=date_parser)
+    with util.timed('parse', provider='usace.swtwc') as timing:
+        dataframe = pandas.read_fwf(
+            sio, names=column_names, widths=widths, index_col=['datetime'],
+            na_values=['----'], converters=converters, parse_dates=True,
+            date_parser=date_parser)
+        timing.records = len(dataframe)
 
     # parse out rows that are all nans (e.g. end of "current" page)
     dataframe = dataframe[~np.isnan(dataframe.T.sum())]
@@ -154,7 +155,7 @@ def get_stations():
     headers = {
         'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/72.0.3626.121 Safari/537.36'
     }
-    resp = requests.get(stations_url, headers=headers)
+    resp = util.get_session('usace.swtwc').get(stations_url, headers=headers)
     soup = BeautifulSoup(resp.content)
     pre = soup.find('pre')
     links = pre.find_all('a')
@@ -1,2 +1,4 @@
-from . import ned
-from . import nwis
+from ulmo import _lazy_submodules
+
+__all__ = ['ned', 'nwis']
+__getattr__, __dir__ = _lazy_submodules(__name__, __all__)
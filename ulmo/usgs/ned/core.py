@@ -16,7 +16,6 @@ from past.builtins import basestring
 from geojson import Feature, FeatureCollection, Polygon
 import logging
 import os
-import requests
 from ulmo import util
 
 
@@ -86,7 +85,7 @@ def get_raster_availability(layer, bbox=None):
     features = []
     url = base_url
     while url:
-        r = requests.get(url, params)
+        r = util.get_session('usgs.ned').get(url, params=params)
         print('retrieving raster availability from %s' % r.url)
         params = []  # not needed after first request
         content = r.json()
@@ -181,7 +180,7 @@ def _download_features(feature_ids, path=None, check_modified=False,):
     tile_fmt = '.img'
     for feature_id in feature_ids:
         url = SCIENCEBASE_ITEM_URL % feature_id
-        metadata = requests.get(url).json()
+        metadata = util.get_session('usgs.ned').get(url).json()
         layer = [a for a in list(layer_dict.keys()) if a in metadata['title']][0]
         layer_path = os.path.join(path, layer_dict[layer])
         tile_urls = [link['uri'] for link in metadata['webLinks'] if link['type']=='download']
@@ -206,10 +205,18 @@ def _download_tiles(tiles, path=None, check_modified=False):
     if path is None:
         path = os.path.join(util.get_ulmo_dir(), DEFAULT_FILE_PATH)
 
+    # group tiles by layer and format so that each group is downloaded
+    # concurrently in one call
+    groups = {}
     for tile in tiles['features']:
-
         metadata = tile['properties']
-        layer_path = os.path.join(path, layer_dict[metadata['layer']])
-        tile['properties']['file'] = util.download_tiles(layer_path, metadata['download url'], metadata['format'], check_modified)[0]
+        groups.setdefault((metadata['layer'], metadata['format']), []).append(tile)
+
+    for (layer, tile_fmt), layer_tiles in groups.items():
+        layer_path = os.path.join(path, layer_dict[layer])
+        tile_urls = [tile['properties']['download url'] for tile in layer_tiles]
+        files = util.download_tiles(layer_path, tile_urls, tile_fmt, check_modified)
+        for tile, tile_file in zip(layer_tiles, files):
+            tile['properties']['file'] = tile_file
 
     return tiles
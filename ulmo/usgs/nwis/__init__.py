@@ -7,7 +7,8 @@
 from __future__ import absolute_import
 
 from . import core
-from .core import (get_sites, get_site_data)
+from .core import (get_sites, get_site_data, get_sites_async,
+        get_site_data_async)
 from ulmo import util
 
 try:
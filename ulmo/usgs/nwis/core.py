@@ -12,8 +12,9 @@ from future import standard_library
 standard_library.install_aliases()
 from builtins import str
 from past.builtins import basestring
+import asyncio
 import contextlib
-import io
+import copy
 import datetime
 import logging
 
@@ -36,7 +37,7 @@ log.setLevel(logging.INFO)
 
 def get_sites(service=None, input_file=None,  sites=None, state_code=None,
               huc=None, bounding_box=None, county_code=None, parameter_code=None,
-              site_type=None, **kwargs):
+              site_type=None, output_file=None, **kwargs):
     """Fetches site information from USGS services.
     See the `USGS Site Service`_ documentation for a detailed description of options.
     For convenience, major options have been included with pythonic names.
@@ -90,6 +91,10 @@ def get_sites(service=None, input_file=None,  sites=None, state_code=None,
     site_type : str, iterable of strings or ``None``
         Optional filter. The type(s) of site used in ``siteType`` parameter;
         lists will be joined by a ','.
+    output_file : ``None``, file path or file object
+        If a file is passed, the response from the NWIS web services is also
+        written to it so that it can be used as an ``input_file`` later. This
+        requires a single ``service`` to be specified.
 
     Returns
     -------
@@ -142,6 +147,8 @@ def get_sites(service=None, input_file=None,  sites=None, state_code=None,
         url_params.update(kwargs)
 
         if not service:
+            if output_file is not None:
+                raise ValueError("output_file can only be used with a single service")
             return_sites = {}
             for service in ['daily', 'instantaneous']:
                 new_sites = get_sites(sites=sites, state_code=state_code, huc=huc, 
@@ -152,13 +159,22 @@ def get_sites(service=None, input_file=None,  sites=None, state_code=None,
 
         url = _get_service_url(service)
         log.info('making request for sites: %s' % url)
-        req = requests.get(url, params=url_params)
+        req = util.get_session('usgs.nwis').get(url, params=url_params,
+                stream=True)
         log.info("processing data from request: %s" % req.request.url)
-        req.raise_for_status()        
-        input_file = io.BytesIO(util.to_bytes(req.content))
-
-    with _open_input_file(input_file) as content_io:
-        return_sites = wml.parse_site_infos(content_io)
+        req.raise_for_status()
+        # site infos are parsed in a single pass, so the response is parsed
+        # as it is read
+        with util.ResponseStream(req, output_file=output_file) as content_io, \
+                util.timed('parse', provider='usgs.nwis') as timing:
+            return_sites = wml.parse_site_infos(content_io)
+            timing.records = len(return_sites)
+            timing.bytes = content_io.bytes_read
+    else:
+        with _open_input_file(input_file) as content_io, \
+                util.timed('parse', provider='usgs.nwis') as timing:
+            return_sites = wml.parse_site_infos(content_io)
+            timing.records = len(return_sites)
 
     return_sites = dict([
         (code, _extract_site_properties(site))
@@ -170,7 +186,7 @@ def get_sites(service=None, input_file=None,  sites=None, state_code=None,
 
 def get_site_data(site_code, service=None, parameter_code=None, statistic_code=None,
         start=None, end=None, period=None, modified_since=None, input_file=None,
-        methods=None, **kwargs):
+        methods=None, output_file=None, as_timeseries=False, **kwargs):
     """Fetches site data.
 
     Parameters
@@ -213,6 +229,16 @@ def get_site_data(site_code, service=None, parameter_code=None, statistic_code=N
         parameter/s and can use "all" if method ids are not known beforehand. If
         dict, provide the parameter_code to method id mapping. Parameter's
         method id is specific to site.
+    output_file : ``None``, file path or file object
+        If a file is passed, the response from the NWIS web services is also
+        written to it as it is parsed so that it can be used as an
+        ``input_file`` later. This requires a single ``service`` to be
+        specified.
+    as_timeseries : bool
+        If ``True``, each parameter code is mapped to a ulmo.util.TimeSeries
+        holding its values, with the rest of its value dict (site, variable,
+        etc.) as the series' metadata. This uses much less memory than value
+        dicts for long records.
 
     Returns
     -------
@@ -256,22 +282,90 @@ def get_site_data(site_code, service=None, parameter_code=None, statistic_code=N
         end_datetime = util.convert_datetime(end)
         url_params['endDT'] = datetime_formatter(end_datetime)
 
-    if service is not None:
-        url_params.update(kwargs)
-        values = _get_site_values(service, url_params, input_file=input_file,
-                                  methods=methods)
-    else:
+    if service is None:
+        if output_file is not None:
+            raise ValueError("output_file can only be used with a single service")
         kw = dict(parameter_code=parameter_code, statistic_code=statistic_code,
                 start=start, end=end, period=period, modified_since=modified_since,
-                input_file=input_file, methods=methods)
+                input_file=input_file, methods=methods,
+                as_timeseries=as_timeseries)
         kw.update(kwargs)
         values = get_site_data(site_code, service='daily', **kw)
         values.update(
             get_site_data(site_code, service='instantaneous', **kw))
-
+        return values
+
+    url_params.update(kwargs)
+    # time series are built from columns of values, which are much quicker to
+    # parse than value dicts
+    values = _get_site_values(service, url_params, input_file=input_file,
+                              methods=methods, output_file=output_file,
+                              as_arrays=as_timeseries)
+    if as_timeseries:
+        with util.timed('dataframe', provider='usgs.nwis') as timing:
+            values = dict([
+                (code, _variable_timeseries(variable_dict))
+                for code, variable_dict in values.items()
+            ])
+            timing.records = sum([len(series) for series in values.values()])
     return values
 
 
+async def get_sites_async(service=None, **kwargs):
+    """awaitable variant of get_sites, which takes the same arguments. This
+    is a thread pool shim: the blocking request and parsing run in a thread of
+    ulmo's shared worker pool (see ulmo.util.configure_async). If service is
+    ``None`` then the daily and instantaneous services are queried at the same
+    time.
+    """
+    if service is not None:
+        return await util.run_blocking(get_sites, service=service, **kwargs)
+    if kwargs.get('output_file') is not None:
+        raise ValueError("output_file can only be used with a single service")
+
+    return_sites = {}
+    for new_sites in await asyncio.gather(*[
+            util.run_blocking(get_sites, service=service, **kwargs)
+            for service in ['daily', 'instantaneous']]):
+        return_sites.update(new_sites)
+    return return_sites
+
+
+async def get_site_data_async(site_code, service=None, **kwargs):
+    """awaitable variant of get_site_data, which takes the same arguments.
+    This is a thread pool shim: the blocking request and parsing run in a
+    thread of ulmo's shared worker pool (see ulmo.util.configure_async). If
+    service is ``None`` then the daily and instantaneous values are fetched
+    at the same time.
+
+    Usage example::
+
+        import asyncio
+        from ulmo import util
+        from ulmo.usgs import nwis
+
+        async def harvest(site_codes):
+            return await util.gather_bounded([
+                nwis.get_site_data_async(site_code, service='daily')
+                for site_code in site_codes
+            ], limit=50)
+
+        data = asyncio.run(harvest(['08068500', '08068720']))
+    """
+    if service is not None:
+        return await util.run_blocking(get_site_data, site_code,
+                service=service, **kwargs)
+    if kwargs.get('output_file') is not None:
+        raise ValueError("output_file can only be used with a single service")
+
+    daily_values, instantaneous_values = await asyncio.gather(
+        util.run_blocking(get_site_data, site_code, service='daily', **kwargs),
+        util.run_blocking(get_site_data, site_code, service='instantaneous',
+            **kwargs))
+    daily_values.update(instantaneous_values)
+    return daily_values
+
+
 def _as_str(arg):
     """if arg is a list, convert to comma delimited string
     """
@@ -312,31 +406,82 @@ def _get_service_url(service):
                 "'instantaneous' ('iv')")
 
 
-def _get_site_values(service, url_params, input_file=None, methods=None):
-    """downloads and parses values for a site
+def _get_site_values(service, url_params, input_file=None, methods=None,
+        output_file=None, as_arrays=False):
+    """downloads and parses values for a site; the response is parsed as it
+    is streamed rather than after it has been read into memory. Identical
+    requests made at the same time from several threads share one response.
 
     returns a values dict containing variable and data values
     """
+    if input_file is None and output_file is None:
+        url = requests.Request('GET', _get_service_url(service),
+                params=url_params).prepare().url
+        return util.single_flight(('usgs.nwis', url, repr(methods), as_arrays),
+                lambda: _read_site_values(service, url_params, methods=methods,
+                    as_arrays=as_arrays),
+                copy=copy.deepcopy)
+    return _read_site_values(service, url_params, input_file=input_file,
+            methods=methods, output_file=output_file, as_arrays=as_arrays)
+
+
+@contextlib.contextmanager
+def _open_input_file(input_file):
+    """helper context manager. If input_file is a string then it yields an open
+    file handler, closing it afterwards. If input_file is already a file handler
+    then it just yields the same file handler without closing.
+    """
+    if isinstance(input_file, basestring):
+        with open(input_file, 'rb') as content_io:
+            yield content_io
+    elif isinstance(input_file, util.ResponseStream):
+        with input_file as content_io:
+            yield content_io
+    elif hasattr(input_file, 'read'):
+        yield input_file
+
+
+def _read_site_values(service, url_params, input_file=None, methods=None,
+        output_file=None, as_arrays=False):
     if input_file is None:
         query_isodate = isodate.datetime_isoformat(datetime.datetime.now())
         service_url = _get_service_url(service)
 
         try:
-            req = requests.get(service_url, params=url_params)
+            req = util.get_session('usgs.nwis').get(service_url,
+                    params=url_params, stream=True)
         except requests.exceptions.ConnectionError:
-            log.info("There was a connection error with query:\n\t%s\n\t%s" % (service_url, url_params))
-            return {}
+            # the session has already retried the request, or its circuit
+            # breaker is open (util.CircuitOpenError), so this is final
+            log.error("There was a connection error with query:\n\t%s\n\t%s" % (service_url, url_params))
+            raise
         log.info("processing data from request: %s" % req.request.url)
 
         if req.status_code != 200:
+            req.close()
             return {}
-        input_file = io.BytesIO(util.to_bytes(req.content))
+        input_file = util.ResponseStream(req, output_file=output_file)
     else:
         query_isodate = None
 
-    with _open_input_file(input_file) as content_io:
+    # the response is read as it is parsed, so for requests this stage covers
+    # both fetching and parsing
+    with _open_input_file(input_file) as content_io, \
+            util.timed('parse', provider='usgs.nwis') as timing:
         data_dict = wml.parse_site_values(content_io, query_isodate,
-            methods=methods)
+            methods=methods, as_arrays=as_arrays)
+        if as_arrays:
+            timing.records = sum([
+                len(variable_dict['values']['value'])
+                for variable_dict in data_dict.values()
+            ])
+        else:
+            timing.records = sum([
+                len(variable_dict.get('values', []))
+                for variable_dict in data_dict.values()
+            ])
+        if isinstance(content_io, util.ResponseStream):
+            timing.bytes = content_io.bytes_read
 
         for variable_dict in list(data_dict.values()):
             variable_dict['site'] = _extract_site_properties(variable_dict['site'])
@@ -344,14 +489,14 @@ def _get_site_values(service, url_params, input_file=None, methods=None):
     return data_dict
 
 
-@contextlib.contextmanager
-def _open_input_file(input_file):
-    """helper context manager. If input_file is a string then it yields an open
-    file handler, closing it afterwards. If input_file is already a file handler
-    then it just yields the same file handler without closing.
-    """
-    if isinstance(input_file, basestring):
-        with open(input_file, 'rb') as content_io:
-            yield content_io
-    elif hasattr(input_file, 'read'):
-        yield input_file
+def _variable_timeseries(variable_dict):
+    metadata = dict([
+        (key, value) for key, value in variable_dict.items() if key != 'values'])
+    values = variable_dict.get('values', [])
+    if isinstance(values, dict):
+        # columns parsed with as_arrays=True
+        flags = dict(values)
+        index = flags.pop('datetime')
+        return util.TimeSeries(index, values={'value': flags.pop('value')},
+                flags=flags, metadata=metadata)
+    return util.TimeSeries.from_value_dicts(values, metadata=metadata)
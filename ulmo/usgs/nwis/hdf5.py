@@ -2,18 +2,16 @@ from builtins import map
 from builtins import zip
 from past.builtins import basestring
 import contextlib
-import copy
 from datetime import datetime
 import os
 import shutil
-import sys
 import tempfile
+import threading
 import warnings
 
 import numpy as np
 import pandas
 import tables
-from tables.scripts import ptrepack
 
 from ulmo import util
 from ulmo.usgs.nwis import core
@@ -43,6 +41,10 @@ SITES_MIN_ITEMSIZE = {
 
 SITES_TABLE = 'sites'
 
+# the hdf5 library can't be used from more than one thread at a time, so
+# stores are opened and repacked while holding this lock
+_hdf5_lock = threading.RLock()
+
 
 def get_sites(path=None, complevel=None, complib=None):
     """Fetches previously-cached site information from an hdf5 file.
@@ -270,8 +272,9 @@ def repack(path, complevel=None, complib=None):
     comp_kwargs = _compression_kwargs(complevel=complevel, complib=complib)
 
     temp_path = tempfile.NamedTemporaryFile().name
-    _ptrepack(path, temp_path, **comp_kwargs)
-    shutil.move(temp_path, path)
+    with _hdf5_lock:
+        _ptrepack(path, temp_path, **comp_kwargs)
+        shutil.move(temp_path, path)
 
 
 def update_site_list(sites=None, state_code=None, huc=None, bounding_box=None, 
@@ -431,7 +434,9 @@ def update_site_data(site_code, start=None, end=None, period=None, path=None,
             else:
                 new_values['last_modified'] = last_refresh
 
-            store[values_path] = new_values
+            with util.timed('write', provider='usgs.nwis', path=values_path) as timing:
+                store[values_path] = new_values
+                timing.records = len(new_values)
             something_changed = True
 
             variable_group = store.get_node(variable_group_path)
@@ -502,7 +507,7 @@ def _get_store(path, **kwargs):
     if not os.path.exists(dir_path):
         os.makedirs(dir_path)
 
-    with pandas.io.pytables.get_store(path, **kwargs) as store:
+    with _hdf5_lock, pandas.io.pytables.get_store(path, **kwargs) as store:
         with _filter_warnings():
             yield store
 
@@ -538,18 +543,17 @@ def _nest_dataframe_dicts(unnested_df, nested_column, keys):
 
 
 def _ptrepack(src, dst, complevel, complib):
-    """run ptrepack to repack from src to dst"""
-
-    #check_output(['ptrepack','--complevel=%s' % complevel, '--complib=%s' % complib, src, dst])
-    
-    #fix for for pytables not finding files on windows because of drive in path 
-    src = os.path.splitdrive(src)[-1]
-    dst = os.path.splitdrive(dst)[-1]
-
-    with _sysargs_hacks():
-        sys.argv = ['', '--complevel=%s' % complevel, '--complib=%s' % complib, src, dst]
-        with _filter_warnings():
-            ptrepack.main()
+    """repack from src to dst; this copies the file the same way the ptrepack
+    script does, but without going through sys.argv
+    """
+    filter_kwargs = dict(complevel=complevel)
+    if complib is not None:
+        filter_kwargs['complib'] = complib
+    filters = tables.Filters(**filter_kwargs)
+    with util.timed('write', provider='usgs.nwis', operation='ptrepack',
+            path=dst):
+        with _filter_warnings(), tables.open_file(src, mode='r') as src_file:
+            src_file.copy_file(dst, overwrite=True, filters=filters)
 
 
 def _sites_df_to_dict(df):
@@ -568,29 +572,23 @@ def _sites_df_to_dict(df):
 
 
 def _sites_dict_to_df(sites_dict):
-    df = pandas.DataFrame(sites_dict).T.copy()
-    df = _unnest_dataframe_dicts(df, 'location', ['latitude', 'longitude', 'srs'])
-    df = _unnest_dataframe_dicts(df, 'timezone_info',
-            ['uses_dst', 'default_tz', 'dst_tz'])
-    for tz_type in ['default_tz', 'dst_tz']:
-        tz_keys = ['abbreviation', 'offset']
-        df = _unnest_dataframe_dicts(df, tz_type,
-                tz_keys)
-        rename_dict = dict([
-            (key, tz_type + '_' + key) for key in tz_keys])
-        df = df.rename(columns=rename_dict)
+    with util.timed('dataframe', provider='usgs.nwis') as timing:
+        df = pandas.DataFrame(sites_dict).T.copy()
+        df = _unnest_dataframe_dicts(df, 'location', ['latitude', 'longitude', 'srs'])
+        df = _unnest_dataframe_dicts(df, 'timezone_info',
+                ['uses_dst', 'default_tz', 'dst_tz'])
+        for tz_type in ['default_tz', 'dst_tz']:
+            tz_keys = ['abbreviation', 'offset']
+            df = _unnest_dataframe_dicts(df, tz_type,
+                    tz_keys)
+            rename_dict = dict([
+                (key, tz_type + '_' + key) for key in tz_keys])
+            df = df.rename(columns=rename_dict)
+        timing.records = len(df)
 
     return df
 
 
-@contextlib.contextmanager
-def _sysargs_hacks():
-    """temporarily replace sys.argv without leaking global state"""
-    orig_sysargv = copy.copy(sys.argv)
-    yield
-    sys.argv = orig_sysargv
-
-
 def _unnest_dataframe_dicts(df, nested_column, keys):
     def _unnest_func(nested_dict):
         if pandas.isnull(nested_dict):
@@ -607,12 +605,14 @@ def _unnest_dataframe_dicts(df, nested_column, keys):
 
 
 def _values_dicts_to_df(values_dicts):
-    df = pandas.DataFrame(values_dicts, dtype=object)
-    if len(df) == 0:
-        df = pandas.DataFrame(columns=['datetime', 'value', 'qualifiers', 'last_checked',
-            'last_modified'])
-    else:
-        df = df.set_index(pandas.DatetimeIndex(pandas.to_datetime(df['datetime'])))
+    with util.timed('dataframe', provider='usgs.nwis') as timing:
+        df = pandas.DataFrame(values_dicts, dtype=object)
+        if len(df) == 0:
+            df = pandas.DataFrame(columns=['datetime', 'value', 'qualifiers', 'last_checked',
+                'last_modified'])
+        else:
+            df = df.set_index(pandas.DatetimeIndex(pandas.to_datetime(df['datetime'])))
+        timing.records = len(df)
     return df
 
 
@@ -647,4 +647,6 @@ def _update_stored_sites(store, sites_dict):
         # object dtype in pandas <= 0.11 (s/b fixed in later versions)
         new_sites_df['uses_dst'] = new_sites_df['uses_dst'].astype(bool)
 
-    store[SITES_TABLE] = new_sites_df
+    with util.timed('write', provider='usgs.nwis', path=SITES_TABLE) as timing:
+        store[SITES_TABLE] = new_sites_df
+        timing.records = len(new_sites_df)
@@ -1,10 +1,13 @@
 from .misc import (
         camel_to_underscore,
+        close_ftp_connections,
         convert_date,
         convert_datetime,
         dict_from_dataframe,
         dir_list,
         download_if_new,
+        download_many,
+        DownloadError,
         get_ulmo_dir,
         mkdir_if_doesnt_exist,
         module_with_dependency_errors,
@@ -13,9 +16,42 @@ from .misc import (
         parse_fwf,
         raise_dependency_error,
         save_pretty_printed_xml,
+        single_flight,
         to_bytes,
     )
 
+from .aio import (
+        configure_async,
+        gather_bounded,
+        run_blocking,
+    )
+
+from .cassettes import (
+        Cassette,
+        CassetteError,
+        get_cassette,
+        use_cassette,
+    )
+
+from .export import (
+        export_data,
+        export_dataframe,
+    )
+
+from .instrumentation import (
+        add_timing_sink,
+        LoggingSink,
+        remove_timing_sink,
+        StatsSink,
+        timed,
+        Timing,
+    )
+
+from .parse_pool import (
+        configure_parse_pool,
+        parse_many,
+    )
+
 from .raster import (
         extract_from_zip,
         mosaic_and_clip,
@@ -23,6 +59,34 @@ from .raster import (
         generate_raster_uid,
     )
 
+from .response_cache import (
+        clear_response_cache,
+        disable_response_cache,
+        enable_response_cache,
+        response_cache_stats,
+    )
+
+from .sessions import (
+        close_sessions,
+        configure_session,
+        get_session,
+        suds_transport,
+    )
+
+from .spill import SpillDict
+
+from .streams import (
+        EncodedTextStream,
+        ResponseStream,
+    )
+
+from .timeseries import TimeSeries
+
+from .throttling import (
+        CircuitOpenError,
+        RequestPolicy,
+    )
+
 try:
     from .pytables import (
             get_default_h5file_path,
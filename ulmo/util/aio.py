@@ -0,0 +1,83 @@
+"""
+   ulmo.util.aio
+   ~~~~~~~~~~~~~
+
+   A thread pool shim behind the awaitable variants of the fetchers
+   (get_site_data_async and friends). These are not natively asynchronous:
+   no I/O happens on the event loop. Each call runs the blocking,
+   requests-based fetcher in one bounded thread pool shared by every event
+   loop, so requests and parsing go through the same pooled sessions - with
+   their rate limits, retries, caching and instrumentation - as the blocking
+   functions. Every request in flight still holds a worker thread; what the
+   pool bounds is how many threads (and connections) a fan-out over
+   thousands of sites uses.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import threading
+
+
+# number of fetches that run at the same time
+DEFAULT_ASYNC_WORKERS = 16
+
+_executor = None
+_executor_lock = threading.Lock()
+_max_workers = DEFAULT_ASYNC_WORKERS
+
+
+def configure_async(max_workers=None):
+    """Sets the number of threads, and so fetches, that the awaitable
+    variants run at the same time;
+    if max_workers is None then DEFAULT_ASYNC_WORKERS is used. Fetches that
+    are already running are allowed to finish.
+    """
+    global _executor, _max_workers
+    with _executor_lock:
+        executor, _executor = _executor, None
+        _max_workers = max_workers or DEFAULT_ASYNC_WORKERS
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+async def gather_bounded(awaitables, limit=None, return_exceptions=False):
+    """Awaits awaitables with at most `limit` of them running at the same
+    time, and returns their results in order like asyncio.gather. If limit is
+    None then the number of workers set with configure_async is used.
+
+    Usage example::
+
+        from ulmo import util
+        from ulmo.usgs import nwis
+
+        async def harvest(site_codes):
+            return await util.gather_bounded([
+                nwis.get_site_data_async(site_code, service='daily')
+                for site_code in site_codes
+            ], limit=50)
+    """
+    semaphore = asyncio.Semaphore(limit or _max_workers)
+
+    async def bounded(awaitable):
+        async with semaphore:
+            return await awaitable
+
+    return await asyncio.gather(*[bounded(awaitable) for awaitable in awaitables],
+        return_exceptions=return_exceptions)
+
+
+async def run_blocking(function, *args, **kwargs):
+    """runs the blocking function(*args, **kwargs) in a thread of the shared
+    worker pool and returns its result
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(),
+        functools.partial(function, *args, **kwargs))
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_max_workers)
+        return _executor
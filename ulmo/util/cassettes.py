@@ -0,0 +1,424 @@
+"""
+   ulmo.util.cassettes
+   ~~~~~~~~~~~~~~~~~~~
+
+   Record and replay of the HTTP (including SOAP) and FTP exchanges made
+   through ulmo. A harvest recorded once to a cassette file can be replayed
+   later without network access, with the same response bodies byte for byte
+   and optionally with simulated latency, e.g. to profile a pipeline or test
+   throughput changes offline.
+
+   A cassette is used either with the use_cassette context manager or by
+   setting the ULMO_CASSETTE environment variable to its path (along with
+   ULMO_CASSETTE_MODE and ULMO_CASSETTE_LATENCY, which correspond to the
+   `mode` and `latency` arguments of use_cassette).
+"""
+from contextlib import contextmanager
+import atexit
+import collections
+import ftplib
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import zipfile
+
+import requests
+import requests.structures
+import requests.utils
+
+from .response_cache import _DROPPED_HEADERS
+
+
+CASSETTE_FORMAT_VERSION = 1
+
+# name of the archive member that holds the list of recorded exchanges
+_INDEX_NAME = 'interactions.json'
+
+# size of the blocks replayed ftp downloads are passed on in, as ftplib does
+_FTP_BLOCK_SIZE = 8192
+
+_clock = getattr(time, 'perf_counter', time.time)
+_cassette = None
+_cassette_lock = threading.Lock()
+_environment_checked = False
+
+
+class CassetteError(Exception):
+    """raised when a request that is not on the cassette is made while
+    replaying it
+    """
+
+
+class Cassette(object):
+    """A zip archive of recorded exchanges. Each response body is stored once,
+    compressed, however many times it was received.
+
+    Parameters
+    ----------
+    path : str
+        Path of the cassette file.
+    mode : ``None``, 'record' or 'replay'
+        'record' makes real requests and saves them to a new cassette,
+        replacing any existing file; 'replay' answers requests from the
+        cassette and never uses the network. If ``None`` (default), an existing
+        cassette is replayed and a new one is recorded otherwise.
+    latency : ``None``, float or 'recorded'
+        Delay added to each replayed exchange: a number of seconds, or
+        'recorded' to wait as long as the exchange took when it was recorded.
+        ``None`` (default) replays without delay.
+    """
+    def __init__(self, path, mode=None, latency=None):
+        if mode is None:
+            mode = 'replay' if os.path.exists(path) else 'record'
+        if mode not in ('record', 'replay'):
+            raise ValueError("mode must be 'record' or 'replay', not %r" % mode)
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._interactions = []
+        self._bodies = set()
+        self._played = {}
+        if mode == 'record':
+            directory = os.path.dirname(os.path.abspath(path))
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            self._archive = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+        else:
+            self._archive = zipfile.ZipFile(path, 'r')
+            index = json.loads(self._archive.read(_INDEX_NAME).decode('utf-8'))
+            for interaction in index['interactions']:
+                self._played.setdefault(_interaction_key(interaction),
+                        collections.deque()).append(interaction)
+
+    @property
+    def recording(self):
+        return self.mode == 'record'
+
+    @property
+    def replaying(self):
+        return self.mode == 'replay'
+
+    def close(self):
+        """writes the list of exchanges (when recording) and closes the file"""
+        with self._lock:
+            if self._archive is None:
+                return
+            if self.recording:
+                index = {
+                    'version': CASSETTE_FORMAT_VERSION,
+                    'interactions': self._interactions,
+                }
+                self._archive.writestr(_INDEX_NAME,
+                        json.dumps(index, indent=1, sort_keys=True))
+            self._archive.close()
+            self._archive = None
+
+    def ftp_connection(self, host, connect):
+        """returns an ftplib.FTP-like connection to host; connect() opens a
+        real connection when recording
+        """
+        if self.replaying:
+            return _ReplayFTP(self, host)
+        return _RecordingFTP(self, host, connect())
+
+    def record_http(self, method, url, kwargs, send):
+        """makes a request with send(), records it and returns an equivalent
+        response that can still be read as a stream
+        """
+        prepared = _prepare(method, url, kwargs)
+        start = _clock()
+        response = send()
+        content = response.content
+        elapsed = _clock() - start
+        headers = dict([
+            (name, value) for name, value in response.headers.items()
+            if name.lower() not in _DROPPED_HEADERS
+        ])
+        interaction = self._record(prepared.method, prepared.url,
+                prepared.body, elapsed, body=content, status=response.status_code,
+                reason=response.reason, headers=headers)
+        return _replayed_response(interaction, content, response.request)
+
+    def replay_http(self, method, url, kwargs):
+        prepared = _prepare(method, url, kwargs)
+        interaction = self._replay(prepared.method, prepared.url, prepared.body)
+        return _replayed_response(interaction, self._body(interaction), prepared)
+
+    def _body(self, interaction):
+        if interaction.get('body') is None:
+            return b''
+        with self._lock:
+            return self._archive.read(interaction['body'])
+
+    def _record(self, method, url, request_body, elapsed, body=None,
+            **fields):
+        interaction = dict(fields, method=method, url=url,
+                request=_digest(request_body), elapsed=elapsed)
+        with self._lock:
+            if self._archive is None:
+                raise CassetteError("cassette %s is closed" % self.path)
+            if body is not None:
+                name = 'bodies/' + _digest(body)
+                if name not in self._bodies:
+                    self._archive.writestr(name, body)
+                    self._bodies.add(name)
+                interaction['body'] = name
+            self._interactions.append(interaction)
+        return interaction
+
+    def _replay(self, method, url, request_body):
+        key = (method, url, _digest(request_body))
+        with self._lock:
+            queue = self._played.get(key)
+            if not queue:
+                raise CassetteError("%s %s was not recorded on cassette %s" % (
+                    method, url, self.path))
+            # repeated requests get the recorded responses in order, and the
+            # last one again once those run out
+            interaction = queue.popleft() if len(queue) > 1 else queue[0]
+        if self.latency == 'recorded':
+            time.sleep(interaction['elapsed'])
+        elif self.latency:
+            time.sleep(float(self.latency))
+        return interaction
+
+
+class _RecordingFTP(object):
+    """wraps an ftplib.FTP connection, recording the commands used by ulmo"""
+    def __init__(self, cassette, host, ftp):
+        self.cassette = cassette
+        self.host = host
+        self.ftp = ftp
+        self.directory = ''
+
+    def close(self):
+        self.ftp.close()
+
+    def cwd(self, dir_path):
+        self._call('CWD ' + dir_path, lambda: (self.ftp.cwd(dir_path), None))
+        self.directory = dir_path
+
+    def nlst(self):
+        names = []
+        self._call('NLST ' + self.directory,
+            lambda: (None, _joined_lines(names, self.ftp.nlst())))
+        return names
+
+    def quit(self):
+        return self.ftp.quit()
+
+    def retrbinary(self, command, callback, blocksize=_FTP_BLOCK_SIZE, rest=None):
+        blocks = []
+
+        def receive(block):
+            blocks.append(block)
+            callback(block)
+
+        def retrieve():
+            response = self.ftp.retrbinary(command, receive, rest=rest)
+            return response, b''.join(blocks)
+        return self._call(_retr_command(command, rest), retrieve)
+
+    def retrlines(self, command, callback):
+        lines = []
+
+        def receive(line):
+            lines.append(line)
+            callback(line)
+
+        def retrieve():
+            response = self.ftp.retrlines(command, receive)
+            return response, _joined_lines([], lines)
+        return self._call(command, retrieve)
+
+    def sendcmd(self, command):
+        return self._call(command, lambda: (self.ftp.sendcmd(command), None))
+
+    def size(self, file_path):
+        return self._call('SIZE ' + file_path,
+            lambda: (self.ftp.size(file_path), None))
+
+    def voidcmd(self, command):
+        if command == 'NOOP':
+            return self.ftp.voidcmd(command)
+        return self._call(command, lambda: (self.ftp.voidcmd(command), None))
+
+    def _call(self, command, perform):
+        start = _clock()
+        try:
+            response, body = perform()
+        except ftplib.Error as e:
+            self.cassette._record('FTP', 'ftp://' + self.host, command,
+                    _clock() - start, error=[type(e).__name__, str(e)])
+            raise
+        self.cassette._record('FTP', 'ftp://' + self.host, command,
+                _clock() - start, body=body, response=response)
+        return response
+
+
+class _ReplayFTP(object):
+    """stands in for an ftplib.FTP connection, replaying recorded commands"""
+    def __init__(self, cassette, host):
+        self.cassette = cassette
+        self.host = host
+        self.directory = ''
+
+    def close(self):
+        pass
+
+    def cwd(self, dir_path):
+        self._call('CWD ' + dir_path)
+        self.directory = dir_path
+
+    def nlst(self):
+        interaction = self._call('NLST ' + self.directory)
+        return _split_lines(self.cassette._body(interaction))
+
+    def quit(self):
+        pass
+
+    def retrbinary(self, command, callback, blocksize=_FTP_BLOCK_SIZE, rest=None):
+        interaction = self._call(_retr_command(command, rest))
+        data = self.cassette._body(interaction)
+        for start in range(0, len(data), blocksize):
+            callback(data[start:start + blocksize])
+        return interaction.get('response')
+
+    def retrlines(self, command, callback):
+        interaction = self._call(command)
+        for line in _split_lines(self.cassette._body(interaction)):
+            callback(line)
+        return interaction.get('response')
+
+    def sendcmd(self, command):
+        return self._call(command).get('response')
+
+    def size(self, file_path):
+        return self._call('SIZE ' + file_path).get('response')
+
+    def voidcmd(self, command):
+        if command == 'NOOP':
+            return '200 NOOP command successful'
+        return self._call(command).get('response')
+
+    def _call(self, command):
+        interaction = self.cassette._replay('FTP', 'ftp://' + self.host, command)
+        if interaction.get('error'):
+            error_name, message = interaction['error']
+            raise getattr(ftplib, error_name, ftplib.Error)(message)
+        return interaction
+
+
+def get_cassette():
+    """returns the cassette in use, or None; the first call sets up the
+    cassette named by the ULMO_CASSETTE environment variable, if it is set
+    """
+    global _cassette, _environment_checked
+    if not _environment_checked:
+        with _cassette_lock:
+            if not _environment_checked:
+                _environment_checked = True
+                path = os.environ.get('ULMO_CASSETTE')
+                if path and _cassette is None:
+                    _cassette = Cassette(path,
+                            mode=os.environ.get('ULMO_CASSETTE_MODE') or None,
+                            latency=_latency_from_environment())
+                    atexit.register(_cassette.close)
+    return _cassette
+
+
+@contextmanager
+def use_cassette(path, mode=None, latency=None):
+    """Records or replays the HTTP, SOAP and FTP exchanges made through ulmo
+    within the with block. See Cassette for the parameters.
+
+    Usage example::
+
+        from ulmo import util
+        from ulmo.usgs import nwis
+
+        # the first run records the exchanges, later runs replay them
+        with util.use_cassette('nwis_harvest.cassette'):
+            nwis.get_site_data('08068500', service='daily')
+
+    While recording, each response body is read in full before it is passed
+    on, so recording a download holds it in memory once.
+    """
+    global _cassette
+    from .misc import close_ftp_connections
+    get_cassette()
+    cassette = Cassette(path, mode=mode, latency=latency)
+    with _cassette_lock:
+        previous, _cassette = _cassette, cassette
+    # pooled ftp connections belong to whichever cassette opened them
+    close_ftp_connections()
+    try:
+        yield cassette
+    finally:
+        with _cassette_lock:
+            _cassette = previous
+        close_ftp_connections()
+        cassette.close()
+
+
+def _digest(content):
+    if content is None:
+        content = b''
+    elif not isinstance(content, bytes):
+        content = content.encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+
+def _interaction_key(interaction):
+    return (interaction['method'], interaction['url'], interaction['request'])
+
+
+def _joined_lines(lines, new_lines):
+    lines.extend(new_lines)
+    return '\n'.join(lines).encode('utf-8')
+
+
+def _latency_from_environment():
+    latency = os.environ.get('ULMO_CASSETTE_LATENCY')
+    if not latency or latency == 'recorded':
+        return latency or None
+    return float(latency)
+
+
+def _prepare(method, url, kwargs):
+    return requests.Request(method, url, params=kwargs.get('params'),
+            data=kwargs.get('data'), json=kwargs.get('json'),
+            files=kwargs.get('files')).prepare()
+
+
+def _replayed_response(interaction, content, request):
+    """a response with the recorded content, which can be read either at once
+    or as a stream
+    """
+    response = requests.Response()
+    response.url = interaction['url']
+    response.status_code = interaction['status']
+    response.reason = interaction['reason']
+    response.headers = requests.structures.CaseInsensitiveDict(
+        interaction['headers'])
+    response.encoding = requests.utils.get_encoding_from_headers(
+        response.headers)
+    response.raw = io.BytesIO(content)
+    response.request = request
+    return response
+
+
+def _retr_command(command, rest):
+    if rest:
+        return '%s REST %s' % (command, rest)
+    return command
+
+
+def _split_lines(body):
+    if not body:
+        return []
+    return body.decode('utf-8').split('\n')
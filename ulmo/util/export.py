@@ -0,0 +1,325 @@
+"""
+   ulmo.util.export
+   ~~~~~~~~~~~~~~~~
+
+   Writes the results of the get_* functions to Parquet or Arrow IPC files
+   with typed columns, so they can be stored and queried without walking
+   value dicts or object dtype dataframes. Every result is first turned into
+   one dataframe with a 'site' and a 'datetime' column; values keep numeric
+   dtypes and flags, qualifiers and other strings are dictionary encoded.
+   Rows are sorted by site and time and written with one row group (or
+   record batch) per site and year, so readers can skip the sites and years
+   they don't need using the row group statistics.
+
+   Writing files needs pyarrow, which is an optional dependency.
+"""
+import numpy as np
+import pandas
+
+from .misc import DependencyError
+from .timeseries import TimeSeries, _datetime64_array
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+EXPORT_FORMATS = ('parquet', 'arrow')
+
+
+def export_data(data, path, provider, format='parquet', site=None,
+        compression='snappy'):
+    """Writes data returned by one of the get_* functions to a Parquet or
+    Arrow IPC file.
+
+    Usage example::
+
+        from ulmo import util
+        from ulmo.usgs import nwis
+
+        data = nwis.get_site_data('08068500', service='daily')
+        util.export_data(data, '08068500.parquet', 'usgs.nwis')
+
+    Parameters
+    ----------
+    data : dict, list or pandas.DataFrame
+        The data, as returned by the get_* function of the provider, in its
+        default shape or, for the providers that have them, the
+        ``as_dataframe=True`` / ``as_timeseries=True`` shapes (the dataframes
+        save a step). For ncdc.gsod this may also be the SpillDict returned
+        with ``memory_limit``.
+    path : str
+        Path of the file to write; an existing file is replaced.
+    provider : str
+        The provider that returned the data, one of: 'cdec.historical',
+        'cpc.drought', 'ncdc.cirs', 'ncdc.ghcn_daily', 'ncdc.gsod',
+        'noaa.goes', 'twc.kbdi' or 'usgs.nwis'.
+    format : str
+        Either 'parquet' (default) or 'arrow' for the Arrow IPC file format.
+    site : ``None`` or str
+        Station id to write for ncdc.ghcn_daily dicts and dataframes, which
+        don't include it. Not needed for the other providers.
+    compression : ``None`` or str
+        Compression codec for Parquet files, e.g. 'snappy' (default), 'zstd'
+        or 'gzip'.
+
+    Returns
+    -------
+    rows : int
+        The number of rows written.
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError("format must be one of %s, not %r" % (
+            ', '.join(EXPORT_FORMATS), format))
+    if pyarrow is None:
+        raise DependencyError("Trying to export data, which depends on "
+                "pyarrow, but pyarrow has not been installed.")
+
+    dataframe = export_dataframe(data, provider, site=site)
+    schema = pyarrow.Schema.from_pandas(dataframe, preserve_index=False)
+    if format == 'parquet':
+        writer = pyarrow.parquet.ParquetWriter(path, schema,
+                compression=compression)
+    else:
+        writer = pyarrow.ipc.new_file(path, schema)
+    try:
+        for group in _site_year_groups(dataframe):
+            table = pyarrow.Table.from_pandas(group, schema=schema,
+                    preserve_index=False)
+            if format == 'parquet':
+                writer.write_table(table, row_group_size=len(group))
+            else:
+                writer.write_table(table, max_chunksize=len(group))
+    finally:
+        writer.close()
+    return len(dataframe)
+
+
+def export_dataframe(data, provider, site=None):
+    """Returns the typed dataframe that export_data writes for data returned
+    by provider: a 'site' and a 'datetime' (datetime64[ns]) column, followed
+    by the value columns and with strings as pandas.Categorical columns,
+    sorted by site and datetime. See export_data for the arguments.
+    """
+    if provider not in _EXPORT_FRAMES:
+        raise ValueError("can't export data for %r; providers are: %s" % (
+            provider, ', '.join(sorted(_EXPORT_FRAMES))))
+    frames = [
+        frame for frame in _EXPORT_FRAMES[provider](data, site)
+        if len(frame)
+    ]
+    if not len(frames):
+        return pandas.DataFrame({
+            'site': pandas.Categorical([]),
+            'datetime': np.array([], dtype='datetime64[ns]'),
+        })
+    return _typed_dataframe(pandas.concat(frames, ignore_index=True,
+        sort=False))
+
+
+def _typed_dataframe(dataframe):
+    dataframe['site'] = dataframe['site'].map(str)
+    dataframe['datetime'] = _datetime64_array(
+        pandas.Index(dataframe['datetime']))
+    dataframe = dataframe.sort_values(['site', 'datetime'], kind='mergesort')
+    dataframe = dataframe.reset_index(drop=True)
+
+    # flags, qualifiers, units etc. are repeated for most rows, so these are
+    # dictionary encoded; mostly unique strings (e.g. GOES messages) in long
+    # results are not
+    for column in dataframe.columns:
+        series = dataframe[column]
+        if series.dtype != object:
+            continue
+        series = series.where(series.isnull(), series.map(str))
+        if column == 'site' or series.nunique() <= max(len(series) // 2, 256):
+            series = pandas.Categorical(series)
+        dataframe[column] = series
+
+    columns = ['site', 'datetime'] + [
+        column for column in dataframe.columns
+        if column not in ('site', 'datetime')]
+    return dataframe[columns]
+
+
+def _site_year_groups(dataframe):
+    years = dataframe['datetime'].dt.year
+    keys = list(zip(dataframe['site'].astype(object), years))
+    start = 0
+    for end in range(1, len(keys) + 1):
+        if end == len(keys) or keys[end] != keys[start]:
+            yield dataframe.iloc[start:end]
+            start = end
+
+
+def _timeseries_frame(timeseries, **columns):
+    frame = timeseries.to_dataframe()
+    frame.index.name = 'datetime'
+    frame = frame.reset_index()
+    for name, value in columns.items():
+        frame[name] = value
+    return frame
+
+
+def _cdec_frames(data, site):
+    for station_id, variables in sorted(data.items()):
+        for variable, dataframe in sorted(variables.items()):
+            frame = dataframe.rename_axis('datetime').reset_index()
+            frame = frame.drop(columns=['station_id'], errors='ignore')
+            frame['site'] = station_id
+            frame['variable'] = variable
+            yield frame
+
+
+def _cirs_frames(data, site):
+    frame = pandas.DataFrame(data)
+    if not len(frame):
+        return
+    # the location code column is renamed when location names are added
+    codes = frame['state_code' if 'state_code' in frame else 'location_code']
+    if 'division' in frame:
+        frame['site'] = [
+            '%s-%s' % (code, division)
+            for code, division in zip(codes, frame['division'])
+        ]
+    else:
+        frame['site'] = codes.map(str)
+    frame['datetime'] = pandas.to_datetime(pandas.DataFrame({
+        'year': frame['year'], 'month': frame['month'], 'day': 1}))
+    yield frame
+
+
+def _cpc_frames(data, site):
+    if isinstance(data, pandas.DataFrame):
+        frame = data.copy()
+    else:
+        # value dicts keyed by state, then climate division
+        frame = pandas.DataFrame([
+            dict(value_dict, state=state, climate_division=climate_division)
+            for state, climate_divisions in data.items()
+            for climate_division, value_dicts in climate_divisions.items()
+            for value_dict in value_dicts
+        ])
+    if not len(frame):
+        return
+    frame['site'] = [
+        '%s-%s' % (state, climate_division)
+        for state, climate_division in zip(frame['state'],
+            frame['climate_division'])
+    ]
+    # weekly periods are written as the sunday they start on; the value dicts
+    # have them as strings such as '2010-06-06/2010-06-12'
+    periods = frame.pop('period')
+    if periods.dtype == object:
+        frame['datetime'] = pandas.to_datetime(
+            periods.str.split('/').str[0])
+    else:
+        frame['datetime'] = pandas.PeriodIndex(periods).start_time
+    yield frame
+
+
+def _ghcn_daily_frames(data, site):
+    for element, element_data in sorted(data.items()):
+        if isinstance(element_data, TimeSeries):
+            yield _timeseries_frame(element_data,
+                site=element_data.metadata.get('station_id', site),
+                element=element)
+            continue
+        if site is None:
+            raise ValueError("ncdc.ghcn_daily data only include the station "
+                    "id if they are TimeSeries; pass it as site")
+        if isinstance(element_data, pandas.DataFrame):
+            frame = element_data.copy()
+        else:
+            frame = pandas.DataFrame.from_dict(element_data, orient='index')
+            frame.index = pandas.PeriodIndex(frame.index, freq='D')
+        frame.index = frame.index.to_timestamp()
+        frame['value'] = pandas.to_numeric(frame['value'])
+        frame = frame.rename_axis('datetime').reset_index()
+        frame['site'] = site
+        frame['element'] = element
+        yield frame
+
+
+def _goes_frames(data, site):
+    if isinstance(data, pandas.DataFrame):
+        frame = data.reset_index(drop=True)
+    else:
+        frame = pandas.DataFrame.from_dict(data, orient='index')
+        frame = frame.reset_index(drop=True)
+    if not len(frame):
+        return
+    frame = frame.rename(columns={
+        'dcp_address': 'site', 'message_timestamp_utc': 'datetime'})
+    yield frame
+
+
+def _gsod_frames(data, site):
+    for station, station_data in sorted(data.items()):
+        if isinstance(station_data, TimeSeries):
+            yield _timeseries_frame(station_data, site=station)
+            continue
+        if station_data is None:
+            continue
+        # the USAF and WBAN ids are the station code, which is the site
+        if isinstance(station_data, np.ndarray):
+            frame = pandas.DataFrame.from_records(station_data, exclude=[
+                name for name in ('USAF', 'WBAN')
+                if name in station_data.dtype.names])
+        else:
+            # lists of value dicts, which get_data returns by default
+            frame = pandas.DataFrame.from_records(station_data)
+            frame = frame.drop(columns=['USAF', 'WBAN'], errors='ignore')
+        if not len(frame):
+            continue
+        frame = frame.rename(columns={'date': 'datetime'})
+        frame['site'] = station
+        yield frame
+
+
+def _kbdi_frames(data, site):
+    if isinstance(data, pandas.DataFrame):
+        frame = data.copy()
+    else:
+        # value dicts keyed by county fips code
+        frame = pandas.DataFrame([
+            dict(value_dict, fips=fips)
+            for fips, value_dicts in data.items()
+            for value_dict in value_dicts
+        ])
+    if not len(frame):
+        return
+    frame['site'] = frame.pop('fips')
+    frame['datetime'] = pandas.PeriodIndex(frame.pop('date'),
+            freq='D').to_timestamp()
+    yield frame
+
+
+def _nwis_frames(data, site):
+    for code, variable_data in sorted(data.items()):
+        if isinstance(variable_data, TimeSeries):
+            timeseries = variable_data
+        else:
+            timeseries = TimeSeries.from_value_dicts(
+                variable_data.get('values', []),
+                metadata=dict([
+                    (key, value) for key, value in variable_data.items()
+                    if key != 'values']))
+        yield _timeseries_frame(timeseries,
+            site=timeseries.metadata.get('site', {}).get('code', site),
+            variable=code)
+
+
+_EXPORT_FRAMES = {
+    'cdec.historical': _cdec_frames,
+    'cpc.drought': _cpc_frames,
+    'ncdc.cirs': _cirs_frames,
+    'ncdc.ghcn_daily': _ghcn_daily_frames,
+    'ncdc.gsod': _gsod_frames,
+    'noaa.goes': _goes_frames,
+    'twc.kbdi': _kbdi_frames,
+    'usgs.nwis': _nwis_frames,
+}
@@ -0,0 +1,159 @@
+"""
+   ulmo.util.instrumentation
+   ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+   Lightweight timing of the stages of a request: fetching data over the
+   network, decompressing it, parsing it, building DataFrames and writing to
+   storage. Timings are handed to sinks added with add_timing_sink; nothing is
+   recorded while there are no sinks.
+
+   Stages used by ulmo are 'fetch', 'decompress', 'parse', 'dataframe' and
+   'write'.
+"""
+from contextlib import contextmanager
+import collections
+import logging
+import threading
+import time
+
+
+_clock = getattr(time, 'perf_counter', time.time)
+_local = threading.local()
+_sinks = []
+_sinks_lock = threading.Lock()
+
+log = logging.getLogger(__name__)
+
+
+class Timing(object):
+    """The timing of one stage. `bytes` and `records` are set by the code
+    being timed where it knows them; `fields` holds any other details such as
+    the url being fetched.
+    """
+    def __init__(self, stage, provider=None, fields=None):
+        self.stage = stage
+        self.provider = provider
+        self.fields = fields or {}
+        self.bytes = None
+        self.records = None
+        self.seconds = None
+        self.error = None
+
+    def __repr__(self):
+        return '<Timing %s %s: %.6fs, %s bytes, %s records>' % (
+            self.provider, self.stage, self.seconds or 0, self.bytes,
+            self.records)
+
+
+class LoggingSink(object):
+    """timing sink that logs each timing"""
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or log
+        self.level = level
+
+    def __call__(self, timing):
+        self.logger.log(self.level,
+            'ulmo timing: provider=%s stage=%s seconds=%.6f bytes=%s records=%s%s',
+            timing.provider, timing.stage, timing.seconds, timing.bytes,
+            timing.records, ''.join([
+                ' %s=%s' % item for item in sorted(timing.fields.items())]))
+
+
+class StatsSink(object):
+    """timing sink that keeps running totals per provider and stage in
+    memory; `stats` maps (provider, stage) tuples to dicts with the count,
+    total and maximum seconds, bytes, records and errors of the timings
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def __call__(self, timing):
+        with self._lock:
+            stats = self.stats[(timing.provider, timing.stage)]
+            stats['count'] += 1
+            stats['seconds'] += timing.seconds
+            stats['max_seconds'] = max(stats['max_seconds'], timing.seconds)
+            stats['bytes'] += timing.bytes or 0
+            stats['records'] += timing.records or 0
+            stats['errors'] += timing.error is not None
+
+    def reset(self):
+        with self._lock:
+            self.stats = collections.defaultdict(lambda: {
+                'count': 0,
+                'seconds': 0.0,
+                'max_seconds': 0.0,
+                'bytes': 0,
+                'records': 0,
+                'errors': 0,
+            })
+
+    def summary(self):
+        """returns the stats as a pandas.DataFrame indexed by provider and
+        stage, sorted by total time
+        """
+        import pandas
+        with self._lock:
+            rows = [
+                dict(provider=provider, stage=stage, **stats)
+                for (provider, stage), stats in self.stats.items()
+            ]
+        if not rows:
+            return pandas.DataFrame()
+        return pandas.DataFrame(rows).set_index(['provider', 'stage'])\
+            .sort_values('seconds', ascending=False)
+
+
+def add_timing_sink(sink):
+    """Starts sending timings to sink, which is called with a Timing once each
+    timed stage is complete. A sink can be any callable, e.g. a LoggingSink,
+    a StatsSink or a plain function.
+    """
+    with _sinks_lock:
+        _sinks.append(sink)
+    return sink
+
+
+def remove_timing_sink(sink):
+    """stops sending timings to sink"""
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+@contextmanager
+def timed(stage, provider=None, **fields):
+    """Context manager that times a stage and sends the timing to the sinks.
+    It yields a Timing whose `bytes`, `records` and `fields` can be filled in
+    by the timed code. Timings without a provider take the provider of the
+    stage they are nested in.
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    if provider is None and stack:
+        provider = stack[-1].provider
+    timing = Timing(stage, provider, fields)
+    stack.append(timing)
+    start = _clock()
+    try:
+        yield timing
+    except Exception as e:
+        timing.error = e
+        raise
+    finally:
+        timing.seconds = _clock() - start
+        stack.pop()
+        if _sinks:
+            _emit(timing)
+
+
+def _emit(timing):
+    with _sinks_lock:
+        sinks = list(_sinks)
+    for sink in sinks:
+        try:
+            sink(timing)
+        except Exception:
+            log.exception('timing sink %r failed', sink)
@@ -4,13 +4,21 @@ from builtins import zip
 from builtins import str
 from past.builtins import basestring
 from builtins import object
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from contextlib import contextmanager
 import datetime
 import email.utils
 import ftplib
 import functools
+import io
+import json
+import logging
+import mmap
 import os
+import posixpath
 import re
+import threading
+import time
 import urllib.parse
 import warnings
 
@@ -18,8 +26,54 @@ import appdirs
 from lxml import etree
 import numpy as np
 import pandas
-import requests
 
+from .cassettes import get_cassette
+from .instrumentation import timed
+from .sessions import get_session
+
+
+# number of seconds a downloaded file is considered fresh after it was last
+# checked against the server; 0 means the server is always checked
+DOWNLOAD_TTL = 0
+
+# suffix of the hidden sidecar file that holds the validators of a downloaded
+# file; the sidecar for data.txt is .data.txt.ulmo-meta.json
+DOWNLOAD_METADATA_SUFFIX = '.ulmo-meta.json'
+
+# suffix of the file a download is written to until it is complete
+PARTIAL_DOWNLOAD_SUFFIX = '.part'
+
+# number of seconds a cached ftp directory listing is reused before the
+# directory is listed again
+FTP_LISTING_TTL = 300
+
+# maximum number of idle logged-in connections kept open for each ftp host
+FTP_POOL_SIZE = 4
+
+log = logging.getLogger(__name__)
+
+# strings that parse_fwf treats as missing values in addition to any given
+# na_values; these are the defaults of pandas.read_fwf
+FWF_NA_VALUES = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+    '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'n/a', 'nan',
+    'null',
+])
+
+# lookup table of the bytes parse_fwf treats as whitespace
+_FWF_WHITESPACE = np.zeros(256, dtype=bool)
+_FWF_WHITESPACE[list(bytearray(b' \t\r\x0b\x0c'))] = True
+
+_ftp_connections = {}
+_ftp_listings = {}
+_ftp_lock = threading.Lock()
+
+# calls currently running in single_flight, and locks held by writers of
+# downloaded files, each with the number of threads using it
+_flights = {}
+_flights_lock = threading.Lock()
+_path_locks = {}
+_path_locks_lock = threading.Lock()
 
 # pre-compiled regexes for underscore conversion
 first_cap_re = re.compile('(.)([A-Z][a-z]+)')
@@ -30,6 +84,26 @@ class DependencyError(Exception):
     pass
 
 
+class _Flight(object):
+    """a call in progress in single_flight"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+        self.result = None
+        self.waiters = 0
+
+
+class DownloadError(Exception):
+    """raised by download_many when one or more downloads failed; failures is
+    a dict mapping each url that failed to the exception it raised
+    """
+    def __init__(self, failures):
+        self.failures = failures
+        message = '%s download(s) failed: %s' % (len(failures), ', '.join(
+            '%s (%s)' % (url, error) for url, error in failures.items()))
+        super(DownloadError, self).__init__(message)
+
+
 def camel_to_underscore(s):
     """converts camelCase to underscore, originally from
     http://stackoverflow.com/questions/1175208/elegant-python-function-to-convert-camelcase-to-camel-case
@@ -52,17 +126,43 @@ def convert_datetime(datetime):
     return pandas.Timestamp(datetime).to_pydatetime()
 
 
-def dir_list(url):
+def close_ftp_connections():
+    """closes all idle pooled ftp connections and forgets cached directory
+    listings; connections will be re-opened as needed
+    """
+    with _ftp_lock:
+        connections = [
+            ftp for idle in _ftp_connections.values() for ftp in idle]
+        _ftp_connections.clear()
+        _ftp_listings.clear()
+    for ftp in connections:
+        _ftp_close(ftp)
+
+
+def dir_list(url, ttl=None):
     """given a path to a ftp directory, returns a list of files in that
-    directory
+    directory. Listings are cached for `ttl` seconds; if `ttl` is None then
+    FTP_LISTING_TTL is used.
     """
     parsed = urllib.parse.urlparse(url)
-    ftp = ftplib.FTP(parsed.netloc, "anonymous")
-    ftp.cwd(parsed.path)
-    return ftp.nlst()
+
+    with _ftp_connection(parsed.netloc) as ftp:
+        def list_directory():
+            ftp.cwd(parsed.path)
+            return ftp.nlst()
+
+        return list(_ftp_cached_listing(
+            parsed.netloc, parsed.path, 'NLST', list_directory, ttl))
 
 
 def dict_from_dataframe(dataframe):
+    """returns a dict of the rows of dataframe keyed to their index, with
+    timestamps converted to strings and nans to None; dataframe itself is left
+    unchanged
+    """
+    # a shallow copy, so that the index can be replaced without touching the
+    # caller's dataframe
+    dataframe = dataframe.copy(deep=False)
     if isinstance(dataframe.index, pandas.PeriodIndex):
         dataframe.index = dataframe.index.to_timestamp().astype('str')
     if isinstance(dataframe.index, pandas.DatetimeIndex):
@@ -73,6 +173,7 @@ def dict_from_dataframe(dataframe):
     # dataframe, it gets converted to a nan object so this has to be done
     # rather inefficiently in a post-processing step
     if pandas.__version__ < '0.13.0':
+        dataframe = dataframe.copy()
         for column_name in dataframe.columns:
             dataframe[column_name][pandas.isnull(dataframe[column_name])] = None
         df_dict = dataframe.T.to_dict()
@@ -82,22 +183,94 @@ def dict_from_dataframe(dataframe):
     return df_dict
 
 
-def download_if_new(url, path, check_modified=True):
+def download_if_new(url, path, check_modified=True, ttl=None):
     """downloads the file located at `url` to `path`, if check_modified is True
-    it will only download if the url's last-modified header has a more recent
-    date than the filesystem's last modified date for the file
-    """
-    parsed = urllib.parse.urlparse(url)
+    it will only download if the file on the server has changed since it was
+    last downloaded. For http urls this is a single conditional request using
+    the ETag and Last-Modified validators recorded alongside the file.
 
-    if os.path.exists(path) and not check_modified:
-        return
+    If the file was checked less than `ttl` seconds ago then it is considered
+    fresh and the server is not contacted at all; if `ttl` is None then
+    DOWNLOAD_TTL is used.
 
-    if parsed.scheme.startswith('ftp'):
-        _ftp_download_if_new(url, path, check_modified)
-    elif parsed.scheme.startswith('http'):
-        _http_download_if_new(url, path, check_modified)
-    else:
-        raise NotImplementedError("only ftp and http urls are currently implemented")
+    Threads downloading the same url to the same path at the same time share
+    a single download, and downloads of different urls to the same path are
+    made one after another.
+    """
+    def download():
+        with _path_lock(path):
+            _download_if_new(url, path, check_modified, ttl)
+    single_flight(('download', url, os.path.abspath(path)), download)
+
+
+def download_many(url_path_pairs, max_workers=8, per_host_limit=4,
+        check_modified=True, ttl=None, progress=None, raise_errors=True):
+    """Downloads many files concurrently with download_if_new.
+
+    Parameters
+    ----------
+    url_path_pairs : iterable of (url, path) tuples
+        Files to download. If several urls share a path, only the first is
+        downloaded.
+    max_workers : int
+        Maximum number of downloads running at the same time.
+    per_host_limit : int
+        Maximum number of downloads running at the same time for any single
+        host, so that a long list of files from one server does not flood it.
+    check_modified, ttl
+        Passed along to download_if_new for each file.
+    progress : ``None`` or callable
+        If given, called after each download finishes as
+        ``progress(completed, total, url, error)`` where error is ``None`` for
+        successful downloads.
+    raise_errors : bool
+        If ``True`` (default), a DownloadError listing every failed download is
+        raised once all downloads have finished. If ``False``, the failures are
+        returned instead.
+
+    Returns
+    -------
+    failures : dict
+        A dict mapping urls that could not be downloaded to the exception that
+        was raised; empty if all downloads succeeded.
+    """
+    pairs = []
+    seen_paths = set()
+    for url, path in url_path_pairs:
+        if path not in seen_paths:
+            seen_paths.add(path)
+            pairs.append((url, path))
+
+    host_limits = dict([
+        (host, threading.BoundedSemaphore(per_host_limit))
+        for host in set(urllib.parse.urlparse(url).netloc for url, path in pairs)
+    ])
+
+    def download(url, path):
+        with host_limits[urllib.parse.urlparse(url).netloc]:
+            download_if_new(url, path, check_modified=check_modified, ttl=ttl)
+
+    failures = {}
+    total = len(pairs)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = dict([
+            (executor.submit(download, url, path), url)
+            for url, path in pairs
+        ])
+        for completed, future in enumerate(as_completed(futures), 1):
+            url = futures[future]
+            error = future.exception()
+            if error is not None:
+                failures[url] = error
+                log.warning('download failed: %s (%s)' % (url, error))
+            else:
+                log.debug('downloaded %s of %s: %s' % (completed, total, url))
+            if progress is not None:
+                progress(completed, total, url, error)
+
+    if failures and raise_errors:
+        raise DownloadError(failures)
+    return failures
 
 
 def get_ulmo_dir(sub_dir=None):
@@ -111,7 +284,12 @@ def get_ulmo_dir(sub_dir=None):
 def mkdir_if_doesnt_exist(dir_path):
     """makes a directory if it doesn't exist"""
     if not os.path.exists(dir_path):
-        os.makedirs(dir_path)
+        try:
+            os.makedirs(dir_path)
+        except OSError:
+            # another thread or process may have just created it
+            if not os.path.isdir(dir_path):
+                raise
 
 
 def module_with_dependency_errors(method_names):
@@ -148,13 +326,15 @@ def module_with_deprecation_warnings(functions, warning_message):
 
 
 @contextmanager
-def open_file_for_url(url, path, check_modified=True, use_file=None, use_bytes=None):
+def open_file_for_url(url, path, check_modified=True, use_file=None, use_bytes=None,
+        ttl=None):
     """Context manager that returns an open file handle for a data file;
     downloading if necessary or otherwise using a previously downloaded file.
     File downloading will be short-circuited if use_file is either a file path
     or an open file-like object (i.e. file handler or StringIO obj), in which
     case the file handler pointing to use_file is returned - if use_file is a
-    file handler then the handler won't be closed upon exit.
+    file handler then the handler won't be closed upon exit. See
+    download_if_new for check_modified and ttl.
     """
     leave_open = False
 
@@ -165,7 +345,7 @@ def open_file_for_url(url, path, check_modified=True, use_file=None, use_bytes=N
         else:
             open_path = use_file
     else:
-        download_if_new(url, path, check_modified)
+        download_if_new(url, path, check_modified, ttl=ttl)
         open_path = path
 
     if use_bytes is None:
@@ -179,24 +359,34 @@ def open_file_for_url(url, path, check_modified=True, use_file=None, use_bytes=N
         open_file.close()
 
 
-def parse_fwf(file_path, columns, na_values=None):
-    """Convenience function for parsing fixed width formats. Wraps the pandas
-    read_fwf parser but allows all column information to be kept together.
-    Columns should be an iterable of lists/tuples with the format (column_name,
-    start_value, end_value, converter). Returns a pandas dataframe.
-    """
-    names, colspecs = list(zip(*[(name, (start, end))
-        for name, start, end, converter in columns]))
-
-    converters = dict([
-        (name, converter)
-        for name, start, end, converter in columns
-        if not converter is None
-    ])
+def parse_fwf(file_path, columns, na_values=None, memory_map=False):
+    """Convenience function for parsing fixed width formats. Columns should be
+    an iterable of lists/tuples with the format (column_name, start_value,
+    end_value, converter). Returns a pandas dataframe.
 
-    return pandas.io.parsers.read_fwf(file_path,
-        colspecs=colspecs, header=None, na_values=na_values, names=names,
-        converters=converters)
+    The file is read as a single byte buffer (memory-mapped if memory_map is
+    True and file_path is a path) and viewed as a 2-d array of lines, so each
+    column is sliced and converted in bulk rather than value by value. Values
+    are stripped of surrounding whitespace; empty values and values in
+    na_values are missing (NaN). Columns without a converter are converted to
+    integers or floats where all of their values are numeric, like
+    pandas.read_fwf would. The int, float and str converters are applied to
+    whole columns at once; any other converter is called on each value.
+    """
+    if hasattr(file_path, 'read'):
+        data = file_path.read()
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        return _parse_fwf_buffer(data, columns, na_values)
+
+    with open(file_path, 'rb') as f:
+        if not memory_map or not os.fstat(f.fileno()).st_size:
+            return _parse_fwf_buffer(f.read(), columns, na_values)
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return _parse_fwf_buffer(mapped, columns, na_values)
+        finally:
+            mapped.close()
 
 
 def raise_dependency_error(*args, **kwargs):
@@ -214,6 +404,44 @@ def save_pretty_printed_xml(filename, response_buffer):
         response_buffer.seek(0)
 
 
+def single_flight(key, function, copy=None):
+    """Calls function() and returns its result, unless a call with the same
+    key is already in progress in another thread; in that case, waits for that
+    call to finish and returns its result (or raises the exception it raised)
+    instead of calling function again.
+
+    If copy is given, the callers that shared a result each get copy(result),
+    so that they can safely modify it.
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+        else:
+            flight.waiters += 1
+
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result if copy is None else copy(flight.result)
+
+    try:
+        flight.result = function()
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        # no threads can join the call once it has been removed
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+    if copy is not None and flight.waiters:
+        return copy(flight.result)
+    return flight.result
+
+
 def to_bytes(s):
     """convert str to bytes for py 2/3 compat
     """
@@ -224,22 +452,241 @@ def to_bytes(s):
     return s.encode('utf-8', 'ignore')
 
 
-def _ftp_download_if_new(url, path, check_modified=True):
+def _complete_partial_download(part_path, path):
+    """atomically moves a completed partial download into place"""
+    os.replace(part_path, path)
+    _remove_download_metadata(part_path)
+
+
+def _download_if_new(url, path, check_modified, ttl):
     parsed = urllib.parse.urlparse(url)
-    ftp = ftplib.FTP(parsed.netloc, "anonymous")
-    directory, filename = parsed.path.rsplit('/', 1)
-    ftp_last_modified = _ftp_last_modified(ftp, parsed.path)
-    ftp_file_size = _ftp_file_size(ftp, parsed.path)
 
-    if not os.path.exists(path) or os.path.getsize(path) != ftp_file_size:
-        _ftp_download_file(ftp, parsed.path, path)
-    elif check_modified and _path_last_modified(path) < ftp_last_modified:
-        _ftp_download_file(ftp, parsed.path, path)
+    if os.path.exists(path) and not check_modified:
+        return
+
+    if ttl is None:
+        ttl = DOWNLOAD_TTL
+    if _download_is_fresh(url, path, ttl):
+        return
+
+    if parsed.scheme.startswith('ftp'):
+        _ftp_download_if_new(url, path, check_modified)
+    elif parsed.scheme.startswith('http'):
+        _http_download_if_new(url, path, check_modified)
+    else:
+        raise NotImplementedError("only ftp and http urls are currently implemented")
 
 
-def _ftp_download_file(ftp, ftp_path, local_path):
-    with open(local_path, 'wb') as f:
-        ftp.retrbinary("RETR " + ftp_path, f.write)
+def _download_is_fresh(url, path, ttl):
+    """returns True if path was downloaded from url and checked against the
+    server within the last ttl seconds
+    """
+    if not ttl or not os.path.exists(path):
+        return False
+    metadata = _read_download_metadata(path)
+    if metadata.get('url') != url or metadata.get('size') != os.path.getsize(path):
+        return False
+    return time.time() - metadata.get('checked', 0) < ttl
+
+
+def _download_metadata_path(path):
+    directory, filename = os.path.split(path)
+    return os.path.join(directory, '.' + filename + DOWNLOAD_METADATA_SUFFIX)
+
+
+def _ftp_cached_listing(host, dir_path, command, list_directory, ttl=None):
+    """returns the cached result of listing a directory with `command`, calling
+    list_directory() to refresh it if it is older than `ttl` seconds
+    """
+    now = time.time()
+    cached = _ftp_fresh_listing(host, dir_path, command, ttl, now=now)
+    if cached is not None:
+        return cached[1]
+
+    listing = list_directory()
+    with _ftp_lock:
+        _ftp_listings[(host, dir_path, command)] = (now, listing)
+    return listing
+
+
+def _ftp_close(ftp):
+    try:
+        ftp.quit()
+    except ftplib.all_errors:
+        ftp.close()
+
+
+def _ftp_open(host):
+    connect = lambda: ftplib.FTP(host, "anonymous")
+    cassette = get_cassette()
+    if cassette is None:
+        return connect()
+    return cassette.ftp_connection(host, connect)
+
+
+@contextmanager
+def _ftp_connection(host):
+    """checks out a logged-in connection to host from the pool, opening a new
+    one if there are no idle connections; the connection is returned to the
+    pool afterwards unless an error was raised while using it
+    """
+    ftp = None
+    while ftp is None:
+        with _ftp_lock:
+            idle = _ftp_connections.get(host)
+            if not idle:
+                break
+            ftp = idle.pop()
+        try:
+            ftp.voidcmd('NOOP')
+        except ftplib.all_errors:
+            # the server has closed the idle connection
+            ftp.close()
+            ftp = None
+    if ftp is None:
+        ftp = _ftp_open(host)
+
+    try:
+        yield ftp
+    except Exception:
+        _ftp_close(ftp)
+        raise
+
+    with _ftp_lock:
+        idle = _ftp_connections.setdefault(host, [])
+        if len(idle) < FTP_POOL_SIZE:
+            idle.append(ftp)
+            ftp = None
+    if ftp is not None:
+        _ftp_close(ftp)
+
+
+def _ftp_directory_facts(ftp, host, dir_path, ttl=None):
+    """returns a dict mapping the names of the files in a directory to their
+    size and last modified datetime, from a single (cached) MLSD listing; None
+    is returned if the server doesn't support MLSD
+    """
+    def list_directory():
+        lines = []
+        try:
+            ftp.retrlines('MLSD ' + dir_path, lines.append)
+        except ftplib.error_perm:
+            return None
+
+        listing = {}
+        for line in lines:
+            facts_string, _, name = line.partition(' ')
+            facts = _ftp_parse_facts(facts_string)
+            if facts.get('type') != 'file' or 'size' not in facts \
+                    or 'modify' not in facts:
+                continue
+            listing[name] = (int(facts['size']),
+                    _ftp_parse_timestamp(facts['modify']))
+        return listing
+
+    return _ftp_cached_listing(host, dir_path, 'MLSD', list_directory, ttl)
+
+
+def _ftp_download_if_new(url, path, check_modified=True):
+    parsed = urllib.parse.urlparse(url)
+    directory, filename = posixpath.split(parsed.path)
+
+    # a cached listing showing that path is current needs no connection
+    cached = _ftp_fresh_listing(parsed.netloc, directory, 'MLSD')
+    listing = cached[1] if cached is not None else None
+    if listing and filename in listing and _ftp_file_is_current(path,
+            listing[filename][0], listing[filename][1], check_modified):
+        _write_download_metadata(path, url)
+        return
+
+    with _ftp_connection(parsed.netloc) as ftp:
+        listing = _ftp_directory_facts(ftp, parsed.netloc, directory)
+        if listing and filename in listing:
+            ftp_file_size, ftp_last_modified = listing[filename]
+        else:
+            ftp_file_size, ftp_last_modified = _ftp_file_facts(ftp, parsed.path)
+
+        try:
+            if not _ftp_file_is_current(path, ftp_file_size,
+                    ftp_last_modified, check_modified):
+                _ftp_download_file(ftp, parsed.path, path, ftp_file_size,
+                        ftp_last_modified)
+        except IOError:
+            # the cached listing may be out of date, so list the directory
+            # again next time
+            _ftp_forget_listing(parsed.netloc, directory)
+            raise
+
+    _write_download_metadata(path, url)
+
+
+def _ftp_download_file(ftp, ftp_path, local_path, ftp_file_size=None,
+        ftp_last_modified=None):
+    """downloads a file from an ftp server to local_path by way of a partial
+    download file, resuming an earlier interrupted download of the same file
+    with REST if there is one
+    """
+    mkdir_if_doesnt_exist(os.path.dirname(local_path))
+    part_path = local_path + PARTIAL_DOWNLOAD_SUFFIX
+    remote_version = None
+    if ftp_file_size is not None and ftp_last_modified is not None:
+        remote_version = '%s:%s' % (ftp_file_size, ftp_last_modified.isoformat())
+
+    resume_from = 0
+    if remote_version is not None and os.path.exists(part_path):
+        part_metadata = _read_download_metadata(part_path)
+        if part_metadata.get('version') == remote_version:
+            resume_from = os.path.getsize(part_path)
+
+    if remote_version is not None:
+        _write_partial_metadata(part_path, ftp_path, version=remote_version)
+
+    with timed('fetch', url=ftp_path) as timing:
+        try:
+            with open(part_path, 'ab' if resume_from else 'wb') as f:
+                ftp.retrbinary("RETR " + ftp_path, f.write, rest=resume_from or None)
+        except (ftplib.error_perm, ftplib.error_reply):
+            if not resume_from:
+                raise
+            # server doesn't support REST, so start over
+            resume_from = 0
+            with open(part_path, 'wb') as f:
+                ftp.retrbinary("RETR " + ftp_path, f.write)
+        timing.bytes = os.path.getsize(part_path) - resume_from
+
+    if ftp_file_size is not None and os.path.getsize(part_path) != ftp_file_size:
+        raise IOError("incomplete download of %s: got %s of %s bytes" % (
+            ftp_path, os.path.getsize(part_path), ftp_file_size))
+    _complete_partial_download(part_path, local_path)
+
+
+def _ftp_file_facts(ftp, file_path):
+    """returns the size and last modified datetime of a file on an ftp server;
+    uses a single MLST command where the server supports it and falls back to
+    separate SIZE and MDTM commands otherwise
+    """
+    try:
+        response = ftp.sendcmd("MLST " + file_path)
+    except ftplib.error_perm:
+        return _ftp_file_size(ftp, file_path), _ftp_last_modified(ftp, file_path)
+
+    # the facts are on the second line of the response, e.g.
+    #   size=1830;type=file;modify=20130301051034; /path/to/file
+    facts_line = response.splitlines()[1].strip()
+    facts = _ftp_parse_facts(facts_line.split(' ', 1)[0])
+    if 'size' not in facts or 'modify' not in facts:
+        return _ftp_file_size(ftp, file_path), _ftp_last_modified(ftp, file_path)
+    return int(facts['size']), _ftp_parse_timestamp(facts['modify'])
+
+
+def _ftp_file_is_current(path, ftp_file_size, ftp_last_modified,
+        check_modified=True):
+    """returns True if the local file at path matches the size of the file on
+    the ftp server and, if check_modified is True, is not older than it
+    """
+    if not os.path.exists(path) or os.path.getsize(path) != ftp_file_size:
+        return False
+    return not (check_modified and _path_last_modified(path) < ftp_last_modified)
 
 
 def _ftp_file_size(ftp, file_path):
@@ -247,26 +694,270 @@ def _ftp_file_size(ftp, file_path):
     return ftp.size(file_path)
 
 
+def _ftp_forget_listing(host, dir_path):
+    with _ftp_lock:
+        for key in list(_ftp_listings.keys()):
+            if key[:2] == (host, dir_path):
+                del _ftp_listings[key]
+
+
+def _ftp_fresh_listing(host, dir_path, command, ttl=None, now=None):
+    """returns the cached (time listed, listing) of a directory listed with
+    `command` if it is less than `ttl` seconds old, or None otherwise
+    """
+    if ttl is None:
+        ttl = FTP_LISTING_TTL
+    if now is None:
+        now = time.time()
+    with _ftp_lock:
+        cached = _ftp_listings.get((host, dir_path, command))
+    if cached is not None and now - cached[0] < ttl:
+        return cached
+    return None
+
+
 def _ftp_last_modified(ftp, file_path):
     timestamp = ftp.sendcmd("MDTM " + file_path).split()[-1]
-    return datetime.datetime.strptime(timestamp, '%Y%m%d%H%M%S')
+    return _ftp_parse_timestamp(timestamp)
 
 
-def _http_download_file(url, path):
-    request = requests.get(url)
+def _ftp_parse_facts(facts_string):
+    """parses MLST/MLSD facts such as 'Size=1830;Type=file;' into a dict with
+    lowercased keys and a lowercased type
+    """
+    facts = dict([
+        fact.split('=', 1)
+        for fact in facts_string.split(';')
+        if '=' in fact
+    ])
+    facts = dict([(k.lower(), v) for k, v in facts.items()])
+    if 'type' in facts:
+        facts['type'] = facts['type'].lower()
+    return facts
+
+
+def _ftp_parse_timestamp(timestamp):
+    # timestamps may have fractional seconds, e.g. 20130301051034.123
+    return datetime.datetime.strptime(timestamp[:14], '%Y%m%d%H%M%S')
+
+
+def _fwf_column(block, converter, na_strings, na_floats):
+    """converts a 2-d uint8 array holding one fixed width field per row"""
+    stripped = _fwf_strip(block)
+    is_na = np.zeros(len(stripped), dtype=bool)
+    for na_string in na_strings:
+        if len(na_string) <= block.shape[1]:
+            is_na |= stripped == na_string
+
+    converted = None
+    if converter is None or converter is int or converter is float:
+        converted = _fwf_numbers(stripped, is_na, integers=converter is not float)
+        if converted is None and converter is not None:
+            raise ValueError("could not convert fixed width values with %s" % (
+                converter.__name__))
+    if converted is None and (converter is None or converter is str):
+        # decode each distinct value once; columns such as flags only have a
+        # handful of them
+        uniques, inverse = np.unique(stripped, return_inverse=True)
+        converted = np.array(
+            [value.decode('ascii') for value in uniques], dtype=object)[inverse]
+    elif converted is None:
+        converted = np.array([
+            None if missing else converter(value.decode('ascii'))
+            for value, missing in zip(stripped, is_na)
+        ], dtype=object)
+
+    if na_floats and converted.dtype != object:
+        is_na = is_na | np.isin(converted, na_floats)
+    if not is_na.any():
+        return converted
+    if converted.dtype != object:
+        converted = converted.astype(np.float64)
+    converted[is_na] = np.nan
+    return converted
+
+
+def _fwf_lines(data):
+    """returns a 2-d uint8 array of the non-blank lines in a buffer, padded
+    with spaces to the same length; files with lines of equal length are
+    viewed without copying
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if len(buf) and buf[-1] != ord('\n'):
+        buf = np.append(buf, np.uint8(ord('\n')))
+    newlines = np.flatnonzero(buf == ord('\n'))
+    if not len(newlines):
+        return np.empty((0, 0), dtype=np.uint8)
+
+    starts = np.concatenate(([0], newlines[:-1] + 1))
+    lengths = newlines - starts
+    width = lengths.max()
+    if (lengths == width).all():
+        lines = buf[:len(lengths) * (width + 1)].reshape(
+            len(lengths), width + 1)[:, :width]
+    else:
+        lines = np.full((len(lengths), width), ord(' '), dtype=np.uint8)
+        is_newline = buf == ord('\n')
+        line_numbers = np.cumsum(is_newline) - is_newline
+        positions = np.arange(len(buf)) - starts[line_numbers]
+        lines[line_numbers[~is_newline], positions[~is_newline]] = buf[~is_newline]
+
+    is_blank = _FWF_WHITESPACE[lines].all(axis=1)
+    if is_blank.any():
+        lines = lines[~is_blank]
+    return lines
+
+
+def _fwf_numbers(values, is_na, integers=True):
+    """returns values converted to integers (or floats if integers is False or
+    they have fractions), or None if they aren't all numeric; missing values
+    are converted to NaN
+    """
+    if integers and not is_na.any():
+        try:
+            return values.astype(np.int64)
+        except (ValueError, OverflowError):
+            pass
+    try:
+        return np.where(is_na, b'nan', values).astype(np.float64)
+    except ValueError:
+        return None
+
+
+def _fwf_strip(block):
+    """returns the rows of a 2-d uint8 array as a bytes array with leading and
+    trailing whitespace removed; rows are shifted left past their leading
+    whitespace and the trailing whitespace is zeroed, which numpy drops from
+    the end of fixed length bytes values
+    """
+    rows, width = block.shape
+    if not width:
+        return np.zeros(rows, dtype='S1')
+    is_text = ~_FWF_WHITESPACE[block]
+    leading = np.where(is_text.any(axis=1), is_text.argmax(axis=1), width)
+    end = width - is_text[:, ::-1].argmax(axis=1)
+    positions = np.arange(width) + leading[:, np.newaxis]
+    shifted = np.take_along_axis(block, np.minimum(positions, width - 1), axis=1)
+    shifted[positions >= end[:, np.newaxis]] = 0
+    return np.ascontiguousarray(shifted).view('S%s' % width).ravel()
+
+
+def _http_download_file(url, path, headers=None):
+    """downloads url to path, returning the response; if the server answers a
+    conditional request with 304 Not Modified then path is left untouched.
+
+    The response is written to a partial download file that is only moved to
+    path once it is complete, so an interrupted download never leaves a
+    truncated file at path. If a partial download of the same version of the
+    file exists, it is resumed with a range request.
+    """
     mkdir_if_doesnt_exist(os.path.dirname(path))
+    part_path = path + PARTIAL_DOWNLOAD_SUFFIX
+    request_headers = dict(headers or {})
+
+    resume_from = 0
+    part_metadata = _read_download_metadata(part_path)
+    if os.path.exists(part_path) and part_metadata.get('url') == url \
+            and part_metadata.get('version'):
+        resume_from = os.path.getsize(part_path)
+        request_headers['Range'] = 'bytes=%s-' % resume_from
+        request_headers['If-Range'] = part_metadata['version']
+        request_headers['Accept-Encoding'] = 'identity'
+
     chunk_size = 64 * 1024
-    with open(path, 'wb') as f:
-        for content in request.iter_content(chunk_size):
-            f.write(content)
+    with timed('fetch', url=url) as timing, \
+            get_session().get(url, headers=request_headers, stream=True) as request:
+        timing.bytes = 0
+        if request.status_code == 304:
+            return request
+        if request.status_code == 416 and resume_from:
+            # the partial file is no use, so start over
+            os.remove(part_path)
+            _remove_download_metadata(part_path)
+            return _http_download_file(url, path, headers=headers)
+
+        resuming = resume_from and request.status_code == 206
+        if request.status_code == 200:
+            _write_partial_metadata(part_path, url,
+                    version=_http_resume_version(request))
+        expected_size = _http_expected_size(request, resume_from if resuming else 0)
+
+        with open(part_path, 'ab' if resuming else 'wb') as f:
+            for content in request.iter_content(chunk_size):
+                f.write(content)
+                timing.bytes += len(content)
+
+    if expected_size is not None and os.path.getsize(part_path) != expected_size:
+        raise IOError("incomplete download of %s: got %s of %s bytes" % (
+            url, os.path.getsize(part_path), expected_size))
+    _complete_partial_download(part_path, path)
+    return request
 
 
 def _http_download_if_new(url, path, check_modified):
-    head = requests.head(url)
-    if not os.path.exists(path) or not _request_file_size_matches(head, path):
-        _http_download_file(url, path)
-    elif check_modified and _request_is_newer_than_file(head, path):
-        _http_download_file(url, path)
+    headers = {}
+    if os.path.exists(path) and check_modified:
+        headers = _http_validator_headers(url, path)
+
+    response = _http_download_file(url, path, headers=headers)
+
+    # 206 Partial Content is the rest of a resumed download
+    if response.status_code in (200, 206):
+        _write_download_metadata(path, url,
+                etag=response.headers.get('etag'),
+                last_modified=response.headers.get('last-modified'))
+    elif response.status_code == 304:
+        # a 304 response may leave out validators that haven't changed
+        previous = _read_download_metadata(path)
+        _write_download_metadata(path, url,
+                etag=response.headers.get('etag', previous.get('etag')),
+                last_modified=response.headers.get(
+                    'last-modified', previous.get('last_modified')))
+    else:
+        # error pages are kept as they were (some callers check the content),
+        # but are not marked as valid downloads
+        _remove_download_metadata(path)
+
+
+def _http_expected_size(response, resume_from=0):
+    """returns the size the downloaded file should have once the response body
+    has been written, or None if that can't be known
+    """
+    encoding = response.headers.get('content-encoding', 'identity')
+    content_length = response.headers.get('content-length')
+    if encoding != 'identity' or content_length is None:
+        return None
+    return resume_from + int(content_length)
+
+
+def _http_resume_version(response):
+    """returns the validator to send with If-Range when resuming a download of
+    this response, or None if the download can't safely be resumed
+    """
+    if response.headers.get('accept-ranges', '').lower() != 'bytes':
+        return None
+    if response.headers.get('content-encoding', 'identity') != 'identity':
+        return None
+    etag = response.headers.get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return response.headers.get('last-modified')
+
+
+def _http_validator_headers(url, path):
+    """returns conditional request headers for a previously downloaded file"""
+    metadata = _read_download_metadata(path)
+    headers = {}
+    if metadata.get('url') == url and metadata.get('size') == os.path.getsize(path):
+        if metadata.get('etag'):
+            headers['If-None-Match'] = metadata['etag']
+        if metadata.get('last_modified'):
+            headers['If-Modified-Since'] = metadata['last_modified']
+    elif not metadata:
+        # file was downloaded before validators were recorded
+        headers['If-Modified-Since'] = email.utils.formatdate(
+            os.path.getmtime(path), usegmt=True)
+    return headers
 
 
 def _nans_to_nones(nan_dict):
@@ -278,8 +969,52 @@ def _nans_to_nones(nan_dict):
     ])
 
 
-def _parse_rfc_1123_timestamp(timestamp_str):
-    return datetime.datetime(*email.utils.parsedate(timestamp_str)[:6])
+def _parse_fwf_buffer(data, columns, na_values=None):
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if (buf >= 0x80).any():
+        # column positions of non-ascii text are in characters, not bytes
+        return _parse_fwf_with_pandas(data, columns, na_values)
+
+    lines = _fwf_lines(data)
+    width = max([end for name, start, end, converter in columns] + [0])
+    if lines.shape[1] < width:
+        lines = np.hstack((lines, np.full(
+            (lines.shape[0], width - lines.shape[1]), ord(' '), dtype=np.uint8)))
+
+    na_strings = set(FWF_NA_VALUES)
+    na_floats = set()
+    for value in na_values or []:
+        na_strings.add(str(value))
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            continue
+        na_floats.add(number)
+        na_strings.add(str(number))
+        if number.is_integer():
+            na_strings.add(str(int(number)))
+    na_strings = sorted([na.encode('ascii') for na in na_strings])
+    na_floats = sorted(na_floats)
+
+    return pandas.DataFrame(dict([
+        (name, _fwf_column(lines[:, start:end], converter, na_strings, na_floats))
+        for name, start, end, converter in columns
+    ]), columns=[name for name, start, end, converter in columns])
+
+
+def _parse_fwf_with_pandas(data, columns, na_values=None):
+    names, colspecs = list(zip(*[(name, (start, end))
+        for name, start, end, converter in columns]))
+
+    converters = dict([
+        (name, converter)
+        for name, start, end, converter in columns
+        if not converter is None
+    ])
+
+    return pandas.io.parsers.read_fwf(io.BytesIO(bytes(data)),
+        colspecs=colspecs, header=None, na_values=na_values, names=names,
+        converters=converters)
 
 
 def _path_last_modified(path):
@@ -292,30 +1027,67 @@ def _path_last_modified(path):
     return datetime.datetime.utcfromtimestamp(os.path.getmtime(path))
 
 
-def _request_file_size_matches(request, path):
-    """returns True if request content-length header matches file size"""
-    content_length = request.headers.get('content-length')
-    if content_length and int(content_length) == os.path.getsize(path):
-        return True
-    else:
-        return False
-
-
-def _request_is_newer_than_file(request, path):
-    """returns true if a request's last-modified header is more recent than a
-    file's last modified timestamp
+@contextmanager
+def _path_lock(path):
+    """serializes threads writing to path"""
+    path = os.path.abspath(path)
+    with _path_locks_lock:
+        lock, users = _path_locks.get(path, (None, 0))
+        if lock is None:
+            lock = threading.Lock()
+        _path_locks[path] = (lock, users + 1)
+    try:
+        with lock:
+            yield
+    finally:
+        with _path_locks_lock:
+            lock, users = _path_locks[path]
+            if users > 1:
+                _path_locks[path] = (lock, users - 1)
+            else:
+                del _path_locks[path]
+
+
+def _read_download_metadata(path):
+    """returns the metadata recorded for a downloaded file, or an empty dict if
+    there isn't any
     """
-    path_last_modified = _path_last_modified(path)
+    try:
+        with open(_download_metadata_path(path)) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
 
-    if path_last_modified is None:
-        return True
 
-    if not request.headers.get('last-modified'):
-        warnings.warn('no last-modified date for request: %s, downloading file again' % request.url)
-        return True
+def _remove_download_metadata(path):
+    metadata_path = _download_metadata_path(path)
+    if os.path.exists(metadata_path):
+        os.remove(metadata_path)
 
-    request_last_modified = _parse_rfc_1123_timestamp(request.headers.get('last-modified'))
-    if request_last_modified > path_last_modified:
-        return True
-    else:
-        return False
+
+def _write_download_metadata(path, url, etag=None, last_modified=None):
+    """records where a file was downloaded from, its size, when it was last
+    checked against the server and any http validators for the next check
+    """
+    metadata = {
+        'url': url,
+        'size': os.path.getsize(path),
+        'checked': time.time(),
+    }
+    if etag:
+        metadata['etag'] = etag
+    if last_modified:
+        metadata['last_modified'] = last_modified
+    with open(_download_metadata_path(path), 'w') as f:
+        json.dump(metadata, f)
+
+
+def _write_partial_metadata(part_path, url, version=None):
+    """records which version of a file a partial download holds, so that it
+    is only ever resumed against the same version
+    """
+    if version is None:
+        _remove_download_metadata(part_path)
+        return
+    with open(_download_metadata_path(part_path), 'w') as f:
+        json.dump({'url': url, 'version': version}, f)
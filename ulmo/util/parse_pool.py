@@ -0,0 +1,93 @@
+"""
+   ulmo.util.parse_pool
+   ~~~~~~~~~~~~~~~~~~~~
+
+   An optional pool of worker processes for the CPU bound parsing done by
+   calls that parse many files at once (e.g. many GSOD stations or many days
+   of KBDI summaries), so that these can use more than one core. Workers are
+   sent raw payloads or file paths and send back numpy based results (record
+   arrays or dataframes) rather than nested dicts, which are much cheaper to
+   pickle.
+
+   The pool is disabled by default; enable it with configure_parse_pool or by
+   setting the ULMO_PARSE_PROCESSES environment variable to the number of
+   processes to use. Timings recorded inside the workers are not passed on to
+   the timing sinks of the calling process. Workers are started with the
+   'spawn' method, so scripts that enable the pool need the usual
+   ``if __name__ == '__main__':`` guard.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import collections
+import multiprocessing
+import os
+import threading
+
+
+# number of items queued per worker process, which bounds how many payloads
+# are held in memory at once
+PARSE_QUEUE_DEPTH = 4
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+_processes = None
+
+
+def configure_parse_pool(processes=None):
+    """Sets the number of worker processes used to parse multi-item calls. If
+    processes is 0 or None, parsing is done in the calling thread (the
+    default); if it is -1 then one process per cpu is used.
+    """
+    global _parse_pool, _processes
+    with _parse_pool_lock:
+        parse_pool, _parse_pool = _parse_pool, None
+        _processes = _process_count(processes)
+    if parse_pool is not None:
+        parse_pool.shutdown(wait=True)
+
+
+def parse_many(function, items):
+    """Yields function(*item) for each tuple of arguments in items, in order.
+    If the parse pool is enabled, the calls are made in the worker processes,
+    in which case function must be a module-level function and both items and
+    results must be picklable; otherwise they are made one at a time in the
+    calling thread. items may be a generator; it is only consumed as fast as
+    the workers can keep up.
+    """
+    parse_pool = _get_parse_pool()
+    if parse_pool is None:
+        for item in items:
+            yield function(*item)
+        return
+
+    pending = collections.deque()
+    for item in items:
+        pending.append(parse_pool.submit(function, *item))
+        if len(pending) >= _processes * PARSE_QUEUE_DEPTH:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _get_parse_pool():
+    global _parse_pool, _processes
+    with _parse_pool_lock:
+        if _processes is None:
+            _processes = _process_count(
+                int(os.environ.get('ULMO_PARSE_PROCESSES') or 0))
+        if not _processes:
+            return None
+        if _parse_pool is None:
+            # forking a process that has other threads running (e.g. a
+            # download pool) can deadlock the child, so workers are spawned
+            _parse_pool = ProcessPoolExecutor(max_workers=_processes,
+                mp_context=multiprocessing.get_context('spawn'))
+        return _parse_pool
+
+
+def _process_count(processes):
+    """returns the number of worker processes to use for a configured number
+    of processes, where -1 (or any negative number) means one per cpu
+    """
+    if processes is not None and processes < 0:
+        return os.cpu_count() or 1
+    return processes or 0
@@ -11,6 +11,7 @@ import warnings
 import tables
 
 from . import misc as util_misc
+from .instrumentation import timed
 
 
 def get_default_h5file_path(dataset):
@@ -51,6 +52,12 @@ def update_or_append_sortable(table, update_values, sortby):
     """updates table with dict representations of rows, appending new rows if
     need be; sortby should be a completly sortable column (with a CSIndex)
     """
+    with timed('write', path=table._v_pathname) as timing:
+        _update_or_append_sortable(table, update_values, sortby)
+        timing.records = len(update_values)
+
+
+def _update_or_append_sortable(table, update_values, sortby):
     value_row = table.row
     update_values.sort(key=lambda v: v[sortby])
     table_iterator = table.itersorted(sortby)
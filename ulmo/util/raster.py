@@ -9,7 +9,8 @@ from past.builtins import basestring
 
 import contextlib
 import hashlib
-from .misc import download_if_new, mkdir_if_doesnt_exist
+from .instrumentation import timed
+from .misc import download_many, mkdir_if_doesnt_exist
 import os
 import zipfile
 
@@ -30,29 +31,41 @@ def mosaic_and_clip(raster_tiles, xmin, ymin, xmax, ymax, output_path):
     if not p.is_latlong():
         [xmax, xmin],[ymax, ymin] = p([xmax, xmin],[ymax,ymin])
 
-    print(subprocess.check_output(['gdalwarp', '-overwrite', '-te', repr(xmin), repr(ymin), repr(xmax), repr(ymax), output_vrt, output_path]))
+    with timed('write', path=output_path):
+        print(subprocess.check_output(['gdalwarp', '-overwrite', '-te', repr(xmin), repr(ymin), repr(xmax), repr(ymax), output_vrt, output_path]))
     print('Output raster saved at %s', output_path)
 
 
-def download_tiles(path, tile_urls, tile_fmt, check_modified=False):
+def download_tiles(path, tile_urls, tile_fmt, check_modified=False,
+        max_workers=4):
     raster_tiles = []
 
     if isinstance(tile_urls, basestring):
         tile_urls = [tile_urls]
 
-    for i, url in enumerate(tile_urls):
+    mkdir_if_doesnt_exist(path)
+    mkdir_if_doesnt_exist(os.path.join(path,'zip'))
+
+    download_paths = []
+    for url in tile_urls:
         filename = os.path.split(url)[-1]
-        print('... downloading tile %s of %s from %s' % (i+1, len(tile_urls), url))
-        mkdir_if_doesnt_exist(path)
-        mkdir_if_doesnt_exist(os.path.join(path,'zip'))
-        tile_path = os.path.join(path, filename)
         if tile_fmt=='':
-            download_if_new(url, tile_path, check_modified=check_modified)
+            download_paths.append(os.path.join(path, filename))
         else:
-            zip_path = os.path.join(path, 'zip', filename)
-            download_if_new(url, zip_path, check_modified=check_modified)
-            print('... ... zipfile saved at %s' % zip_path)
-            tile_path = extract_from_zip(zip_path, tile_path, tile_fmt)
+            download_paths.append(os.path.join(path, 'zip', filename))
+
+    def progress(completed, total, url, error):
+        if error is None:
+            print('... downloaded tile %s of %s from %s' % (completed, total, url))
+
+    download_many(list(zip(tile_urls, download_paths)), max_workers=max_workers,
+            check_modified=check_modified, progress=progress)
+
+    for url, download_path in zip(tile_urls, download_paths):
+        tile_path = os.path.join(path, os.path.split(url)[-1])
+        if tile_fmt!='':
+            print('... ... zipfile saved at %s' % download_path)
+            tile_path = extract_from_zip(download_path, tile_path, tile_fmt)
 
         raster_tiles.append(tile_path)
     return raster_tiles
@@ -60,10 +73,13 @@ def download_tiles(path, tile_urls, tile_fmt, check_modified=False):
 
 def extract_from_zip(zip_path, tile_path, tile_fmt):
     tile_path = os.path.splitext(tile_path)[0] + tile_fmt
-    with zipfile.ZipFile(zip_path) as z:
+    with timed('decompress', path=zip_path) as timing, \
+            zipfile.ZipFile(zip_path) as z:
         fname = [x for x in z.namelist() if tile_fmt in x[-4:]][0]
         with open(tile_path, 'wb') as f:
-            f.write(z.read(fname))
+            content = z.read(fname)
+            f.write(content)
+            timing.bytes = len(content)
             print('... ... %s format raster saved at %s' % (tile_fmt, tile_path))
 
     return tile_path
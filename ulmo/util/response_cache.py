@@ -0,0 +1,281 @@
+"""
+   ulmo.util.response_cache
+   ~~~~~~~~~~~~~~~~~~~~~~~~
+
+   Opt-in persistent cache of HTTP responses. When enabled, requests made
+   through the shared sessions in ulmo.util.sessions are looked up in an
+   sqlite database (under the ulmo data directory by default) keyed on the
+   request method, url, query parameters and body, so repeated metadata
+   lookups are served from disk instead of the network.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import requests
+import requests.structures
+import requests.utils
+
+
+# number of seconds a cached response is used before it is fetched again
+DEFAULT_CACHE_TTL = 24 * 60 * 60
+
+# maximum total size in bytes of the compressed bodies kept in the cache
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+
+# methods whose responses are cached; POST is included so that SOAP calls,
+# which send the whole request in the body, can be cached too
+CACHED_METHODS = ('GET', 'POST')
+
+# url prefixes of real-time data, which are not cached unless endpoint_ttls
+# gives them a ttl: usgs.nwis instantaneous values, noaa.goes messages and
+# lcra.hydromet current data
+REAL_TIME_ENDPOINTS = (
+    'http://waterservices.usgs.gov/nwis/iv/',
+    'https://waterservices.usgs.gov/nwis/iv/',
+    'https://dcs1.noaa.gov/Account/FieldTestData',
+    'http://hydrometdata.lcra.org',
+)
+
+# response headers that no longer apply once the body has been decoded
+_DROPPED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+class ResponseCache(object):
+    """An sqlite-backed cache of successful HTTP responses.
+
+    Bodies are stored zlib-compressed. Entries expire after `ttl` seconds, or
+    after the ttl of the longest matching url prefix in `endpoint_ttls`; a ttl
+    of 0 disables caching for matching urls, which is the default for
+    REAL_TIME_ENDPOINTS. Responses that set cookies are not cached, since the
+    cookies would be stale (or missing) when the response is served again.
+    When the compressed bodies exceed `max_size` bytes the least recently used
+    entries are evicted.
+    """
+    def __init__(self, path, ttl=DEFAULT_CACHE_TTL, max_size=DEFAULT_CACHE_SIZE,
+            endpoint_ttls=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.endpoint_ttls = dict([
+            (prefix, 0) for prefix in REAL_TIME_ENDPOINTS])
+        self.endpoint_ttls.update(endpoint_ttls or {})
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            path, timeout=30, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, url TEXT, status_code INTEGER, '
+                'reason TEXT, headers TEXT, body BLOB, size INTEGER, '
+                'created REAL, accessed REAL)')
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS responses_accessed '
+                'ON responses (accessed)')
+
+    def clear(self):
+        """removes all cached responses and resets the statistics"""
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM responses')
+            self.hits = self.misses = self.stores = self.evictions = 0
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def get(self, method, url, body=None):
+        """returns the cached response for a request, or None if there is no
+        fresh cached response
+        """
+        key = self.key(method, url, body)
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                'SELECT url, status_code, reason, headers, body, created '
+                'FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None or now - row[5] >= self.ttl_for(url):
+                if row is not None:
+                    self._connection.execute(
+                        'DELETE FROM responses WHERE key = ?', (key,))
+                self.misses += 1
+                return None
+            self._connection.execute(
+                'UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+            self.hits += 1
+        return _build_response(row[0], row[1], row[2], json.loads(row[3]),
+                zlib.decompress(row[4]))
+
+    def key(self, method, url, body=None):
+        if body is None:
+            body = b''
+        elif not isinstance(body, bytes):
+            body = body.encode('utf-8')
+        digest = hashlib.sha256()
+        digest.update(method.upper().encode('utf-8') + b'\n')
+        digest.update(url.encode('utf-8') + b'\n')
+        digest.update(body)
+        return digest.hexdigest()
+
+    def set(self, method, url, body, response):
+        """stores a response if it was successful, did not set cookies and its
+        url is cached
+        """
+        if response.status_code != 200 or 'set-cookie' in response.headers \
+                or self.ttl_for(url) <= 0:
+            return
+        headers = dict([
+            (name, value) for name, value in response.headers.items()
+            if name.lower() not in _DROPPED_HEADERS
+        ])
+        compressed = zlib.compress(response.content)
+        key = self.key(method, url, body)
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, url, response.status_code, response.reason,
+                 json.dumps(headers), sqlite3.Binary(compressed),
+                 len(compressed), now, now))
+            self.stores += 1
+            self._evict()
+
+    def stats(self):
+        """returns a dict of hit, miss, store and eviction counts for this
+        process along with the number of entries and total compressed size of
+        the cache
+        """
+        with self._lock:
+            entries, size = self._connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses'
+            ).fetchone()
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'entries': entries,
+                'size': size,
+            }
+
+    def ttl_for(self, url):
+        """returns the ttl of the longest endpoint prefix matching url"""
+        prefixes = [
+            prefix for prefix in self.endpoint_ttls if url.startswith(prefix)]
+        if not prefixes:
+            return self.ttl
+        return self.endpoint_ttls[max(prefixes, key=len)]
+
+    def _evict(self):
+        total_size = self._connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total_size <= self.max_size:
+            return
+        rows = self._connection.execute(
+            'SELECT key, size FROM responses ORDER BY accessed').fetchall()
+        for key, size in rows:
+            if total_size <= self.max_size:
+                break
+            self._connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+            total_size -= size
+            self.evictions += 1
+
+
+def clear_response_cache():
+    """removes all responses from the response cache, if it is enabled"""
+    cache = get_response_cache()
+    if cache is not None:
+        cache.clear()
+
+
+def disable_response_cache():
+    """stops caching responses; responses already cached are kept on disk"""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is not None:
+            _response_cache.close()
+        _response_cache = None
+
+
+def enable_response_cache(path=None, ttl=DEFAULT_CACHE_TTL,
+        max_size=DEFAULT_CACHE_SIZE, endpoint_ttls=None):
+    """Caches successful responses to requests made through ulmo's shared
+    sessions on disk, so that repeated requests are served locally.
+
+    Streamed requests (used for file downloads, which have their own
+    freshness checks), requests that send cookies and responses that set them
+    are never cached, nor by default are real-time data such as usgs.nwis
+    instantaneous values (see ``endpoint_ttls``).
+
+    Parameters
+    ----------
+    path : ``None`` or str
+        Path of the sqlite database to store responses in. If ``None``
+        (default), ``responses.sqlite`` in the ``cache`` directory of the ulmo
+        data directory is used.
+    ttl : int
+        Number of seconds a cached response is used before it is fetched
+        again.
+    max_size : int
+        Maximum total size in bytes of the compressed responses; least
+        recently used responses are evicted beyond this.
+    endpoint_ttls : ``None`` or dict
+        Maps url prefixes to ttls that override the default for matching
+        urls, e.g. ``{'http://cdec.water.ca.gov/misc/': 7 * 24 * 60 * 60}``.
+        A ttl of 0 disables caching for the matching urls; the real-time
+        endpoints in ``ulmo.util.response_cache.REAL_TIME_ENDPOINTS`` have a
+        ttl of 0 unless they are given one here.
+
+    Returns
+    -------
+    cache : ResponseCache
+    """
+    global _response_cache
+    if path is None:
+        from .misc import get_ulmo_dir
+        path = os.path.join(get_ulmo_dir('cache'), 'responses.sqlite')
+
+    cache = ResponseCache(path, ttl=ttl, max_size=max_size,
+            endpoint_ttls=endpoint_ttls)
+    with _response_cache_lock:
+        previous, _response_cache = _response_cache, cache
+    if previous is not None:
+        previous.close()
+    return cache
+
+
+def get_response_cache():
+    """returns the enabled ResponseCache, or None if caching is disabled"""
+    return _response_cache
+
+
+def response_cache_stats():
+    """returns statistics of the response cache (see ResponseCache.stats), or
+    None if it is not enabled
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return None
+    return cache.stats()
+
+
+def _build_response(url, status_code, reason, headers, content):
+    response = requests.Response()
+    response.url = url
+    response.status_code = status_code
+    response.reason = reason
+    response.headers = requests.structures.CaseInsensitiveDict(headers)
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response._content = content
+    response.from_cache = True
+    return response
@@ -0,0 +1,269 @@
+"""
+   ulmo.util.sessions
+   ~~~~~~~~~~~~~~~~~~
+
+   Shared HTTP sessions with pooled keep-alive connections. Every ulmo module
+   makes its requests through a session from this registry so that
+   connections (and TLS handshakes) are reused across calls to the same host.
+"""
+from future import standard_library
+standard_library.install_aliases()
+import http.cookiejar
+import io
+import threading
+import urllib.parse
+
+import requests
+import requests.adapters
+
+from .cassettes import get_cassette
+from .instrumentation import timed
+from .response_cache import CACHED_METHODS, get_response_cache
+from .throttling import RequestPolicy
+
+
+# (connect, read) timeouts in seconds; the read timeout applies to each read
+# from the socket, not to the whole response
+DEFAULT_TIMEOUT = (30, 300)
+
+DEFAULT_SESSION_OPTIONS = {
+    'pool_connections': 10,
+    'pool_maxsize': 10,
+    'timeout': DEFAULT_TIMEOUT,
+    'headers': None,
+    'rate_limit': None,
+    'rate_burst': None,
+    'max_retries': 2,
+    'backoff_factor': 0.5,
+    'failure_threshold': 5,
+    'recovery_timeout': 30,
+}
+
+_session_options = {}
+_sessions = {}
+_sessions_lock = threading.RLock()
+
+
+class PooledSession(requests.Session):
+    """requests.Session with sized connection pools and a default timeout.
+
+    Cookies set by responses are not kept on the session, so a shared session
+    behaves like a series of independent requests; cookies that need to be
+    passed along can still be given explicitly with the ``cookies`` argument.
+
+    If the response cache is enabled (see ``enable_response_cache``),
+    non-streamed GET and POST requests without cookies are served from it
+    when possible. Other requests are made subject to the session's
+    RequestPolicy (rate limiting, retries and circuit breaking per host).
+    """
+    def __init__(self, pool_connections, pool_maxsize, timeout, headers=None,
+            rate_limit=None, rate_burst=None, max_retries=0, backoff_factor=0,
+            failure_threshold=None, recovery_timeout=30, provider=None):
+        super(PooledSession, self).__init__()
+        self.provider = provider
+        self.timeout = timeout
+        self.policy = RequestPolicy(rate_limit=rate_limit, rate_burst=rate_burst,
+                max_retries=max_retries, backoff_factor=backoff_factor,
+                failure_threshold=failure_threshold,
+                recovery_timeout=recovery_timeout)
+        self.cookies.set_policy(
+            http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        if headers:
+            self.headers.update(headers)
+        for prefix in ('http://', 'https://'):
+            self.mount(prefix, self.build_adapter(pool_connections, pool_maxsize))
+
+    def build_adapter(self, pool_connections, pool_maxsize):
+        return requests.adapters.HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        cache = get_response_cache()
+        # cookies are session state (e.g. the LCRA forms' sessions) that a
+        # cached response would not match
+        if cache is None or kwargs.get('stream') or kwargs.get('files') \
+                or kwargs.get('cookies') \
+                or method.upper() not in CACHED_METHODS:
+            return self._send(method, url, **kwargs)
+
+        prepared = requests.Request(method, url, params=kwargs.get('params'),
+                data=kwargs.get('data'), json=kwargs.get('json')).prepare()
+        response = cache.get(method, prepared.url, prepared.body)
+        if response is None:
+            response = self._send(method, url, **kwargs)
+            cache.set(method, prepared.url, prepared.body, response)
+        return response
+
+    def _send(self, method, url, **kwargs):
+        cassette = get_cassette()
+        if cassette is not None and cassette.replaying:
+            # replayed requests skip the rate limits and retries
+            call = lambda: cassette.replay_http(method, url, kwargs)
+        else:
+            host = urllib.parse.urlparse(url).netloc
+            send = lambda: super(PooledSession, self).request(
+                method, url, **kwargs)
+            call = lambda: self.policy.call(host, send)
+            if cassette is not None:
+                # only the response that the policy returns is recorded, not
+                # the attempts it retried, since replays skip the policy
+                send_with_policy = call
+                call = lambda: cassette.record_http(
+                    method, url, kwargs, send_with_policy)
+        if kwargs.get('stream'):
+            # the body is read (and timed) by whoever consumes the stream
+            return call()
+
+        with timed('fetch', provider=self.provider, url=url) as timing:
+            response = call()
+            timing.bytes = len(response.content)
+            timing.fields['status_code'] = response.status_code
+        return response
+
+
+def close_sessions():
+    """closes all open sessions and their pooled connections; sessions will be
+    re-created as needed
+    """
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def configure_session(provider=None, pool_connections=None, pool_maxsize=None,
+        timeout=None, headers=None, rate_limit=None, rate_burst=None,
+        max_retries=None, backoff_factor=None, failure_threshold=None,
+        recovery_timeout=None):
+    """Sets connection pool, timeout and request policy options for a
+    provider's session. Options that are ``None`` are left unchanged.
+
+    Parameters
+    ----------
+    provider : ``None`` or str
+        Name of the provider whose session should be configured, e.g.
+        ``'usgs.nwis'``. If ``None`` (default), the defaults shared by all
+        providers are changed.
+    pool_connections : ``None`` or int
+        Number of per-host connection pools to keep.
+    pool_maxsize : ``None`` or int
+        Maximum number of connections kept open in each per-host pool; this
+        should be at least the number of threads making concurrent requests to
+        the same host.
+    timeout : ``None``, float or (float, float) tuple
+        Default timeout in seconds used for requests that do not specify one;
+        a tuple sets separate connect and read timeouts.
+    headers : ``None`` or dict
+        Headers sent with every request made through the session.
+    rate_limit : ``None`` or float
+        Maximum number of requests per second made to each host. Unlimited
+        by default; set it to 0 to remove a limit.
+    rate_burst : ``None`` or int
+        Number of requests that can be made to a host at once before the
+        rate limit applies; defaults to one second's worth of requests.
+    max_retries : ``None`` or int
+        Number of times a request is retried after a connection error, a
+        timeout, or a 429 or 5xx response (default 2).
+    backoff_factor : ``None`` or float
+        Retry n waits a random time of up to ``backoff_factor * 2 ** n``
+        seconds, unless the server sends a Retry-After header (default 0.5).
+    failure_threshold : ``None`` or int
+        Number of consecutive failed requests to a host after which requests
+        to it fail immediately with util.CircuitOpenError (default 5); set it
+        to 0 to disable the circuit breaker.
+    recovery_timeout : ``None`` or float
+        Number of seconds before a trial request is let through to a host
+        whose requests have been failing (default 30).
+    """
+    options = dict([
+        (key, value) for key, value in (
+            ('pool_connections', pool_connections),
+            ('pool_maxsize', pool_maxsize),
+            ('timeout', timeout),
+            ('headers', headers),
+            ('rate_limit', rate_limit),
+            ('rate_burst', rate_burst),
+            ('max_retries', max_retries),
+            ('backoff_factor', backoff_factor),
+            ('failure_threshold', failure_threshold),
+            ('recovery_timeout', recovery_timeout),
+        )
+        if value is not None
+    ])
+    with _sessions_lock:
+        if provider is None:
+            DEFAULT_SESSION_OPTIONS.update(options)
+            stale = list(_sessions.keys())
+        else:
+            _session_options.setdefault(provider, {}).update(options)
+            stale = [provider]
+        for name in stale:
+            session = _sessions.pop(name, None)
+            if session is not None:
+                session.close()
+
+
+def get_session(provider=None):
+    """Returns the shared session for a provider, creating it if needed.
+
+    Parameters
+    ----------
+    provider : ``None`` or str
+        Name of the provider the session is used for, e.g. ``'usgs.nwis'``.
+        Providers that have not been configured with ``configure_session`` use
+        the default options.
+
+    Returns
+    -------
+    session : requests.Session
+    """
+    with _sessions_lock:
+        session = _sessions.get(provider)
+        if session is None:
+            session = PooledSession(provider=provider, **session_options(provider))
+            _sessions[provider] = session
+        return session
+
+
+def session_options(provider=None):
+    """returns the options that a provider's session is created with"""
+    options = DEFAULT_SESSION_OPTIONS.copy()
+    options.update(_session_options.get(provider, {}))
+    return options
+
+
+def suds_transport(provider=None):
+    """returns a suds transport that makes SOAP requests through the provider's
+    shared session
+    """
+    from suds.transport import Reply, Transport, TransportError
+
+    class SessionTransport(Transport):
+        def open(self, request):
+            response = get_session(provider).get(
+                request.url, headers=request.headers,
+                timeout=self._timeout(request))
+            if response.status_code >= 400:
+                raise TransportError(response.reason, response.status_code,
+                        io.BytesIO(response.content))
+            return io.BytesIO(response.content)
+
+        def send(self, request):
+            response = get_session(provider).post(
+                request.url, data=request.message, headers=request.headers,
+                timeout=self._timeout(request))
+            if response.status_code in (202, 204):
+                return None
+            if response.status_code >= 400:
+                raise TransportError(response.reason, response.status_code,
+                        io.BytesIO(response.content))
+            return Reply(response.status_code, response.headers, response.content)
+
+        def _timeout(self, request):
+            # like suds' HttpTransport, fall back to the client's timeout
+            # option; older suds-jurko requests don't have a timeout at all
+            return getattr(request, 'timeout', None) or self.options.timeout
+
+    return SessionTransport()
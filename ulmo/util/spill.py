@@ -0,0 +1,169 @@
+"""
+   ulmo.util.spill
+   ~~~~~~~~~~~~~~~
+
+   A dict-like store for the results of bulk queries over many stations,
+   which keeps at most a given number of bytes of results in memory and
+   spills the rest to files in a temporary directory. Results are only read
+   back (and converted) when a station is looked up or iterated over, so
+   whole-network requests can be made with a modest amount of memory.
+"""
+import collections
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+import weakref
+
+import numpy as np
+import pandas
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
+class SpillDict(Mapping):
+    """Maps keys (e.g. station codes) to results that are added in one or more
+    chunks, e.g. one per year of data. Chunks are kept in memory until they
+    take more than memory_limit bytes, at which point all of them are
+    written to disk. Looking up a key loads its chunks, joins them with
+    combine and returns convert(key, combined) - so values are built one key
+    at a time, and a new value is built on each lookup.
+
+    Parameters
+    ----------
+    memory_limit : int
+        Number of bytes of chunks to hold in memory before spilling to disk;
+        must be positive.
+    combine : ``None`` or function
+        Function that joins a list of chunks into one value; if ``None``, the
+        last chunk is used. Keys without any chunks are mapped to ``None``.
+    convert : ``None`` or function
+        Function of (key, combined chunks) that returns the value for a key.
+    directory : ``None`` or str
+        Directory to make the spill directory in; by default the system's
+        temporary directory is used. The spill directory is removed when the
+        SpillDict is closed or garbage collected.
+    """
+
+    def __init__(self, memory_limit, combine=None, convert=None,
+            directory=None):
+        if memory_limit <= 0:
+            raise ValueError(
+                "memory_limit must be a positive number of bytes, not %r" %
+                memory_limit)
+        self.memory_limit = memory_limit
+        self.memory_bytes = 0
+        self._combine = combine
+        self._convert = convert
+        self._directory = directory
+        self._chunks = collections.OrderedDict()
+        self._spilled = {}
+        self._spill_dir = None
+        self._spill_count = 0
+        self._finalizer = None
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getitem__(self, key):
+        with self._lock:
+            chunks = list(self._chunks[key])
+            paths = list(self._spilled.get(key, []))
+        chunks = [_load_chunk(path) for path in paths] + chunks
+        if not len(chunks):
+            return None
+        if self._combine is not None:
+            value = self._combine(chunks)
+        else:
+            value = chunks[-1]
+        if self._convert is not None:
+            value = self._convert(key, value)
+        return value
+
+    def __iter__(self):
+        return iter(list(self._chunks))
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def __repr__(self):
+        return '<SpillDict: %s keys, %s spilled>' % (len(self),
+                len(self._spilled))
+
+    def add(self, key, chunk=None):
+        """adds a chunk of results for key; if chunk is None then key is only
+        added, if it isn't there already
+        """
+        with self._lock:
+            chunks = self._chunks.setdefault(key, [])
+            if chunk is None:
+                return
+            chunks.append(chunk)
+            self.memory_bytes += _nbytes(chunk)
+            if self.memory_bytes > self.memory_limit:
+                self.spill()
+
+    def close(self):
+        """removes any spilled results from disk; the SpillDict can't be used
+        after it's closed
+        """
+        with self._lock:
+            if self._finalizer is not None:
+                self._finalizer()
+            self._chunks.clear()
+            self._spilled.clear()
+            self.memory_bytes = 0
+
+    def spill(self):
+        """writes the chunks that are in memory to disk"""
+        with self._lock:
+            if self._spill_dir is None:
+                self._spill_dir = tempfile.mkdtemp(prefix='ulmo-spill-',
+                        dir=self._directory)
+                self._finalizer = weakref.finalize(self, shutil.rmtree,
+                        self._spill_dir, True)
+            for key, chunks in self._chunks.items():
+                if not len(chunks):
+                    continue
+                if self._combine is not None and len(chunks) > 1:
+                    chunks = [self._combine(chunks)]
+                for chunk in chunks:
+                    path = os.path.join(self._spill_dir,
+                            '%08d.pickle' % self._spill_count)
+                    self._spill_count += 1
+                    with open(path, 'wb') as f:
+                        pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    self._spilled.setdefault(key, []).append(path)
+                self._chunks[key] = []
+            self.memory_bytes = 0
+
+    @property
+    def spilled_keys(self):
+        """the keys that have at least some of their results on disk"""
+        return [key for key in self._chunks if key in self._spilled]
+
+
+def _load_chunk(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def _nbytes(chunk):
+    if isinstance(chunk, np.ndarray):
+        return chunk.nbytes
+    elif isinstance(chunk, (pandas.DataFrame, pandas.Series)):
+        return int(np.sum(chunk.memory_usage(deep=True)))
+    elif isinstance(chunk, dict):
+        return sum([_nbytes(value) for value in chunk.values()])
+    elif isinstance(chunk, (list, tuple)):
+        return sum([_nbytes(value) for value in chunk])
+    return sys.getsizeof(chunk)
@@ -0,0 +1,82 @@
+"""
+   ulmo.util.streams
+   ~~~~~~~~~~~~~~~~~
+
+   Read-only binary file objects that let parsers such as lxml's iterparse
+   consume a response a chunk at a time, rather than from a copy of the whole
+   body held in memory.
+"""
+from past.builtins import basestring
+import io
+
+
+class EncodedTextStream(io.RawIOBase):
+    """Binary file object over a text string that encodes the text as it is
+    read, so a large string can be parsed without making an encoded copy of
+    it all at once. Characters that can't be encoded are dropped, like
+    util.to_bytes does; bytes are read as they are.
+    """
+    def __init__(self, text, encoding='utf-8'):
+        self.text = text
+        self.encoding = encoding
+        self._position = 0
+        self._pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while len(self._pending) < len(b) and self._position < len(self.text):
+            # encoded characters take at least one byte, so this never reads
+            # much more text than is needed to fill b
+            end = self._position + max(len(b) - len(self._pending), 1)
+            chunk = self.text[self._position:end]
+            if not isinstance(chunk, bytes):
+                chunk = chunk.encode(self.encoding, 'ignore')
+            self._pending += chunk
+            self._position = end
+        size = min(len(b), len(self._pending))
+        b[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+class ResponseStream(io.RawIOBase):
+    """Binary file object over the body of a streamed requests response, i.e.
+    one requested with ``stream=True``. Content encodings such as gzip are
+    decoded as the body is read.
+
+    If `output_file` (a file path or file object) is given, everything read
+    from the stream is also written to it, so the response can later be parsed
+    again by passing the file as an ``input_file``. The response, and the
+    output file if it was given as a path, are closed when the stream is
+    closed. The number of (decoded) bytes read so far is kept in
+    `bytes_read`.
+    """
+    def __init__(self, response, output_file=None):
+        self.response = response
+        self.response.raw.decode_content = True
+        self.bytes_read = 0
+        self._close_output = isinstance(output_file, basestring)
+        if self._close_output:
+            output_file = open(output_file, 'wb')
+        self.output_file = output_file
+
+    def close(self):
+        if not self.closed:
+            self.response.close()
+            if self._close_output:
+                self.output_file.close()
+        super(ResponseStream, self).close()
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self.response.raw.read(len(b))
+        size = len(data)
+        b[:size] = data
+        self.bytes_read += size
+        if self.output_file is not None:
+            self.output_file.write(data)
+        return size
@@ -0,0 +1,196 @@
+"""
+   ulmo.util.throttling
+   ~~~~~~~~~~~~~~~~~~~~
+
+   Per-host request policy used by the shared sessions: a token bucket rate
+   limit, retries with exponential backoff and jitter for transient failures,
+   and a circuit breaker that fails fast while a host keeps failing.
+"""
+import random
+import threading
+import time
+
+import requests
+
+
+# status codes that are worth retrying; everything else is returned as is
+RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+# upper bound in seconds for a single backoff, including Retry-After delays
+MAX_BACKOFF = 60
+
+_clock = getattr(time, 'monotonic', time.time)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """raised instead of making a request to a host whose circuit breaker is
+    open because its recent requests have failed
+    """
+
+
+class CircuitBreaker(object):
+    """Tracks consecutive failures of requests to a host. After
+    `failure_threshold` failures the circuit opens and requests fail
+    immediately; after `recovery_timeout` seconds a single trial request is
+    let through, which closes the circuit if it succeeds and reopens it if it
+    fails. A failure_threshold of ``None`` or 0 disables the breaker.
+    """
+    def __init__(self, failure_threshold, recovery_timeout):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial_in_progress or \
+                    _clock() - self.opened_at < self.recovery_timeout:
+                return False
+            self._trial_in_progress = True
+            return True
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_progress = False
+            if self.failure_threshold and (self.opened_at is not None
+                    or self.failures >= self.failure_threshold):
+                self.opened_at = _clock()
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_progress = False
+
+
+class TokenBucket(object):
+    """Rate limit of `rate` requests per second, allowing bursts of up to
+    `capacity` requests
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(rate, 1))
+        self.tokens = self.capacity
+        self.updated_at = _clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """takes a token, sleeping until one is available"""
+        while True:
+            with self._lock:
+                now = _clock()
+                self.tokens = min(self.capacity,
+                        self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RequestPolicy(object):
+    """Applies rate limiting, retries and circuit breaking to requests, with
+    separate state for each host.
+
+    Parameters
+    ----------
+    rate_limit : ``None`` or float
+        Maximum number of requests per second made to each host; ``None``
+        means unlimited.
+    rate_burst : ``None`` or int
+        Number of requests that can be made at once before the rate limit
+        applies; defaults to one second's worth of requests.
+    max_retries : int
+        Number of times a request is retried after a connection error, a
+        timeout or a response with a status in RETRY_STATUS_CODES.
+    backoff_factor : float
+        Retry n (counting from 0) waits a random time between 0 and
+        ``backoff_factor * 2 ** n`` seconds, or as long as the server asks
+        with a Retry-After header. Waits are capped at MAX_BACKOFF.
+    failure_threshold : ``None`` or int
+        Number of consecutive failed requests (after retries) to a host that
+        opens its circuit breaker; ``None`` or 0 disables it.
+    recovery_timeout : float
+        Number of seconds an open circuit breaker waits before letting a
+        trial request through.
+    """
+    def __init__(self, rate_limit=None, rate_burst=None, max_retries=0,
+            backoff_factor=0, failure_threshold=None, recovery_timeout=30):
+        self.rate_limit = rate_limit
+        self.rate_burst = rate_burst
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._buckets = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, host):
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(
+                    self.failure_threshold, self.recovery_timeout)
+            return self._breakers[host]
+
+    def call(self, host, send):
+        """calls send() to make a request to host, subject to the policy, and
+        returns its response
+        """
+        breaker = self.breaker(host)
+        if not breaker.allow_request():
+            raise CircuitOpenError(
+                "not requesting %s: too many recent requests have failed" % host)
+
+        attempt = 0
+        while True:
+            self._throttle(host)
+            try:
+                response = send()
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout):
+                if attempt >= self.max_retries:
+                    breaker.record_failure()
+                    raise
+                self._sleep(attempt)
+            except Exception:
+                # not worth retrying, but still counted so that a trial
+                # request that raises doesn't leave the circuit half open
+                breaker.record_failure()
+                raise
+            else:
+                if response.status_code not in RETRY_STATUS_CODES \
+                        or attempt >= self.max_retries:
+                    # a host that is rate limiting requests is still up
+                    if response.status_code >= 500:
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                    return response
+                retry_after = response.headers.get('Retry-After')
+                response.close()
+                self._sleep(attempt, retry_after)
+            attempt += 1
+
+    def _sleep(self, attempt, retry_after=None):
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = random.uniform(0, self.backoff_factor * 2 ** attempt)
+        time.sleep(min(max(delay, 0), MAX_BACKOFF))
+
+    def _throttle(self, host):
+        if not self.rate_limit:
+            return
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(
+                    self.rate_limit, self.rate_burst)
+            bucket = self._buckets[host]
+        bucket.acquire()
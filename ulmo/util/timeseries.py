@@ -0,0 +1,115 @@
+"""
+   ulmo.util.timeseries
+   ~~~~~~~~~~~~~~~~~~~~
+
+   A compact, column oriented container for the time series returned by the
+   get_* functions when called with ``as_timeseries=True``. Values are kept
+   in typed numpy arrays and flags in categorical arrays rather than in a
+   dict per value, which takes a fraction of the memory for long records.
+"""
+import numpy as np
+import pandas
+
+
+class TimeSeries(object):
+    """A time series for a single site (or station) and variable.
+
+    Attributes
+    ----------
+    index : numpy.ndarray
+        datetime64[ns] array of the times of the values. Times that came with
+        a UTC offset are converted to UTC; others are kept as they are.
+    values : dict
+        Dict of value names (e.g. 'value', or 'max_temp') mapped to typed
+        numpy arrays of the same length as the index.
+    flags : dict
+        Dict of flag and qualifier names mapped to pandas.Categorical arrays
+        of the same length as the index.
+    metadata : dict
+        Information about the site, variable etc. that applies to the whole
+        series.
+    """
+    __slots__ = ('index', 'values', 'flags', 'metadata')
+
+    def __init__(self, index, values=None, flags=None, metadata=None):
+        self.index = _datetime64_array(index)
+        self.values = values or {}
+        self.flags = flags or {}
+        self.metadata = metadata or {}
+        for name, array in list(self.values.items()) + list(self.flags.items()):
+            if len(array) != len(self.index):
+                raise ValueError("%s has %s values but the index has %s" % (
+                    name, len(array), len(self.index)))
+
+    def __len__(self):
+        return len(self.index)
+
+    def __repr__(self):
+        return '<TimeSeries: %s values, values=%s, flags=%s>' % (
+            len(self), sorted(self.values), sorted(self.flags))
+
+    @classmethod
+    def from_dataframe(cls, dataframe, value_columns=None, metadata=None):
+        """Returns a TimeSeries for a dataframe with a datetime-like (or
+        period) index. If value_columns is None then columns with a numeric
+        dtype are values (keeping their dtype) and the rest are flags;
+        otherwise value_columns are converted to floats and the rest are
+        flags.
+        """
+        values = {}
+        flags = {}
+        for column in dataframe.columns:
+            series = dataframe[column]
+            if value_columns is None:
+                if pandas.api.types.is_numeric_dtype(series.dtype):
+                    values[column] = series.to_numpy()
+                    continue
+            elif column in value_columns:
+                values[column] = pandas.to_numeric(series).to_numpy(
+                    dtype=np.float64)
+                continue
+            flags[column] = pandas.Categorical(series.to_numpy())
+        return cls(dataframe.index, values=values, flags=flags,
+                metadata=metadata)
+
+    @classmethod
+    def from_value_dicts(cls, value_dicts, value_columns=('value',),
+            datetime_key='datetime', metadata=None):
+        """Returns a TimeSeries for a list of value dicts, such as those in the
+        'values' of the waterml parsers' results; see from_dataframe for
+        value_columns
+        """
+        dataframe = pandas.DataFrame.from_records(value_dicts,
+                columns=_record_columns(value_dicts, datetime_key))
+        dataframe = dataframe.set_index(datetime_key)
+        return cls.from_dataframe(dataframe, value_columns=[
+            column for column in value_columns if column in dataframe.columns],
+            metadata=metadata)
+
+    @property
+    def nbytes(self):
+        """the number of bytes used by the index, values and flags"""
+        return self.index.nbytes + sum([
+            array.nbytes for array in self.values.values()]) + sum([
+            flag.nbytes for flag in self.flags.values()])
+
+    def to_dataframe(self):
+        """returns the values and flags as a pandas.DataFrame indexed by time"""
+        columns = dict(self.values)
+        columns.update(self.flags)
+        return pandas.DataFrame(columns, index=pandas.DatetimeIndex(self.index),
+                columns=sorted(self.values) + sorted(self.flags))
+
+
+def _datetime64_array(index):
+    if isinstance(index, pandas.PeriodIndex):
+        index = index.to_timestamp()
+    index = pandas.to_datetime(index, utc=True)
+    return np.asarray(index.tz_convert(None), dtype='datetime64[ns]')
+
+
+def _record_columns(value_dicts, datetime_key):
+    columns = set([datetime_key])
+    for value_dict in value_dicts:
+        columns.update(value_dict)
+    return sorted(columns)
@@ -1,130 +1,131 @@
+import array
+import itertools
+
 import isodate
 
 from lxml import etree
+import numpy as np
+import pandas
 from past.builtins import basestring
 
 from ulmo import util
 
 
-def parse_site_values(content_io, namespace, query_isodate=None, methods=None):
-    """parses values out of a waterml file; content_io should be a file-like object"""
+# attributes of value elements that are read as datetimes by
+# parse_site_values(..., as_arrays=True), mapped to their column names
+_VALUE_DATETIME_ATTRIBUTES = {
+    'dateTime': 'datetime',
+    'dateTimeUTC': 'date_time_utc',
+}
+
+# element dict keys for the namespace-qualified tag and attribute names seen
+# so far; waterml only uses a few dozen distinct names, so each one goes
+# through camel_to_underscore's regexes once rather than for every element
+_underscored_names = {}
+
+# (tag, prepend_attributes) mapped to how _element_dict converts elements
+# with that tag (see _element_plan), so that the keys for the values, methods,
+# qualifiers etc. of a file are only worked out for the first of each
+_element_plans = {}
+
+# resolutions that value datetimes can be truncated to, mapped to the number
+# of decimal places of a second they keep
+DATETIME_RESOLUTIONS = {
+    's': 0,
+    'ms': 3,
+    'us': 6,
+    'ns': 9,
+}
+
+# the extended ISO 8601 datetimes that waterml services return, which are
+# converted a whole series at a time: date and hour:minute, seconds, decimal
+# fraction of a second and UTC offset; anything else is parsed by isodate
+_ISO_DATETIME_PATTERN = (
+    r'^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2})(?::(\d{2})(?:[.,](\d+))?)?'
+    r'(Z|[+-]\d{2}(?::?\d{2})?)?$')
+
+
+def parse_site_values(content_io, namespace, query_isodate=None, methods=None,
+        as_arrays=False, datetime_resolution='s'):
+    """parses values out of a waterml file; content_io should be a file-like
+    object. If as_arrays is True, then the values of each series are a dict
+    of columns instead of a list of dicts: 'datetime' (datetime64[ns]; times
+    with a UTC offset are converted to UTC), 'value' (float64) and an integer
+    coded pandas.Categorical for each attribute of the values, such as
+    'qualifiers', 'method_id', 'source_id' or 'quality_control_level_code'.
+
+    Value datetimes are truncated to datetime_resolution, one of the keys of
+    DATETIME_RESOLUTIONS. The default, 's', drops fractions of a second:
+    USGS returns them but they are almost always 0s.
+    """
+    _check_datetime_resolution(datetime_resolution)
     data_dict = {}
-    metadata_elements = [
-        # (element name, name of collection,
-        #   key from element dict to use as for a key in the collections dict)
-        ('censorCode', 'censor_codes', 'censor_code'),
-        ('method', 'methods', 'id'),
-        ('offset', 'offsets', 'id'),
-        ('qualifier', 'qualifiers', 'id'),
-        ('qualityControlLevel', 'quality_control_levels', 'id'),
-        ('source', 'sources', 'id')
-    ]
-    for (event, ele) in etree.iterparse(content_io):
-        if ele.tag == namespace + "timeSeries":
-            source_info_element = ele.find(namespace + 'sourceInfo')
-            site_info = _parse_site_info(source_info_element, namespace)
-            var_element = ele.find(namespace + 'variable')
-            variable = _parse_variable(var_element, namespace)
-            values_elements = ele.findall(namespace + 'values')
-            code = variable['code']
-            if isinstance(methods, basestring):
-                method = methods
-            elif isinstance(methods, dict):
-                method = methods.get(code, None)
-            else:
-                method = None
-            if 'statistic' in variable:
-                code += ":" + variable['statistic']['code']
-
-            if method is None:
-                if len(values_elements) > 1:
-                    raise ValueError(
-                        'found more than one method for %s. need to specify'
-                        'specify code or "all".' % variable['code'])
-                values_element = values_elements[0]
-                values = _parse_values(values_element, namespace)
-                data_dict[code] = {
-                    'site': site_info,
-                    'variable': variable,
-                }
-                data_dict[code].update({'values': values})
-                metadata = _parse_metadata(
-                        values_element, metadata_elements, namespace)
-                data_dict[code].update(metadata)
-                if query_isodate:
-                    data_dict[code]['last_refresh'] = query_isodate
-            elif method == 'all':
-                for values_element in values_elements:
-                    values = _parse_values(values_element, namespace)
-                    metadata = _parse_metadata(
-                            values_element, metadata_elements, namespace)
-                    if len(values_elements) > 1:
-                        updated_code = code + ':' + str(
-                            list(metadata['methods'].values())[0]['id'])
-                    else:
-                        updated_code = code
-                    data_dict[updated_code] = {
-                        'site': site_info.copy(),
-                        'variable': variable,
-                    }
-                    data_dict[updated_code].update({'values': values})
-                    data_dict[updated_code].update(metadata)
-                    if query_isodate:
-                        data_dict[updated_code]['last_refresh'] = query_isodate
-            else:
-                for values_element in values_elements:
-                    if values_element.find(
-                            namespace + 'method[@methodID="%s"]' % method)\
-                            is not None:
-                        values = _parse_values(values_element, namespace)
-                        metadata = _parse_metadata(
-                            values_element, metadata_elements, namespace)
-                        data_dict[code] = {
-                            'site': site_info,
-                            'variable': variable,
-                        }
-                        data_dict[code].update({'values': values})
-                        data_dict[code].update(metadata)
-                        if query_isodate:
-                            data_dict[code]['last_refresh'] = query_isodate
-
+    for ele, series_values in _iter_time_series(content_io, namespace,
+            as_arrays=as_arrays, datetime_resolution=datetime_resolution):
+        _add_time_series(data_dict, ele, series_values, namespace,
+                query_isodate, methods)
     return data_dict
 
 
+def parse_all(content_io, namespace, site_info_names, query_isodate=None,
+        methods=None, datetime_resolution='s'):
+    """parses site infos, sites, variables and values out of a waterml file in
+    a single pass; content_io should be a file-like object. Returns a dict with
+    'site_infos', 'sites', 'variables' and 'values' keys, mapped to what the
+    corresponding parse_* function would return for the file.
+    """
+    _check_datetime_resolution(datetime_resolution)
+    site_info_tags = [namespace + name for name in site_info_names]
+    site_infos_by_tag = dict([(tag, {}) for tag in site_info_tags])
+    parsed = {
+        'sites': {},
+        'values': {},
+        'variables': {},
+    }
+    _rewind(content_io)
+    tags = site_info_tags + [namespace + 'site', namespace + 'variable']
+    for element, series_values in _iter_time_series(content_io, namespace,
+            tags=tags, datetime_resolution=datetime_resolution):
+        tag = element.tag
+        if series_values is not None:
+            _add_time_series(parsed['values'], element, series_values,
+                    namespace, query_isodate, methods)
+        elif tag in site_infos_by_tag:
+            site_info_dict = _parse_site_info(element, namespace)
+            site_infos_by_tag[tag][site_info_dict['code']] = site_info_dict
+        elif tag == namespace + 'variable':
+            variable_dict = _parse_variable(element, namespace)
+            parsed['variables'][variable_dict['code']] = variable_dict
+        elif tag == namespace + 'site':
+            site_dict = _parse_site(element, namespace)
+            parsed['sites'][site_dict['code']] = site_dict
+    parsed['site_infos'] = _merge_site_infos(site_infos_by_tag, site_info_tags)
+    return parsed
+
+
 def parse_site_infos(content_io, namespace, site_info_names):
     """parses information contained in site info elements out of a waterml file;
     content_io should be a file-like object
     """
-    site_infos = {}
-    for site_info_name in site_info_names:
-        content_io.seek(0)
-        site_info_elements = [
-            element
-            for (event, element) in etree.iterparse(content_io)
-            if element.tag == namespace + site_info_name
-        ]
-        site_info_dicts = [
-            _parse_site_info(site_info_element, namespace)
-            for site_info_element in site_info_elements
-        ]
-        site_infos.update(dict([(d['code'], d) for d in site_info_dicts]))
-    return site_infos
+    site_info_tags = [namespace + name for name in site_info_names]
+    site_infos_by_tag = dict([(tag, {}) for tag in site_info_tags])
+    _rewind(content_io)
+    for site_info_element in _iter_elements(content_io, site_info_tags):
+        site_info_dict = _parse_site_info(site_info_element, namespace)
+        site_infos_by_tag[site_info_element.tag][site_info_dict['code']] = \
+            site_info_dict
+    return _merge_site_infos(site_infos_by_tag, site_info_tags)
 
 
 def parse_sites(content_io, namespace):
     """parses information contained in site elements (including seriesCatalogs)
     out of a waterml file; content_io should be a file-like object
     """
-    content_io.seek(0)
-    site_elements = [
-        ele for (event, ele) in etree.iterparse(content_io)
-        if ele.tag == namespace + 'site']
-    site_dicts = [
-        _parse_site(site_element, namespace)
-        for site_element in site_elements]
-    sites = dict(
-        [(site_dict['code'], site_dict)
-         for site_dict in site_dicts])
+    _rewind(content_io)
+    sites = {}
+    for site_element in _iter_elements(content_io, namespace + 'site'):
+        site_dict = _parse_site(site_element, namespace)
+        sites[site_dict['code']] = site_dict
     return sites
 
 
@@ -132,23 +133,101 @@ def parse_variables(content_io, namespace):
     """parses information contained in variables elements out of a waterml file;
     content_io should be a file-like object
     """
-    content_io.seek(0)
-    variable_elements = [
-        element
-        for (event, element) in etree.iterparse(content_io)
-        if element.tag == namespace + 'variable'
-    ]
-    variable_dicts = [
-        _parse_variable(variable_element, namespace)
-        for variable_element in variable_elements
-    ]
-    variables = dict([
-        (variable_dict['code'], variable_dict)
-        for variable_dict in variable_dicts
-    ])
+    _rewind(content_io)
+    variables = {}
+    for variable_element in _iter_elements(content_io, namespace + 'variable'):
+        variable_dict = _parse_variable(variable_element, namespace)
+        variables[variable_dict['code']] = variable_dict
     return variables
 
 
+def _add_time_series(data_dict, ele, series_values, namespace, query_isodate,
+        methods):
+    """adds the values of a timeSeries element to data_dict; series_values is
+    a list of (values element, parsed values) pairs for the series, as
+    _iter_time_series yields them
+    """
+    metadata_elements = [
+        # (element name, name of collection,
+        #   key from element dict to use as for a key in the collections dict)
+        ('censorCode', 'censor_codes', 'censor_code'),
+        ('method', 'methods', 'id'),
+        ('offset', 'offsets', 'id'),
+        ('qualifier', 'qualifiers', 'id'),
+        ('qualityControlLevel', 'quality_control_levels', 'id'),
+        ('source', 'sources', 'id')
+    ]
+    source_info_element = ele.find(namespace + 'sourceInfo')
+    site_info = _parse_site_info(source_info_element, namespace)
+    var_element = ele.find(namespace + 'variable')
+    variable = _parse_variable(var_element, namespace)
+    code = variable['code']
+    if isinstance(methods, basestring):
+        method = methods
+    elif isinstance(methods, dict):
+        method = methods.get(code, None)
+    else:
+        method = None
+    if 'statistic' in variable:
+        code += ":" + variable['statistic']['code']
+
+    if method is None:
+        if len(series_values) > 1:
+            raise ValueError(
+                'found more than one method for %s. need to specify'
+                'specify code or "all".' % variable['code'])
+        values_element, values = series_values[0]
+        data_dict[code] = {
+            'site': site_info,
+            'variable': variable,
+        }
+        data_dict[code].update({'values': values})
+        metadata = _parse_metadata(
+                values_element, metadata_elements, namespace)
+        data_dict[code].update(metadata)
+        if query_isodate:
+            data_dict[code]['last_refresh'] = query_isodate
+    elif method == 'all':
+        for values_element, values in series_values:
+            metadata = _parse_metadata(
+                    values_element, metadata_elements, namespace)
+            if len(series_values) > 1:
+                updated_code = code + ':' + str(
+                    list(metadata['methods'].values())[0]['id'])
+            else:
+                updated_code = code
+            data_dict[updated_code] = {
+                'site': site_info.copy(),
+                'variable': variable,
+            }
+            data_dict[updated_code].update({'values': values})
+            data_dict[updated_code].update(metadata)
+            if query_isodate:
+                data_dict[updated_code]['last_refresh'] = query_isodate
+    else:
+        for values_element, values in series_values:
+            if values_element.find(
+                    namespace + 'method[@methodID="%s"]' % method)\
+                    is not None:
+                metadata = _parse_metadata(
+                    values_element, metadata_elements, namespace)
+                data_dict[code] = {
+                    'site': site_info,
+                    'variable': variable,
+                }
+                data_dict[code].update({'values': values})
+                data_dict[code].update(metadata)
+                if query_isodate:
+                    data_dict[code]['last_refresh'] = query_isodate
+
+
+def _check_datetime_resolution(datetime_resolution):
+    if datetime_resolution not in DATETIME_RESOLUTIONS:
+        raise ValueError("datetime_resolution must be one of %s, not %r" % (
+            ', '.join(sorted(DATETIME_RESOLUTIONS, key=DATETIME_RESOLUTIONS.get)),
+            datetime_resolution))
+
+
 def _element_dict(element, exclude_children=None, prepend_attributes=True):
     """converts an element to a dict representation with CamelCase tag names and
     attributes converted to underscores; this is a generic converter for cases
@@ -166,17 +245,21 @@ def _element_dict(element, exclude_children=None, prepend_attributes=True):
         exclude_children = []
 
     element_dict = {}
-    element_name = util.camel_to_underscore(element.tag.split('}')[-1])
+    element_name, attribute_keys = _element_plan(element.tag,
+            prepend_attributes)
 
     if len(element) == 0 and not element.text is None:
         element_dict[element_name] = element.text
 
-    element_dict.update(dict([
-        (_element_dict_attribute_name(key, element_name,
-            prepend_element_name=prepend_attributes), value)
-        for key, value in element.attrib.items()
-        if value.split(':')[0] not in ['xsd', 'xsi']
-    ]))
+    for key, value in element.attrib.items():
+        if value.split(':')[0] in ['xsd', 'xsi']:
+            continue
+        attribute_key = attribute_keys.get(key)
+        if attribute_key is None:
+            attribute_key = attribute_keys[key] = \
+                _element_dict_attribute_name(key, element_name,
+                    prepend_element_name=prepend_attributes)
+        element_dict[attribute_key] = value
 
     for child in element.iterchildren():
         if not child.tag.split('}')[-1] in exclude_children:
@@ -187,13 +270,25 @@ def _element_dict(element, exclude_children=None, prepend_attributes=True):
 
 def _element_dict_attribute_name(attribute_name, element_name,
         prepend_element_name=True):
-    attribute_only = util.camel_to_underscore(attribute_name.split('}')[-1])
+    attribute_only = _underscored_name(attribute_name)
     if attribute_only.startswith(element_name) or not prepend_element_name:
         return attribute_only
     else:
         return element_name + '_' + attribute_only
 
 
+def _element_plan(tag, prepend_attributes):
+    """returns (element name, attribute keys) for converting elements with a
+    given tag to dicts; attribute keys is a dict of attribute names to element
+    dict keys that _element_dict fills in as attributes are seen
+    """
+    plan = _element_plans.get((tag, prepend_attributes))
+    if plan is None:
+        plan = _element_plans[(tag, prepend_attributes)] = (
+            _underscored_name(tag), {})
+    return plan
+
+
 def _find_unit(element, namespace):
     unit_element = element.find(namespace + 'unit')
     if unit_element is None:
@@ -201,15 +296,141 @@ def _find_unit(element, namespace):
     return unit_element
 
 
-def _parse_datetime(datetime_str):
+def _iter_elements(content_io, tags, leaf_tags=()):
+    """yields each element with the given (namespaced) tag, or with any of a
+    list of tags, as it is parsed from content_io. Once the caller is done
+    with an element, it is cleared and the elements before it (and before
+    each of its ancestors) are deleted, so that memory use doesn't grow with
+    the size of the document. Elements inside another element with one of
+    the tags are left alone until the outer element is done with.
+
+    Elements with one of leaf_tags are yielded as well, but are cleared and
+    deleted along with the sibling with the same tag before them even when
+    they are inside an element with one of the tags; this is for the many
+    value elements of a series.
+    """
+    if isinstance(tags, basestring):
+        tags = [tags]
+    tag_set = set(tags)
+    leaf_tag_set = set(leaf_tags)
+    for event, element in etree.iterparse(content_io,
+            tag=list(tags) + list(leaf_tags)):
+        yield element
+        if element.tag in leaf_tag_set:
+            element.clear()
+            previous = element.getprevious()
+            if previous is not None and previous.tag == element.tag:
+                element.getparent().remove(previous)
+            continue
+        if any([ancestor.tag in tag_set
+                for ancestor in element.iterancestors()]):
+            continue
+        element.clear()
+        for ancestor in itertools.chain([element], element.iterancestors()):
+            while ancestor.getprevious() is not None:
+                del ancestor.getparent()[0]
+
+
+def _iter_time_series(content_io, namespace, tags=(), as_arrays=False,
+        datetime_resolution='s'):
+    """yields (element, series values) for each timeSeries element parsed from
+    content_io, and (element, None) for each element with one of the other
+    given tags. The value elements of a series are converted as they are
+    parsed and then deleted, so by the time a timeSeries element is yielded
+    it only holds the series metadata; series values is a list of (values
+    element, parsed values) pairs, one for each values element. Values are
+    parsed into columns (see parse_site_values) if as_arrays is True.
+    """
+    series_tag = namespace + 'timeSeries'
+    values_tag = namespace + 'values'
+    value_tag = namespace + 'value'
+    if as_arrays:
+        values_class = _ValueArrays
+    else:
+        values_class = _ValueDicts
+
+    series_values = []
+    values = values_class(datetime_resolution)
+    for element in _iter_elements(content_io,
+            list(tags) + [series_tag, values_tag], leaf_tags=[value_tag]):
+        tag = element.tag
+        if tag == value_tag:
+            values.add(element)
+        elif tag == values_tag:
+            series_values.append((element, values.finish()))
+            values = values_class(datetime_resolution)
+        elif tag == series_tag:
+            yield element, series_values
+            series_values = []
+        else:
+            yield element, None
+
+
+def _merge_site_infos(site_infos_by_tag, site_info_tags):
+    # site infos are merged in the order of the tags, so later tags take
+    # precedence for codes that are in more than one
+    site_infos = {}
+    for tag in site_info_tags:
+        site_infos.update(site_infos_by_tag[tag])
+    return site_infos
+
+
+def _parse_datetime(datetime_str, resolution='s'):
     """returns an iso 8601 datetime string; USGS returns fractions of a second
     which are usually all 0s. ISO 8601 does not limit the number of decimal
-    places but we have to cut them off at some point
+    places but we have to cut them off at some point, which is resolution
     """
-    #XXX: this could be sped up if need be
-    #XXX: also, we need to document that we are throwing away fractions of
-    #     seconds
-    return isodate.datetime_isoformat(isodate.parse_datetime(datetime_str))
+    parsed = isodate.parse_datetime(datetime_str)
+    formatted = isodate.datetime_isoformat(parsed)
+    digits = DATETIME_RESOLUTIONS[resolution]
+    if digits:
+        fraction = ('%06d' % parsed.microsecond).ljust(digits, '0')[:digits]
+        formatted = formatted[:19] + '.' + fraction + formatted[19:]
+    return formatted
+
+
+def _parse_datetimes(datetime_strs, resolution='s'):
+    """returns a list of the iso 8601 datetime strings _parse_datetime would
+    return for each of datetime_strs; the common formats are validated and
+    rewritten a series at a time, and only the rest go through isodate
+    """
+    if not len(datetime_strs):
+        return []
+    datetime_strs = pandas.Series(datetime_strs, dtype=object)
+    parts = datetime_strs.str.extract(_ISO_DATETIME_PATTERN)
+    formatted = parts[0] + ':' + parts[1].fillna('00')
+
+    # out of range dates and times (e.g. a 13th month) don't convert, and are
+    # left for isodate to raise an error for
+    converted = pandas.to_datetime(formatted, format='%Y-%m-%dT%H:%M:%S',
+            errors='coerce')
+    digits = DATETIME_RESOLUTIONS[resolution]
+    if digits:
+        # isodate, and so _parse_datetime, only keeps microseconds, so finer
+        # resolutions are padded with 0s for every value of a series alike
+        fractions = parts[2].fillna('').str.slice(0, min(digits, 6))
+        formatted = formatted + '.' + fractions.str.pad(digits, side='right',
+                fillchar='0')
+    offsets = parts[3].fillna('')
+    offset_formats = dict([
+        (offset, _format_utc_offset(offset)) for offset in offsets.unique()])
+    formatted = (formatted + offsets.map(offset_formats)).tolist()
+
+    for index in np.flatnonzero(converted.isnull().to_numpy()):
+        formatted[index] = _parse_datetime(datetime_strs[index], resolution)
+    return formatted
+
+
+def _format_utc_offset(offset):
+    """returns a UTC offset as isodate formats it: 'Z' for UTC and +HH:MM
+    otherwise
+    """
+    if offset in ('', 'Z'):
+        return offset
+    hours, minutes = offset[1:3], offset[3:].lstrip(':') or '00'
+    if hours == '00' and minutes == '00':
+        return 'Z'
+    return '%s%s:%s' % (offset[0], hours, minutes)
 
 
 def _parse_geog_location(geog_location, namespace):
@@ -425,24 +646,6 @@ def _parse_unit(unit_element, namespace):
     return return_dict
 
 
-def _parse_value(value_element, namespace):
-    value_dict = _element_dict(value_element, prepend_attributes=False)
-    datetime = _parse_datetime(value_dict.pop('date_time'))
-    value_dict['datetime'] = datetime
-    return value_dict
-
-
-def _parse_values(values_element, namespace):
-    """returns a list of dicts that represent the values for a given etree
-    values element
-    """
-
-    return [
-        _parse_value(value, namespace)
-        for value in values_element.findall(namespace + 'value')
-    ]
-
-
 def _parse_variable(variable_element, namespace):
     """returns a dict that represents a variable for a given etree variable element"""
     return_dict = _element_dict(variable_element,
@@ -486,9 +689,112 @@ def _parse_variable(variable_element, namespace):
     return return_dict
 
 
+def _rewind(content_io):
+    """seeks back to the start of content_io, unless it is a stream (such as
+    a util.ResponseStream) that can only be read once
+    """
+    seekable = getattr(content_io, 'seekable', None)
+    if seekable is None or seekable():
+        content_io.seek(0)
+
+
 def _scrub_prefix(element_dict, prefix):
     "returns a dict with prefix scrubbed from the keys"
     return dict([
         (k.split(prefix + '_')[-1], v)
         for k, v in element_dict.items()
     ])
+
+
+def _underscored_name(name):
+    """returns the underscored local name for a namespace-qualified tag or
+    attribute name
+    """
+    underscored = _underscored_names.get(name)
+    if underscored is None:
+        underscored = _underscored_names[name] = util.camel_to_underscore(
+            name.split('}')[-1])
+    return underscored
+
+
+class _ValueDicts(object):
+    """collects value elements into the list of dicts that parse_site_values
+    returns for a values element; the datetimes of all the values are
+    converted together once the values element is done
+    """
+    def __init__(self, datetime_resolution='s'):
+        self._datetime_resolution = datetime_resolution
+        self._value_dicts = []
+
+    def add(self, value_element):
+        self._value_dicts.append(
+            _element_dict(value_element, prepend_attributes=False))
+
+    def finish(self):
+        value_dicts = self._value_dicts
+        datetimes = _parse_datetimes(
+            [value_dict.pop('date_time') for value_dict in value_dicts],
+            resolution=self._datetime_resolution)
+        for value_dict, datetime in zip(value_dicts, datetimes):
+            value_dict['datetime'] = datetime
+        return value_dicts
+
+
+class _ValueArrays(object):
+    """collects value elements into the dict of columns that
+    parse_site_values(..., as_arrays=True) returns for a values element; the
+    values, attribute codes and datetime strings are appended to growing
+    arrays as each value element is parsed
+    """
+    def __init__(self, datetime_resolution='s'):
+        self._datetime_resolution = datetime_resolution
+        self._values = array.array('d')
+        self._datetimes = dict([
+            (name, []) for name in _VALUE_DATETIME_ATTRIBUTES])
+        self._codes = {}
+        self._categories = {}
+
+    def add(self, value_element):
+        index = len(self._values)
+        text = value_element.text
+        self._values.append(float(text) if text and text.strip() else np.nan)
+        for name, datetime_strs in self._datetimes.items():
+            datetime_strs.append(value_element.get(name))
+        for name, attribute in value_element.attrib.items():
+            if name in self._datetimes:
+                continue
+            if attribute.split(':')[0] in ['xsd', 'xsi']:
+                continue
+            codes = self._codes.get(name)
+            if codes is None:
+                codes = self._codes[name] = array.array('i')
+                self._categories[name] = {}
+            attribute_categories = self._categories[name]
+            code = attribute_categories.get(attribute)
+            if code is None:
+                code = attribute_categories[attribute] = \
+                    len(attribute_categories)
+            # values without the attribute are coded -1, i.e. missing
+            codes.extend([-1] * (index - len(codes)))
+            codes.append(code)
+
+    def finish(self):
+        count = len(self._values)
+        columns = {'value': np.frombuffer(self._values, dtype=np.float64)}
+        for name, column_name in _VALUE_DATETIME_ATTRIBUTES.items():
+            datetime_strs = np.array(self._datetimes[name], dtype=object)
+            if name == 'dateTime' or not pandas.isnull(datetime_strs).all():
+                # casting to a coarser unit truncates, like dropping the digits
+                datetimes64 = np.asarray(pandas.to_datetime(
+                    datetime_strs, utc=True).tz_convert(None),
+                    dtype='datetime64[ns]')
+                columns[column_name] = datetimes64.astype(
+                    'datetime64[%s]' % self._datetime_resolution).astype(
+                    'datetime64[ns]')
+        for name, codes in self._codes.items():
+            codes.extend([-1] * (count - len(codes)))
+            categories = self._categories[name]
+            columns[_underscored_name(name)] = pandas.Categorical.from_codes(
+                    np.frombuffer(codes, dtype=np.intc),
+                    categories=sorted(categories, key=categories.get))
+        return columns
@@ -9,10 +9,15 @@ def parse_site_infos(content_io):
             site_info_names=['siteInfo'])
 
 
-def parse_site_values(content_io, query_isodate=None):
-    """parses values out of a waterml file; content_io should be a file-like object"""
+def parse_site_values(content_io, query_isodate=None, as_arrays=False,
+        datetime_resolution='s'):
+    """parses values out of a waterml file; content_io should be a file-like
+    object. See ulmo.waterml.common.parse_site_values for as_arrays and
+    datetime_resolution.
+    """
     return common.parse_site_values(content_io, WATERML_V1_0_NAMESPACE,
-            query_isodate=query_isodate)
+            query_isodate=query_isodate, as_arrays=as_arrays,
+            datetime_resolution=datetime_resolution)
 
 
 def parse_sites(content_io):
@@ -24,3 +29,12 @@ def parse_variables(content_io):
     """parses variables out of a waterml file; content_io should be a file-like object"""
     return common.parse_variables(content_io, WATERML_V1_0_NAMESPACE)
 
+
+def parse_all(content_io, query_isodate=None, methods=None,
+        datetime_resolution='s'):
+    """parses site infos, sites, variables and values out of a waterml file in
+    one pass; see ulmo.waterml.common.parse_all
+    """
+    return common.parse_all(content_io, WATERML_V1_0_NAMESPACE,
+        site_info_names=['siteInfo'], query_isodate=query_isodate,
+        methods=methods, datetime_resolution=datetime_resolution)
@@ -9,11 +9,18 @@ def parse_site_infos(content_io):
         content_io, WATERML_V1_1_NAMESPACE, site_info_names=['siteInfo', 'sourceInfo'])
 
 
-def parse_site_values(content_io, query_isodate=None, methods=None):
-    """parses values out of a waterml file; content_io should be a file-like object"""
+def parse_site_values(content_io, query_isodate=None, methods=None,
+        as_arrays=False, datetime_resolution='s'):
+    """parses values out of a waterml file; content_io should be a file-like
+    object. If as_arrays is True, the values of each series are numpy and
+    categorical columns rather than a list of dicts; value datetimes are
+    truncated to datetime_resolution (see
+    ulmo.waterml.common.parse_site_values).
+    """
     return common.parse_site_values(
         content_io, WATERML_V1_1_NAMESPACE, query_isodate=query_isodate,
-        methods=methods)
+        methods=methods, as_arrays=as_arrays,
+        datetime_resolution=datetime_resolution)
 
 
 def parse_sites(content_io):
@@ -24,3 +31,13 @@ def parse_sites(content_io):
 def parse_variables(content_io):
     """parses variables out of a waterml file; content_io should be a file-like object"""
     return common.parse_variables(content_io, WATERML_V1_1_NAMESPACE)
+
+
+def parse_all(content_io, query_isodate=None, methods=None,
+        datetime_resolution='s'):
+    """parses site infos, sites, variables and values out of a waterml file in
+    one pass; see ulmo.waterml.common.parse_all
+    """
+    return common.parse_all(content_io, WATERML_V1_1_NAMESPACE,
+        site_info_names=['siteInfo', 'sourceInfo'], query_isodate=query_isodate,
+        methods=methods, datetime_resolution=datetime_resolution)